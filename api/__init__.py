@@ -1,3 +1,4 @@
 from .db_api import DataAPI
+from .query_cache import QueryCache
 
-__all__ = ["DataAPI"]
+__all__ = ["DataAPI", "QueryCache"]
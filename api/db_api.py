@@ -1,7 +1,14 @@
 from database import SQLAlchemyConnection
-import pandas as pd
+from api.query_cache import QueryCache
+from sqlalchemy import text
 import logging
-from typing import Dict
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class DataAPI:
@@ -9,28 +16,215 @@ class DataAPI:
     This class provides an API for performing pandas operations using SQL Alchemy.
     """
 
-    def __init__(self, db_config: Dict[str, str]) -> None:
+    def __init__(
+        self,
+        db_config: Dict[str, str],
+        cache: Optional[QueryCache] = None,
+        generation_check_seconds: Optional[float] = None,
+    ) -> None:
         """
         Initializes the DataAPI with database configuration settings.
         Args:
             db_config (Dict[str, str]): The database configuration settings.
+            cache (Optional[QueryCache]): Result cache for view and reference
+                queries. Without one every call goes to the database.
+            generation_check_seconds (Optional[float]): How often the cache
+                re-reads the ingest generation; defaults to
+                QUERY_CACHE_GENERATION_CHECK or 10.
         """
         self.sqlalchemy_connection = SQLAlchemyConnection(db_config)
+        self.cache = cache
+        if generation_check_seconds is None:
+            generation_check_seconds = float(
+                os.getenv("QUERY_CACHE_GENERATION_CHECK", "10")
+            )
+        self.generation_check_seconds = generation_check_seconds
+        self._generation = 0
+        self._backfill_generation = 0
+        self._generation_checked: Optional[float] = None
+        self._generation_lock = threading.Lock()
+
+    def current_generation(self) -> int:
+        """
+        Returns the ingest generation, re-reading it from the database at most
+        every `generation_check_seconds`.
+
+        Returns:
+            int: The generation; 0 before the first ingest run.
+        """
+        with self._generation_lock:
+            now = time.monotonic()
+            if (
+                self._generation_checked is None
+                or now - self._generation_checked
+                >= self.generation_check_seconds
+            ):
+                try:
+                    with self.sqlalchemy_connection.engine.connect() as conn:
+                        row = conn.execute(
+                            text(
+                                "SELECT generation, backfill_generation "
+                                "FROM ingest_generation WHERE id = 1;"
+                            )
+                        ).first()
+                    if row is not None:
+                        self._generation, self._backfill_generation = row
+                except Exception as e:
+                    logging.warning(f"Could not read ingest generation: {e}")
+                self._generation_checked = now
+            return self._generation
 
-    def sql_dataframes(self, query: str) -> pd.DataFrame:
+    def current_backfill_generation(self) -> int:
+        """
+        Returns the backfill generation, read along with the ingest
+        generation. It only changes when observations that may be older than
+        the newest stored ones were written, e.g. by a ring buffer replay.
+
+        Returns:
+            int: The backfill generation; 0 before the first backfill.
+        """
+        self.current_generation()
+        with self._generation_lock:
+            return self._backfill_generation
+
+    def bump_generation(self, backfill: bool = False) -> int:
+        """
+        Increments the ingest generation after an ingest run, which
+        invalidates every cached query result in every process.
+
+        Args:
+            backfill (bool): Also increment the backfill generation, for
+                writes of observations that may be older than the newest
+                stored ones.
+
+        Returns:
+            int: The new generation.
+        """
+        query = text(
+            """
+            INSERT INTO ingest_generation
+                (id, generation, backfill_generation, updated_at)
+            VALUES (1, 1, :backfill, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET
+                generation = ingest_generation.generation + 1,
+                backfill_generation = ingest_generation.backfill_generation
+                    + EXCLUDED.backfill_generation,
+                updated_at = EXCLUDED.updated_at
+            RETURNING generation, backfill_generation;
+            """
+        )
+        with self.sqlalchemy_connection.transaction() as connection:
+            generation, backfill_generation = connection.execute(
+                query, {"backfill": int(backfill)}
+            ).one()
+        with self._generation_lock:
+            self._generation = generation
+            self._backfill_generation = backfill_generation
+            self._generation_checked = time.monotonic()
+        return generation
+
+    def sql_dataframes(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[float] = None,
+    ) -> "pd.DataFrame":
         """
         Executes a SQL query using SQLAlchemy and returns the result as a DataFrame.
+        pandas is imported on first use so the ingest path never loads it.
+        When the DataAPI has a cache, results are served from it until their
+        TTL expires or the next ingest run.
         Args:
             query (str): The SQL query to execute.
+            params (Optional[Dict[str, Any]]): Bound parameters for the query.
+            ttl (Optional[float]): Seconds to cache the result, the cache's
+                default when None; 0 bypasses the cache.
         Returns:
             pd.DataFrame: The result of the query.
         Raises:
             Exception: If there is an error executing the query.
         """
+        import pandas as pd
+
+        use_cache = self.cache is not None and ttl != 0
+        if use_cache:
+            key = QueryCache.make_key("dataframe", query, params)
+            generation = self.current_generation()
+            cached = self.cache.get(key, generation)
+            if cached is not None:
+                return cached
+        try:
+            with self.sqlalchemy_connection.engine.connect() as connection:
+                # Plain SQL strings keep working exactly as before; bound
+                # parameters use the same :name style as fetch_rows.
+                if params is None:
+                    df = pd.read_sql(query, connection)
+                else:
+                    df = pd.read_sql(text(query), connection, params=params)
+        except Exception as e:
+            logging.error(f"Error fetching data: {e}")
+            raise
+        if use_cache:
+            self.cache.put(key, df.copy(), generation, ttl)
+        return df
+
+    def fetch_rows(
+        self,
+        query: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[float] = None,
+    ) -> List[tuple]:
+        """
+        Executes a SQL query and returns the result as a list of plain tuples,
+        without building a DataFrame.
+        Only queries given a `ttl` are cached, since this is also used for
+        reads that must see the latest data.
+        Args:
+            query (str): The SQL query to execute.
+            params (Optional[Dict[str, Any]]): Bound parameters for the query.
+            ttl (Optional[float]): Seconds to cache the result when the
+                DataAPI has a cache.
+        Returns:
+            List[tuple]: The rows returned by the query.
+        Raises:
+            Exception: If there is an error executing the query.
+        """
+        use_cache = self.cache is not None and bool(ttl)
+        if use_cache:
+            key = QueryCache.make_key("rows", query, params)
+            generation = self.current_generation()
+            cached = self.cache.get(key, generation)
+            if cached is not None:
+                return cached
+        try:
+            with self.sqlalchemy_connection.engine.connect() as connection:
+                result = connection.execute(text(query), params or {})
+                rows = [tuple(row) for row in result]
+        except Exception as e:
+            logging.error(f"Error fetching data: {e}")
+            raise
+        if use_cache:
+            self.cache.put(key, list(rows), generation, ttl)
+        return rows
+
+    def fetch_records(
+        self, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Executes a SQL query and returns the result as a list of dictionaries
+        keyed by column name, without building a DataFrame.
+        Args:
+            query (str): The SQL query to execute.
+            params (Optional[Dict[str, Any]]): Bound parameters for the query.
+        Returns:
+            List[Dict[str, Any]]: The rows returned by the query.
+        Raises:
+            Exception: If there is an error executing the query.
+        """
         try:
             with self.sqlalchemy_connection.engine.connect() as connection:
-                df = pd.read_sql(query, connection)
-            return df
+                result = connection.execute(text(query), params or {})
+                return [dict(row._mapping) for row in result]
         except Exception as e:
             logging.error(f"Error fetching data: {e}")
             raise
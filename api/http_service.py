@@ -0,0 +1,353 @@
+from config import db_config
+from api.db_api import DataAPI
+from src.latest_weather import LatestWeatherCache
+from src.nearest_city import NearestCityLookup
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+# Views served under /views/<name>; anything else is rejected, so the name can
+# be interpolated into the query.
+VIEWS = ("rainfall_counts", "temperature_analytics", "temperature_extremes")
+
+
+def seconds_until_next_cycle(
+    interval: float, offset: float, now: Optional[float] = None
+) -> float:
+    """
+    Returns the seconds until the next ingest cycle has finished, i.e. until
+    the next multiple of `interval` plus `offset` (e.g. 5 minutes past every
+    hour for the hourly cron run).
+
+    Args:
+        interval (float): Length of the ingest cycle in seconds.
+        offset (float): Seconds after the start of a cycle by which the run
+            has stored its data.
+        now (Optional[float]): Current epoch time, defaults to time.time().
+
+    Returns:
+        float: Seconds until the cached data may change.
+    """
+    now = time.time() if now is None else now
+    remaining = (offset - now) % interval
+    return remaining or interval
+
+
+def to_json(value: Any) -> Any:
+    """JSON fallback for the types returned by the database driver."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class ResponseCache:
+    """
+    Caches encoded JSON responses with their ETag until an expiry time, up to
+    `max_entries` responses with the least recently used evicted first.
+    Misses for the same key are computed once while concurrent requests wait;
+    the per-key lock only exists while the miss is being computed.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of cached responses.
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, str, float]]" = (
+            OrderedDict()
+        )
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> Optional[Tuple[bytes, str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get(
+        self,
+        key: str,
+        ttl: float,
+        compute: Callable[[], Any],
+    ) -> Tuple[bytes, str, float]:
+        """
+        Returns the cached response for a key, computing it on a miss.
+
+        Args:
+            key (str): The cache key, usually the request path.
+            ttl (float): Seconds the computed response stays valid.
+            compute (Callable[[], Any]): Produces the JSON-serializable body.
+
+        Returns:
+            Tuple[bytes, str, float]: The body, its ETag and its expiry time.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            try:
+                body = json.dumps(compute(), default=to_json).encode("utf-8")
+            finally:
+                with self._lock:
+                    self._locks.pop(key, None)
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            entry = (body, etag, time.time() + ttl)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+
+    def clear(self) -> None:
+        """Drops every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+
+class WeatherQueryService:
+    """
+    Read-only HTTP service answering current-weather and analytics-view
+    queries as JSON, so consumers share one connection pool and one cached
+    result per view instead of each querying Postgres.
+
+    Routes:
+        GET /weather                        current weather of every city
+        GET /weather/<country>/<city>       current weather of one city
+        GET /views/<view>                   rows of an analytics view
+        GET /nearest?lat=..&lon=..&k=..     closest monitored cities
+
+    View responses stay cached until the next ingest cycle has finished or
+    the ingest generation changes, e.g. after a ring buffer replay; current
+    weather follows the LatestWeatherCache refresh. Responses carry an
+    ETag and `If-None-Match` requests are answered with 304 Not Modified.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        cycle_seconds: Optional[float] = None,
+        cycle_offset_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes the service.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            cycle_seconds (Optional[float]): Length of the ingest cycle;
+                defaults to INGEST_CYCLE_SECONDS or 3600.
+            cycle_offset_seconds (Optional[float]): Seconds into the cycle by
+                which the ingest run has finished; defaults to
+                INGEST_CYCLE_OFFSET_SECONDS or 300.
+        """
+        self.data_api = data_api
+        self.latest = LatestWeatherCache(data_api)
+        self.nearest = NearestCityLookup(data_api, latest=self.latest)
+        self.cache = ResponseCache(
+            int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+        )
+        if cycle_seconds is None:
+            cycle_seconds = float(os.getenv("INGEST_CYCLE_SECONDS", "3600"))
+        if cycle_offset_seconds is None:
+            cycle_offset_seconds = float(
+                os.getenv("INGEST_CYCLE_OFFSET_SECONDS", "300")
+            )
+        self.cycle_seconds = cycle_seconds
+        self.cycle_offset_seconds = cycle_offset_seconds
+
+    def view_ttl(self) -> float:
+        """Seconds until the analytics views can change."""
+        return seconds_until_next_cycle(
+            self.cycle_seconds, self.cycle_offset_seconds
+        )
+
+    def current_weather(
+        self,
+        country_name: Optional[str] = None,
+        city_name: Optional[str] = None,
+    ) -> Any:
+        """
+        Returns the current weather of one city, or of every city.
+
+        Args:
+            country_name (Optional[str]): The country of the city.
+            city_name (Optional[str]): The name of the city.
+
+        Returns:
+            Any: The observation (None if unknown), or a list of observations.
+        """
+        if city_name is None:
+            observations = self.latest.get_all()
+            return [
+                dict(observation, city_name=city, country_name=country)
+                for (city, country), observation in observations.items()
+            ]
+        return self.latest.get(city_name, country_name)
+
+    def view_rows(self, view: str) -> Any:
+        """
+        Returns every row of an analytics view.
+
+        Args:
+            view (str): One of VIEWS.
+
+        Returns:
+            Any: The rows as dictionaries.
+        """
+        return self.data_api.fetch_records(f"SELECT * FROM {view};")
+
+    def resolve(
+        self, path: str, query: Dict[str, Any]
+    ) -> Optional[Tuple[str, float, Callable[[], Any]]]:
+        """
+        Maps a request to its cache key, TTL and body producer.
+
+        Args:
+            path (str): The request path.
+            query (Dict[str, Any]): The parsed query string.
+
+        Returns:
+            Optional[Tuple[str, float, Callable[[], Any]]]: None for unknown
+            routes.
+
+        Raises:
+            ValueError: If query parameters are invalid.
+        """
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        latest_ttl = self.latest.max_age_seconds
+        if parts == ["weather"]:
+            return "weather", latest_ttl, self.current_weather
+        if len(parts) == 3 and parts[0] == "weather":
+            country, city = parts[1].upper(), parts[2]
+            return (
+                f"weather/{country}/{city}",
+                latest_ttl,
+                lambda: self.current_weather(country, city),
+            )
+        if len(parts) == 2 and parts[0] == "views" and parts[1] in VIEWS:
+            view = parts[1]
+            # Responses cached before the data changed are never served.
+            generation = self.data_api.current_generation()
+            return (
+                f"views/{view}/{generation}",
+                self.view_ttl(),
+                lambda: self.view_rows(view),
+            )
+        if parts == ["nearest"]:
+            latitude = float(query["lat"][0])
+            longitude = float(query["lon"][0])
+            k = min(int(query.get("k", ["1"])[0]), 100)
+            if not -90 <= latitude <= 90:
+                raise ValueError(f"latitude out of range: {latitude}")
+            if not -180 <= longitude <= 180:
+                raise ValueError(f"longitude out of range: {longitude}")
+            if k < 1:
+                raise ValueError(f"k must be positive: {k}")
+            return (
+                f"nearest/{latitude:.4f}/{longitude:.4f}/{k}",
+                latest_ttl,
+                lambda: self.nearest.nearest(latitude, longitude, k),
+            )
+        return None
+
+    def handler(self) -> type:
+        """Builds the request handler class bound to this service."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                try:
+                    route = service.resolve(url.path, parse_qs(url.query))
+                except (KeyError, ValueError) as e:
+                    self.send_error(400, f"Invalid query: {e}")
+                    return
+                if route is None:
+                    self.send_error(404)
+                    return
+                try:
+                    body, etag, expires = service.cache.get(*route)
+                except Exception as e:
+                    logging.error("Failed to serve %s: %s", url.path, e)
+                    self.send_error(503)
+                    return
+                max_age = max(int(expires - time.time()), 0)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", f"max-age={max_age}")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", f"max-age={max_age}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logging.debug(format, *args)
+
+        return Handler
+
+    def serve(self, host: str, port: int) -> None:
+        """
+        Serves requests until interrupted.
+
+        Args:
+            host (str): Address to bind.
+            port (int): Port to bind.
+        """
+        server = ThreadingHTTPServer((host, port), self.handler())
+        logging.info("Weather query service listening on %s:%d", host, port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve current weather and analytics views over HTTP"
+    )
+    parser.add_argument(
+        "--host", default=os.getenv("QUERY_SERVICE_HOST", "127.0.0.1")
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.getenv("QUERY_SERVICE_PORT", "8080")),
+    )
+    args = parser.parse_args()
+    WeatherQueryService(DataAPI(db_config)).serve(args.host, args.port)
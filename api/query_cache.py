@@ -0,0 +1,207 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# A quoted literal or identifier (kept as is), or a run of whitespace.
+_TOKEN = re.compile(
+    r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\2\$)|\s+""",
+    re.DOTALL,
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalizes a SQL string so formatting differences map to the same cache
+    entry: whitespace runs outside quoted literals and identifiers collapse
+    to one space and a trailing semicolon is dropped.
+
+    Args:
+        query (str): The SQL query.
+
+    Returns:
+        str: The normalized query.
+    """
+    normalized = _TOKEN.sub(lambda match: match.group(1) or " ", query)
+    return normalized.strip().rstrip(";").strip()
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimates the memory held by a cached result in bytes.
+
+    Args:
+        value (Any): A DataFrame or a list of row tuples.
+
+    Returns:
+        int: The approximate size.
+    """
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(deep=True).sum())
+    size = sys.getsizeof(value)
+    for row in value:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+    return size
+
+
+class QueryCache:
+    """
+    LRU cache of query results bounded by entry count and estimated size.
+
+    Entries are keyed on the normalized SQL plus its parameters, expire after
+    a per-query TTL, and are only valid for the ingest generation they were
+    read in: once an ingest run bumps the generation, every older entry is a
+    miss.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries (Optional[int]): Maximum number of entries; defaults to
+                QUERY_CACHE_MAX_ENTRIES or 256.
+            max_bytes (Optional[int]): Maximum estimated size of all entries;
+                defaults to QUERY_CACHE_MAX_MB (64) megabytes.
+            default_ttl (Optional[float]): TTL in seconds for queries that do
+                not set one; defaults to QUERY_CACHE_TTL or 3600.
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+        if max_bytes is None:
+            max_bytes = int(
+                float(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024
+            )
+        if default_ttl is None:
+            default_ttl = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (value, size, expires_at, generation), least recent first
+        self._entries: "OrderedDict[Hashable, Tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        kind: str, query: str, params: Optional[Dict[str, Any]] = None
+    ) -> Hashable:
+        """
+        Builds the cache key of a query.
+
+        Args:
+            kind (str): The result type, so a DataFrame and the rows of the
+                same query are cached separately.
+            query (str): The SQL query.
+            params (Optional[Dict[str, Any]]): Bound parameters.
+
+        Returns:
+            Hashable: The key.
+        """
+        items = tuple(
+            sorted(
+                (name, repr(value)) for name, value in (params or {}).items()
+            )
+        )
+        return kind, normalize_sql(query), items
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """
+        Returns a copy of a cached result, or None on a miss.
+
+        Args:
+            key (Hashable): The key from `make_key`.
+            generation (int): The current ingest generation.
+
+        Returns:
+            Optional[Any]: The result, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at, entry_generation = entry
+            expired = expires_at <= time.monotonic()
+            if expired or entry_generation != generation:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may modify what they get back.
+        return value.copy()
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: int,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Stores a result, evicting the least recently used entries to stay
+        within the bounds. Results larger than the whole cache are not stored.
+
+        Args:
+            key (Hashable): The key from `make_key`.
+            value (Any): The result.
+            generation (int): The ingest generation the result was read in.
+            ttl (Optional[float]): Seconds the result stays valid.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (
+                value,
+                size,
+                time.monotonic() + ttl,
+                generation,
+            )
+            self._bytes += size
+            while (
+                len(self._entries) > self.max_entries
+                or self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache's hit, miss and size counters.
+
+        Returns:
+            Dict[str, int]: The counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -1,5 +1,6 @@
+from .api_keys import APIKeyPool
 from .api_setup import APIConfig
 from .logging_setup import LoggerSetup
 from .db_setup import db_config
 
-__all__ = ["APIConfig", "LoggerSetup", "db_config"]
+__all__ = ["APIConfig", "APIKeyPool", "LoggerSetup", "db_config"]
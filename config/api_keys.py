@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from typing import Deque, Dict, List, Optional
+
+load_dotenv()
+
+
+class APIKeyState:
+    """Rate and quota accounting for a single API key."""
+
+    def __init__(self, key: str) -> None:
+        """
+        Initializes the state of a key with no recorded requests.
+
+        Args:
+            key (str): The API key.
+        """
+        self.key = key
+        self.recent: Deque[float] = deque()
+        self.day: str = ""
+        self.day_count: int = 0
+        self.total: int = 0
+        self.throttled: int = 0
+        self.cooldown_until: float = 0.0
+
+    def prune(self, now: float) -> None:
+        """Drops requests older than the one-minute window."""
+        while self.recent and now - self.recent[0] >= 60:
+            self.recent.popleft()
+
+    def used_today(self, now: float) -> int:
+        """Returns the number of requests sent on the current UTC day."""
+        today = time.strftime("%Y-%m-%d", time.gmtime(now))
+        if today != self.day:
+            self.day = today
+            self.day_count = 0
+        return self.day_count
+
+
+class APIKeyPool:
+    """
+    Spreads requests over a pool of API keys, tracking each key's per-minute
+    rate and daily quota separately.
+
+    `acquire` hands out the least-loaded key that still has capacity and waits
+    when every key is at its limit. Keys that are throttled (429) or rejected are
+    taken out of rotation until their cooldown expires.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        requests_per_minute: int = 60,
+        daily_quota: int = 0,
+        cooldown_seconds: float = 60.0,
+    ) -> None:
+        """
+        Initializes the pool.
+
+        Args:
+            keys (List[str]): The API keys.
+            requests_per_minute (int): Per-key request limit per minute.
+            daily_quota (int): Per-key request limit per UTC day, 0 for none.
+            cooldown_seconds (float): How long a throttled key is rested.
+
+        Raises:
+            ValueError: If no key is given.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            raise ValueError("At least one API key is required")
+        self.requests_per_minute = requests_per_minute
+        self.daily_quota = daily_quota
+        self.cooldown_seconds = cooldown_seconds
+        self.states: Dict[str, APIKeyState] = {
+            key: APIKeyState(key) for key in keys
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "APIKeyPool":
+        """
+        Builds a pool from WEATHER_API_KEYS (comma-separated), falling back to
+        WEATHER_API_KEY. Limits come from WEATHER_API_KEY_RPM (default 60),
+        WEATHER_API_KEY_DAILY_QUOTA (default 0, unlimited) and
+        WEATHER_API_KEY_COOLDOWN seconds (default 60).
+
+        Returns:
+            APIKeyPool: The configured pool.
+        """
+        keys = os.getenv("WEATHER_API_KEYS", "").split(",")
+        keys = [key.strip() for key in keys if key.strip()]
+        if not keys:
+            keys = [os.getenv("WEATHER_API_KEY", "")]
+        return cls(
+            keys,
+            requests_per_minute=int(os.getenv("WEATHER_API_KEY_RPM", "60")),
+            daily_quota=int(os.getenv("WEATHER_API_KEY_DAILY_QUOTA", "0")),
+            cooldown_seconds=float(
+                os.getenv("WEATHER_API_KEY_COOLDOWN", "60")
+            ),
+        )
+
+    @property
+    def keys(self) -> List[str]:
+        """The keys in the pool."""
+        return list(self.states)
+
+    def _wait_time(self, state: APIKeyState, now: float) -> Optional[float]:
+        """
+        Returns how long until the key can send a request, 0 if it can send now
+        or None if its daily quota is used up.
+        """
+        if self.daily_quota and state.used_today(now) >= self.daily_quota:
+            return None
+        wait = max(state.cooldown_until - now, 0.0)
+        if len(state.recent) >= self.requests_per_minute:
+            wait = max(wait, state.recent[0] + 60 - now)
+        return wait
+
+    def acquire(self) -> str:
+        """
+        Reserves one request on the least-loaded key with capacity, waiting
+        until a key frees up if all are at their limit.
+
+        Returns:
+            str: The key to use for the request.
+
+        Raises:
+            RuntimeError: If every key has used up its daily quota.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                best: Optional[APIKeyState] = None
+                shortest_wait: Optional[float] = None
+                for state in self.states.values():
+                    state.prune(now)
+                    wait = self._wait_time(state, now)
+                    if wait is None:
+                        continue
+                    if wait == 0 and (
+                        best is None or len(state.recent) < len(best.recent)
+                    ):
+                        best = state
+                    if shortest_wait is None or wait < shortest_wait:
+                        shortest_wait = wait
+                if best is not None:
+                    best.recent.append(now)
+                    best.day_count = best.used_today(now) + 1
+                    best.total += 1
+                    return best.key
+                if shortest_wait is None:
+                    raise RuntimeError(
+                        "Daily quota exhausted for all API keys"
+                    )
+            time.sleep(min(shortest_wait, 1.0))
+
+    def report_throttled(
+        self, key: str, retry_after: Optional[float] = None
+    ) -> None:
+        """
+        Takes a key out of rotation after a 429 or quota error.
+
+        Args:
+            key (str): The throttled key.
+            retry_after (Optional[float]): Seconds suggested by the server.
+        """
+        with self._lock:
+            state = self.states.get(key)
+            if state is None:
+                return
+            state.throttled += 1
+            state.cooldown_until = time.time() + (
+                retry_after if retry_after else self.cooldown_seconds
+            )
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns per-key usage, with keys masked to their last four characters.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Usage counters by masked key.
+        """
+        with self._lock:
+            now = time.time()
+            result = {}
+            for state in self.states.values():
+                state.prune(now)
+                result[f"...{state.key[-4:]}"] = {
+                    "last_minute": len(state.recent),
+                    "today": state.used_today(now),
+                    "total": state.total,
+                    "throttled": state.throttled,
+                    "cooling_down": state.cooldown_until > now,
+                }
+            return result
+
+
+_shared_pool: Optional[APIKeyPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_key_pool() -> APIKeyPool:
+    """
+    Returns the process-wide key pool built from the environment, so every
+    APIConfig instance shares the same rate accounting.
+
+    Returns:
+        APIKeyPool: The shared pool.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = APIKeyPool.from_env()
+        return _shared_pool
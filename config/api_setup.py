@@ -1,21 +1,257 @@
 import requests
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from typing import Dict, Any
+from monitoring import run_metrics, tracer
+from config.api_keys import APIKeyPool, shared_key_pool
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 load_dotenv()
 
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Responses that take the key out of rotation: rate limit or quota exceeded,
+# and blocked or invalid keys.
+KEY_REJECTED_STATUS_CODES = {401, 429}
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Returns the Retry-After header in seconds, if the server sent one."""
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class WeatherBatch:
+    """
+    Request deduplication for one ingest run. Coordinates are rounded to
+    `precision` decimals; the first request for a rounded location is sent
+    and every other request for it, including concurrent ones, gets the same
+    response body.
+
+    With an `ids_path`, the provider's city id of every answered location is
+    remembered in that JSON file. Later batches fetch the remembered
+    locations among the coordinates announced to them with the multi-city
+    group endpoint, up to `APIConfig.group_max_ids` per call; locations a
+    group call does not answer fall back to one single request each, and
+    their ids are dropped from the file.
+    """
+
+    def __init__(
+        self, precision: int = 2, ids_path: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the batch.
+
+        Args:
+            precision (int): Decimals kept when rounding coordinates.
+            ids_path (Optional[str]): JSON file mapping locations to provider
+                city ids, enabling group requests.
+        """
+        self.precision = precision
+        self.ids_path = ids_path
+        self.provider_ids: Dict[str, int] = {}
+        if ids_path and os.path.exists(ids_path):
+            with open(ids_path) as ids_file:
+                self.provider_ids = json.load(ids_file)
+        self._ids_changed = False
+        self._skipped: Set[str] = set()
+        # Rounded location -> response body, or None if it must be refetched.
+        self.entries: Dict[str, Future] = {}
+        # Locations whose response was handed out at least once.
+        self._handed_out: Set[str] = set()
+        # Threads resolving entries through group requests.
+        self.prefetches: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def key(self, lat: float, lon: float) -> str:
+        """Returns the rounded location of a pair of coordinates."""
+        return f"{lat:.{self.precision}f},{lon:.{self.precision}f}"
+
+    def claim(
+        self, key: str, stale: Optional[Future] = None
+    ) -> Tuple[Future, bool]:
+        """
+        Returns the entry of a location, creating it if needed.
+
+        Args:
+            key (str): The rounded location.
+            stale (Optional[Future]): An entry resolved with None; it is
+                replaced by a new one unless another caller already did.
+
+        Returns:
+            Tuple[Future, bool]: The entry, and whether the caller created it
+            and must resolve it.
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry is stale:
+                entry = self.entries[key] = Future()
+                return entry, True
+            return entry, False
+
+    def claim_known(
+        self, keys: Iterable[str]
+    ) -> List[Tuple[str, int, Future]]:
+        """
+        Creates the entries of the locations with a known provider city id
+        that nobody claimed yet.
+
+        Args:
+            keys (Iterable[str]): The rounded locations.
+
+        Returns:
+            List[Tuple[str, int, Future]]: The claimed locations, their
+            provider city ids and their entries, to be resolved by the caller.
+        """
+        claimed = []
+        with self._lock:
+            for key in keys:
+                city_id = self.provider_ids.get(key)
+                if city_id and key not in self.entries:
+                    entry = self.entries[key] = Future()
+                    claimed.append((key, city_id, entry))
+        return claimed
+
+    def hand_out(self, key: str) -> bool:
+        """
+        Records that the response of a location is handed out to a caller.
+
+        Returns:
+            bool: Whether it was handed out before, i.e. a request was saved.
+        """
+        with self._lock:
+            if key in self._handed_out:
+                return True
+            self._handed_out.add(key)
+            return False
+
+    def learn(self, key: str, payload: bytes) -> None:
+        """Remembers the provider city id of an answered location."""
+        if self.ids_path is None:
+            return
+        try:
+            city_id = json.loads(payload).get("id")
+        except ValueError:
+            return
+        if city_id:
+            with self._lock:
+                if key in self._skipped:
+                    return
+                if self.provider_ids.get(key) != city_id:
+                    self.provider_ids[key] = city_id
+                    self._ids_changed = True
+
+    def forget(self, key: str) -> None:
+        """Drops the provider city id of a location a group call skipped."""
+        with self._lock:
+            self._skipped.add(key)
+            if self.provider_ids.pop(key, None) is not None:
+                self._ids_changed = True
+
+    def save(self) -> None:
+        """Writes the provider city ids back if they changed."""
+        if self.ids_path is None or not self._ids_changed:
+            return
+        with self._lock:
+            ids = dict(self.provider_ids)
+        with open(self.ids_path + ".tmp", "w") as ids_file:
+            json.dump(ids, ids_file)
+        os.replace(self.ids_path + ".tmp", self.ids_path)
+
 
 class APIConfig:
     """Handles the configuration and API calls to the OpenWeatherMap API."""
 
-    def __init__(self):
-        """Initializes the API configuration using environment variables."""
-        self.api_key: str = os.getenv("WEATHER_API_KEY", "")
+    def __init__(self, key_pool: Optional[APIKeyPool] = None):
+        """
+        Initializes the API configuration using environment variables.
+
+        Args:
+            key_pool (Optional[APIKeyPool]): The API keys to spread requests
+                over. Defaults to the process-wide pool built from
+                WEATHER_API_KEYS / WEATHER_API_KEY.
+        """
+        self.key_pool: APIKeyPool = key_pool or shared_key_pool()
+        self.api_key: str = self.key_pool.keys[0]
         self.geo_url: str = "http://api.openweathermap.org/geo/1.0/direct"
         self.weather_url: str = (
             "https://api.openweathermap.org/data/2.5/weather"
         )
+        self.max_retries: int = int(os.getenv("WEATHER_API_RETRIES", "2"))
+        self.retry_backoff: float = float(
+            os.getenv("WEATHER_API_RETRY_BACKOFF", "0.5")
+        )
+        self.group_url: str = os.getenv(
+            "WEATHER_GROUP_URL",
+            "https://api.openweathermap.org/data/2.5/group",
+        )
+        self.group_max_ids: int = int(os.getenv("WEATHER_GROUP_MAX_IDS", "20"))
+        self.batch: Optional[WeatherBatch] = None
+
+    def _get(self, url: str, params: Dict[str, Any]) -> requests.Response:
+        """
+        Sends a GET request with a key from the key pool. A key that answers 429
+        or 401 is taken out of rotation and the request is retried right away
+        with another key. Connection errors and other retryable status codes are
+        retried with exponential backoff. Retries and received bytes are counted
+        in the run metrics.
+
+        Args:
+            url (str): The endpoint to call.
+            params (Dict[str, Any]): The query parameters, without the key.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            HTTPError: If the API call still fails after all retries.
+        """
+        attempt = 0
+        key_switches = 0
+        while True:
+            key = self.key_pool.acquire()
+            try:
+                response = requests.get(url, params={**params, "appid": key})
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                run_metrics.increment("retries")
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                continue
+            if response.status_code in KEY_REJECTED_STATUS_CODES:
+                self.key_pool.report_throttled(key, _retry_after(response))
+                if key_switches < len(self.key_pool.keys) - 1:
+                    key_switches += 1
+                    run_metrics.increment("retries")
+                    continue
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt >= self.max_retries
+            ):
+                break
+            attempt += 1
+            run_metrics.increment("retries")
+            time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        run_metrics.increment("bytes", len(response.content))
+        response.raise_for_status()
+        return response
 
     def fetch_coordinates(self, city: str, country: str) -> Dict[str, Any]:
         """
@@ -34,31 +270,192 @@ class APIConfig:
         params = {
             "q": f"{city},{country}",
             "limit": 1,
-            "appid": self.api_key,
         }
-        response = requests.get(self.geo_url, params=params)
-        response.raise_for_status()
-        return response.json()
+        with tracer.span("APIConfig.fetch_coordinates", city=city):
+            with run_metrics.time_stage("geocode"):
+                response = self._get(self.geo_url, params)
+                return response.json()
 
-    def fetch_weather_data(self, lat: float, lon: float) -> Dict[str, Any]:
+    def fetch_weather_payload(self, lat: float, lon: float) -> bytes:
         """
-        Fetches weather data for the specified latitude and longitude.
+        Fetches the raw weather API response body for the specified latitude
+        and longitude, leaving JSON decoding to the caller.
 
         Args:
             lat (float): The latitude of the location.
             lon (float): The longitude of the location.
 
         Returns:
-            Dict[str, Any]: A dictionary containing weather data.
+            bytes: The JSON response body.
 
         Raises:
             HTTPError: If the API call fails.
         """
+        batch = self.batch
+        if batch is None:
+            return self._fetch_single_payload(lat, lon)
+        key = batch.key(lat, lon)
+        entry, owner = batch.claim(key)
+        while not owner:
+            with run_metrics.time_stage("fetch"):
+                payload = entry.result()
+            if payload is not None:
+                # The first caller of a group-served location saved nothing.
+                if batch.hand_out(key):
+                    run_metrics.increment("deduplicated")
+                return payload
+            # Not answered by its group request: the first waiter fetches it
+            # with a single request and the others wait for that.
+            entry, owner = batch.claim(key, stale=entry)
+        try:
+            payload = self._fetch_single_payload(lat, lon)
+        except Exception as e:
+            entry.set_exception(e)
+            raise
+        entry.set_result(payload)
+        batch.learn(key, payload)
+        if batch.hand_out(key):
+            run_metrics.increment("deduplicated")
+        return payload
+
+    def _fetch_single_payload(self, lat: float, lon: float) -> bytes:
         params = {
             "lat": lat,
             "lon": lon,
-            "appid": self.api_key,
         }
-        response = requests.get(self.weather_url, params=params)
-        response.raise_for_status()
-        return response.json()
+        with tracer.span("APIConfig.fetch_weather_payload", lat=lat, lon=lon):
+            with run_metrics.time_stage("fetch"):
+                return self._get(self.weather_url, params).content
+
+    def fetch_weather_group(self, city_ids: Sequence[int]) -> Dict[int, bytes]:
+        """
+        Fetches the weather of several cities by provider city id with the
+        multi-city group endpoint, `group_max_ids` ids per request.
+
+        Args:
+            city_ids (Sequence[int]): The provider city ids.
+
+        Returns:
+            Dict[int, bytes]: The JSON body of each answered city, shaped like
+            a single weather response.
+
+        Raises:
+            HTTPError: If an API call fails.
+        """
+        payloads: Dict[int, bytes] = {}
+        for start in range(0, len(city_ids), self.group_max_ids):
+            chunk = city_ids[start : start + self.group_max_ids]
+            params = {"id": ",".join(str(city_id) for city_id in chunk)}
+            with tracer.span("APIConfig.fetch_weather_group", ids=len(chunk)):
+                with run_metrics.time_stage("fetch"):
+                    response = self._get(self.group_url, params)
+                for entry in response.json().get("list", []):
+                    payloads[entry["id"]] = json.dumps(entry).encode("utf-8")
+        return payloads
+
+    def _prefetch_group(
+        self, batch: WeatherBatch, claimed: List[Tuple[str, int, Future]]
+    ) -> None:
+        """
+        Resolves claimed batch entries through group requests; entries a
+        request does not answer are resolved with None. Ids a successful
+        request leaves out are forgotten by the batch.
+
+        Args:
+            batch (WeatherBatch): The batch the entries belong to.
+            claimed (List[Tuple[str, int, Future]]): Rounded locations,
+                their provider city ids and their entries.
+        """
+        for start in range(0, len(claimed), self.group_max_ids):
+            chunk = claimed[start : start + self.group_max_ids]
+            try:
+                payloads = self.fetch_weather_group(
+                    [city_id for _, city_id, _ in chunk]
+                )
+            except Exception as e:
+                logging.warning("Group weather request failed: %s", e)
+                payloads = None
+            for key, city_id, entry in chunk:
+                payload = payloads.get(city_id) if payloads else None
+                if payloads is not None and payload is None:
+                    batch.forget(key)
+                entry.set_result(payload)
+
+    def prefetch_weather(
+        self, coordinates: Iterable[Tuple[float, float]]
+    ) -> None:
+        """
+        Starts group requests, in a background thread, for the locations
+        among `coordinates` whose provider city id the current batch knows;
+        requests for them wait for the group response. Does nothing outside
+        a batch.
+
+        Args:
+            coordinates (Iterable[Tuple[float, float]]): (latitude, longitude)
+                of locations the run is about to fetch.
+        """
+        batch = self.batch
+        if batch is None:
+            return
+        claimed = batch.claim_known(
+            batch.key(lat, lon) for lat, lon in coordinates
+        )
+        if not claimed:
+            return
+        prefetch = threading.Thread(
+            target=self._prefetch_group,
+            args=(batch, claimed),
+            name="WeatherGroupPrefetch",
+        )
+        prefetch.start()
+        batch.prefetches.append(prefetch)
+
+    @contextmanager
+    def weather_batch(
+        self, coordinates: Iterable[Tuple[float, float]] = ()
+    ) -> Iterator[WeatherBatch]:
+        """
+        Deduplicates weather requests by rounded coordinates while the block
+        runs, see WeatherBatch. The rounding is WEATHER_COORD_PRECISION
+        decimals (default 2, about 1 km); WEATHER_GROUP_IDS names the file of
+        provider city ids that enables group requests.
+
+        Args:
+            coordinates (Iterable[Tuple[float, float]]): Locations of the run
+                known up front, prefetched like with `prefetch_weather`.
+                Locations found later can be announced with that method.
+
+        Yields:
+            WeatherBatch: The batch.
+        """
+        batch = WeatherBatch(
+            precision=int(os.getenv("WEATHER_COORD_PRECISION", "2")),
+            ids_path=os.getenv("WEATHER_GROUP_IDS") or None,
+        )
+        self.batch = batch
+        try:
+            self.prefetch_weather(coordinates)
+            yield batch
+        finally:
+            self.batch = None
+            for prefetch in batch.prefetches:
+                prefetch.join()
+            batch.save()
+
+    def fetch_weather_data(self, lat: float, lon: float) -> Dict[str, Any]:
+        """
+        Fetches weather data for the specified latitude and longitude.
+
+        Args:
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+
+        Returns:
+            Dict[str, Any]: A dictionary containing weather data.
+
+        Raises:
+            HTTPError: If the API call fails.
+        """
+        payload = self.fetch_weather_payload(lat, lon)
+        with run_metrics.time_stage("parse"):
+            return json.loads(payload)
@@ -1,10 +1,25 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import threading
+from typing import Dict
 
 
 class LoggerSetup:
-    """Configures and manages a rotating file logger with up to 2 file copies."""
+    """
+    Configures and manages a rotating file logger with up to 2 file copies.
+
+    Records are put on an in-memory queue by a QueueHandler and written to disk by
+    a single QueueListener thread per log file, so logging threads never block
+    on file I/O. Instantiating the class again for the same logger or file
+    reuses the existing handler and listener.
+    """
+
+    _listeners: Dict[str, QueueListener] = {}
+    _queues: Dict[str, "queue.Queue[logging.LogRecord]"] = {}
+    _lock = threading.Lock()
 
     def __init__(
         self,
@@ -31,20 +46,81 @@ class LoggerSetup:
         self.setup_logging()
 
     def setup_logging(self):
-        """Configures logging to use a rotating file handler."""
+        """
+        Attaches a queue handler for the log file to the logger, starting the
+        file-writing listener thread on first use.
+        """
         os.makedirs(self.full_log_path, exist_ok=True)
-
-        log_formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)s - %(message)s"
+        log_path = os.path.realpath(
+            os.path.join(self.full_log_path, self.log_filename)
         )
 
-        handler = RotatingFileHandler(
-            os.path.join(self.full_log_path, self.log_filename),
-            maxBytes=5 * 1024 * 1024,  # 5 MB
-            backupCount=1,
-        )
-        handler.setFormatter(log_formatter)
+        with LoggerSetup._lock:
+            log_queue = LoggerSetup._queues.get(log_path)
+            if log_queue is None:
+                log_formatter = logging.Formatter(
+                    "%(asctime)s - %(levelname)s - %(message)s"
+                )
+                handler = RotatingFileHandler(
+                    log_path,
+                    maxBytes=5 * 1024 * 1024,  # 5 MB
+                    backupCount=1,
+                )
+                handler.setFormatter(log_formatter)
+
+                log_queue = queue.Queue(-1)
+                listener = QueueListener(log_queue, handler)
+                listener.start()
+                LoggerSetup._queues[log_path] = log_queue
+                LoggerSetup._listeners[log_path] = listener
+
+            already_attached = any(
+                isinstance(h, QueueHandler) and h.queue is log_queue
+                for h in self.logger.handlers
+            )
+            if not already_attached:
+                self.logger.addHandler(QueueHandler(log_queue))
 
         self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(handler)
         self.logger.propagate = False
+
+    @staticmethod
+    def queue_root_handlers() -> None:
+        """
+        Moves the handlers installed on the root logger (e.g. by
+        `logging.basicConfig`) behind a queue, so worker threads logging through
+        the `logging` module functions no longer write to them directly.
+        Calling it again is a no-op.
+        """
+        root = logging.getLogger()
+        with LoggerSetup._lock:
+            if "<root>" in LoggerSetup._listeners:
+                return
+            handlers = [
+                h for h in root.handlers if not isinstance(h, QueueHandler)
+            ]
+            if not handlers:
+                return
+            log_queue = queue.Queue(-1)
+            listener = QueueListener(
+                log_queue, *handlers, respect_handler_level=True
+            )
+            for handler in handlers:
+                root.removeHandler(handler)
+            root.addHandler(QueueHandler(log_queue))
+            listener.start()
+            LoggerSetup._queues["<root>"] = log_queue
+            LoggerSetup._listeners["<root>"] = listener
+
+    @staticmethod
+    def shutdown() -> None:
+        """Flushes pending records and stops all listener threads."""
+        with LoggerSetup._lock:
+            listeners = list(LoggerSetup._listeners.values())
+            LoggerSetup._listeners.clear()
+            LoggerSetup._queues.clear()
+        for listener in listeners:
+            listener.stop()
+
+
+atexit.register(LoggerSetup.shutdown)
@@ -0,0 +1,231 @@
+from database import SQLAlchemyConnection
+from config.db_setup import db_config
+from sqlalchemy import text
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+GRANULARITIES = ("hour", "day")
+
+
+class WeatherCompaction:
+    """
+    Replaces raw observations older than a retention age with hourly or daily
+    aggregates in 'weather_data_archive'.
+
+    Rows are moved in bounded batches, each in its own short transaction: one
+    statement deletes a batch of old 'weather_observations' rows, aggregates
+    what it deleted and merges the aggregates into the archive. A bucket that
+    spans batches (or runs) is merged with count-weighted averages, so the
+    archive matches aggregating all of the raw rows at once.
+    """
+
+    def __init__(
+        self,
+        db_connection: SQLAlchemyConnection,
+        retention_days: float = 30,
+        granularity: str = "hour",
+        batch_size: int = 5000,
+        pause_seconds: float = 0.1,
+    ) -> None:
+        """
+        Initializes the WeatherCompaction.
+
+        Args:
+            db_connection (SQLAlchemyConnection): Database connection.
+            retention_days (float): Raw rows older than this are compacted.
+            granularity (str): Bucket size of the aggregates, "hour" or "day".
+            batch_size (int): Raw rows moved per transaction.
+            pause_seconds (float): Pause between batches to leave room for the
+                ingest.
+
+        Raises:
+            ValueError: If the granularity is not supported.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        self.db_connection = db_connection
+        self.retention = timedelta(days=retention_days)
+        self.granularity = granularity
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    @staticmethod
+    def compact_batch_query():
+        """
+        Builds the statement that moves one batch of raw rows into the archive.
+        """
+        return text(
+            """
+            WITH batch AS (
+                DELETE FROM weather_observations
+                WHERE weather_id IN (
+                    SELECT weather_id FROM weather_observations
+                    WHERE record_time < :cutoff
+                    ORDER BY weather_id
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING city_id, condition_id, temperature, humidity,
+                          pressure, rain, record_time
+            ), aggregated AS (
+                SELECT
+                    c.country_name,
+                    c.city_name,
+                    date_trunc(:granularity, b.record_time) AS bucket_start,
+                    COUNT(*) AS observation_count,
+                    AVG(b.temperature) AS avg_temperature,
+                    MIN(b.temperature) AS min_temperature,
+                    MAX(b.temperature) AS max_temperature,
+                    AVG(b.humidity) AS avg_humidity,
+                    AVG(b.pressure) AS avg_pressure,
+                    SUM(b.rain) AS total_rain,
+                    MODE() WITHIN GROUP (ORDER BY w.description) AS description
+                FROM batch b
+                JOIN cities c ON c.city_id = b.city_id
+                LEFT JOIN weather_conditions w
+                  ON w.condition_id = b.condition_id
+                GROUP BY c.country_name, c.city_name, bucket_start
+            ), merged AS (
+                INSERT INTO weather_data_archive AS a (
+                    country_name, city_name, granularity, bucket_start,
+                    observation_count, avg_temperature, min_temperature,
+                    max_temperature, avg_humidity, avg_pressure, total_rain,
+                    description
+                )
+                SELECT
+                    country_name, city_name, :granularity, bucket_start,
+                    observation_count, avg_temperature, min_temperature,
+                    max_temperature, avg_humidity, avg_pressure, total_rain,
+                    description
+                FROM aggregated
+                ON CONFLICT (country_name, city_name, granularity, bucket_start)
+                DO UPDATE SET
+                    avg_temperature = (
+                        a.avg_temperature * a.observation_count
+                        + EXCLUDED.avg_temperature * EXCLUDED.observation_count
+                    ) / (a.observation_count + EXCLUDED.observation_count),
+                    avg_humidity = (
+                        a.avg_humidity * a.observation_count
+                        + EXCLUDED.avg_humidity * EXCLUDED.observation_count
+                    ) / (a.observation_count + EXCLUDED.observation_count),
+                    avg_pressure = (
+                        a.avg_pressure * a.observation_count
+                        + EXCLUDED.avg_pressure * EXCLUDED.observation_count
+                    ) / (a.observation_count + EXCLUDED.observation_count),
+                    min_temperature = LEAST(
+                        a.min_temperature, EXCLUDED.min_temperature
+                    ),
+                    max_temperature = GREATEST(
+                        a.max_temperature, EXCLUDED.max_temperature
+                    ),
+                    total_rain = COALESCE(a.total_rain, 0)
+                        + COALESCE(EXCLUDED.total_rain, 0),
+                    description = CASE
+                        WHEN EXCLUDED.observation_count > a.observation_count
+                        THEN EXCLUDED.description ELSE a.description
+                    END,
+                    observation_count = a.observation_count
+                        + EXCLUDED.observation_count
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM batch), (SELECT COUNT(*) FROM merged);
+            """
+        )
+
+    def compact_batch(self, cutoff: datetime) -> int:
+        """
+        Moves one batch of raw rows older than the cutoff into the archive.
+
+        Args:
+            cutoff (datetime): Rows recorded before this are compacted.
+
+        Returns:
+            int: The number of raw rows removed.
+        """
+        with self.db_connection.transaction() as connection:
+            moved, buckets = connection.execute(
+                self.compact_batch_query(),
+                {
+                    "cutoff": cutoff,
+                    "batch_size": self.batch_size,
+                    "granularity": self.granularity,
+                },
+            ).one()
+        logging.debug("Compacted %d rows into %d buckets", moved, buckets)
+        return moved
+
+    def run(self, max_batches: int = 0) -> int:
+        """
+        Compacts batches until no raw row is older than the retention age.
+
+        Args:
+            max_batches (int): Stop after this many batches, 0 for no limit.
+
+        Returns:
+            int: The number of raw rows removed.
+        """
+        # Buckets are aligned so that a bucket is never split between the raw
+        # table and the archive.
+        cutoff = datetime.now() - self.retention
+        if self.granularity == "day":
+            cutoff = cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            cutoff = cutoff.replace(minute=0, second=0, microsecond=0)
+        logging.info(
+            "Compacting observations older than %s into %sly aggregates",
+            cutoff,
+            self.granularity,
+        )
+        total = batches = 0
+        while True:
+            try:
+                moved = self.compact_batch(cutoff)
+            except Exception as e:
+                logging.error(f"Compaction batch failed: {e}")
+                raise
+            total += moved
+            batches += 1
+            if moved < self.batch_size or batches == max_batches:
+                break
+            time.sleep(self.pause_seconds)
+        logging.info("Compacted %d rows in %d batches", total, batches)
+        return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Downsample old observations into weather_data_archive"
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=float,
+        default=float(os.getenv("COMPACTION_RETENTION_DAYS", "30")),
+    )
+    parser.add_argument(
+        "--granularity",
+        choices=GRANULARITIES,
+        default=os.getenv("COMPACTION_GRANULARITY", "hour"),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(os.getenv("COMPACTION_BATCH_SIZE", "5000")),
+    )
+    parser.add_argument(
+        "--max-batches", type=int, default=0, help="0 for no limit"
+    )
+    args = parser.parse_args()
+    compaction = WeatherCompaction(
+        SQLAlchemyConnection(db_config),
+        retention_days=args.retention_days,
+        granularity=args.granularity,
+        batch_size=args.batch_size,
+    )
+    compaction.run(args.max_batches)
@@ -1,5 +1,4 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 import logging
 
@@ -23,7 +22,19 @@ class SQLAlchemyConnection:
             f"/{db_config['database']}"
         )
         self.engine = create_engine(db_url)
-        self.Session = sessionmaker(bind=self.engine)
+        self._session_factory = None
+
+    @property
+    def Session(self):
+        """
+        The session factory bound to the engine. sqlalchemy.orm is only imported
+        when the first session is requested, so Core-only callers skip it.
+        """
+        if self._session_factory is None:
+            from sqlalchemy.orm import sessionmaker
+
+            self._session_factory = sessionmaker(bind=self.engine)
+        return self._session_factory
 
     @contextmanager
     def connect(self):
@@ -41,3 +52,17 @@ class SQLAlchemyConnection:
             raise
         finally:
             session.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        A context manager that yields a Core connection inside a transaction,
+        committed on success and rolled back if an exception occurs. Use it for
+        bulk statements that do not need an ORM session.
+        """
+        try:
+            with self.engine.begin() as connection:
+                yield connection
+        except Exception as e:
+            logging.error(f"Database error: {e}")
+            raise
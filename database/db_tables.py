@@ -23,14 +23,89 @@ class DatabaseTables:
         logging.info("DatabaseTables initialized with SQLAlchemy connection.")
 
     @staticmethod
-    def create_weather_data_table():
+    def create_weather_conditions_table():
         """
-        Creates the 'weather_data' table in the database.
+        Creates the 'weather_conditions' lookup table mapping weather
+        descriptions to small integer codes.
         """
-        create_weather_query = text(
+        create_conditions_query = text(
+            """
+        CREATE TABLE IF NOT EXISTS weather_conditions (
+            condition_id SMALLSERIAL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL UNIQUE
+        );
+        """
+        )
+        logging.info("Weather conditions table creation SQL prepared.")
+        return create_conditions_query
+
+    @staticmethod
+    def create_weather_observations_table():
+        """
+        Creates the 'weather_observations' table, the compact history of all
+        observations. Columns are ordered widest first to avoid padding.
+        """
+        create_observations_query = text(
             """
-        CREATE TABLE IF NOT EXISTS weather_data (
+        CREATE TABLE IF NOT EXISTS weather_observations (
+            record_time TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
             weather_id SERIAL PRIMARY KEY,
+            city_id INT NOT NULL,
+            temperature REAL,
+            rain REAL,
+            humidity SMALLINT,
+            pressure SMALLINT,
+            condition_id SMALLINT,
+            CONSTRAINT fk_observations_city FOREIGN KEY (city_id)
+                REFERENCES cities (city_id),
+            CONSTRAINT fk_observations_condition FOREIGN KEY (condition_id)
+                REFERENCES weather_conditions (condition_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_weather_observations_city_time
+            ON weather_observations (city_id, record_time);
+        CREATE INDEX IF NOT EXISTS idx_weather_observations_record_time
+            ON weather_observations (record_time);
+        """
+        )
+        logging.info("Weather observations table creation SQL prepared.")
+        return create_observations_query
+
+    @staticmethod
+    def create_weather_data_view():
+        """
+        Creates the 'weather_data' view, which presents 'weather_observations'
+        with the original 'weather_data' columns for existing queries.
+        """
+        create_weather_query = text(
+            """
+        CREATE OR REPLACE VIEW weather_data AS
+        SELECT
+            o.weather_id,
+            c.country_name,
+            c.city_name,
+            o.temperature::FLOAT AS temperature,
+            o.humidity::INT AS humidity,
+            o.pressure::INT AS pressure,
+            o.rain::FLOAT AS rain,
+            w.description,
+            o.record_time
+        FROM weather_observations o
+        JOIN cities c ON c.city_id = o.city_id
+        LEFT JOIN weather_conditions w ON w.condition_id = o.condition_id;
+        """
+        )
+        logging.info("Weather data view creation SQL prepared.")
+        return create_weather_query
+
+    @staticmethod
+    def create_weather_latest_table():
+        """
+        Creates the 'weather_latest' table holding the newest observation of
+        every city.
+        """
+        create_weather_latest_query = text(
+            """
+        CREATE TABLE IF NOT EXISTS weather_latest (
             country_name VARCHAR(50) NOT NULL,
             city_name VARCHAR(50) NOT NULL,
             temperature FLOAT,
@@ -39,13 +114,16 @@ class DatabaseTables:
             rain FLOAT,
             description VARCHAR(255),
             record_time TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            CONSTRAINT fk_country_city FOREIGN KEY (country_name, city_name)
+            PRIMARY KEY (country_name, city_name),
+            CONSTRAINT fk_latest_country_city FOREIGN KEY (country_name, city_name)
                 REFERENCES cities (country_name, city_name)
         );
+        CREATE INDEX IF NOT EXISTS idx_weather_latest_record_time
+            ON weather_latest (record_time);
         """
         )
-        logging.info("Weather data table creation SQL prepared.")
-        return create_weather_query
+        logging.info("Weather latest table creation SQL prepared.")
+        return create_weather_latest_query
 
     @staticmethod
     def create_cities_data_table():
@@ -56,8 +134,11 @@ class DatabaseTables:
             """
         CREATE TABLE IF NOT EXISTS cities (
             city_id SERIAL PRIMARY KEY,
-            city_name VARCHAR(50) UNIQUE NOT NULL,
-            country_name VARCHAR(50) UNIQUE NOT NULL
+            city_name VARCHAR(50) NOT NULL,
+            country_name VARCHAR(50) NOT NULL,
+            latitude DOUBLE PRECISION,
+            longitude DOUBLE PRECISION,
+            CONSTRAINT uq_cities_country_city UNIQUE (country_name, city_name)
         );
         """
         )
@@ -84,6 +165,103 @@ class DatabaseTables:
         logging.info("Simulations data table creation SQL prepared.")
         return create_simulations_query
 
+    @staticmethod
+    def create_city_jobs_table():
+        """
+        Creates the 'city_jobs' lease table used to share cities between
+        collector instances.
+        """
+        create_city_jobs_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS city_jobs (
+                city_id INT PRIMARY KEY,
+                lease_owner VARCHAR(100),
+                lease_expires TIMESTAMPTZ,
+                completed_sweep TIMESTAMPTZ,
+                CONSTRAINT fk_city_jobs FOREIGN KEY (city_id) REFERENCES cities(city_id)
+                    ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_city_jobs_lease_owner
+                ON city_jobs (lease_owner);
+        """
+        )
+        logging.info("City jobs table creation SQL prepared.")
+        return create_city_jobs_query
+
+    @staticmethod
+    def create_city_schedule_table():
+        """
+        Creates the 'city_schedule' table holding per-city polling intervals.
+        """
+        create_city_schedule_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS city_schedule (
+                city_id INT PRIMARY KEY,
+                poll_interval_minutes INT NOT NULL DEFAULT 60,
+                priority BOOLEAN NOT NULL DEFAULT FALSE,
+                next_due TIMESTAMP(0) WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_temperature FLOAT,
+                last_pressure INT,
+                last_rain FLOAT,
+                CONSTRAINT fk_city_schedule FOREIGN KEY (city_id) REFERENCES cities(city_id)
+                    ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_city_schedule_next_due
+                ON city_schedule (next_due);
+        """
+        )
+        logging.info("City schedule table creation SQL prepared.")
+        return create_city_schedule_query
+
+    @staticmethod
+    def create_weather_data_archive_table():
+        """
+        Creates the 'weather_data_archive' table holding hourly or daily
+        aggregates of compacted 'weather_data' rows.
+        """
+        create_archive_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS weather_data_archive (
+                country_name VARCHAR(50) NOT NULL,
+                city_name VARCHAR(50) NOT NULL,
+                granularity VARCHAR(4) NOT NULL,
+                bucket_start TIMESTAMP(0) WITHOUT TIME ZONE NOT NULL,
+                observation_count INT NOT NULL,
+                avg_temperature FLOAT,
+                min_temperature FLOAT,
+                max_temperature FLOAT,
+                avg_humidity FLOAT,
+                avg_pressure FLOAT,
+                total_rain FLOAT,
+                description VARCHAR(255),
+                PRIMARY KEY (country_name, city_name, granularity, bucket_start)
+            );
+            CREATE INDEX IF NOT EXISTS idx_weather_data_archive_bucket
+                ON weather_data_archive (granularity, bucket_start);
+        """
+        )
+        logging.info("Weather data archive table creation SQL prepared.")
+        return create_archive_query
+
+    @staticmethod
+    def create_ingest_generation_table():
+        """
+        Creates the single-row 'ingest_generation' table whose counter is
+        bumped after every ingest run to invalidate cached query results.
+        """
+        create_ingest_generation_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_generation (
+                id INT PRIMARY KEY CHECK (id = 1),
+                generation BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+            INSERT INTO ingest_generation (id) VALUES (1) ON CONFLICT DO NOTHING;
+        """
+        )
+        logging.info("Ingest generation table creation SQL prepared.")
+        return create_ingest_generation_query
+
     def table_execution(self):
         """
         Executes the SQL commands to create the tables in the database.
@@ -94,13 +272,45 @@ class DatabaseTables:
                 session.commit()
                 logging.info("Cities data table created successfully.")
 
-                session.execute(self.create_weather_data_table())
+                session.execute(self.create_weather_conditions_table())
                 session.commit()
-                logging.info("Weather data table created successfully.")
+                logging.info("Weather conditions table created successfully.")
+
+                session.execute(self.create_weather_observations_table())
+                session.commit()
+                logging.info(
+                    "Weather observations table created successfully."
+                )
+
+                session.execute(self.create_weather_data_view())
+                session.commit()
+                logging.info("Weather data view created successfully.")
+
+                session.execute(self.create_weather_latest_table())
+                session.commit()
+                logging.info("Weather latest table created successfully.")
 
                 session.execute(self.create_simulations_table())
                 session.commit()
                 logging.info("Simulations data table created successfully.")
+
+                session.execute(self.create_city_jobs_table())
+                session.commit()
+                logging.info("City jobs table created successfully.")
+
+                session.execute(self.create_city_schedule_table())
+                session.commit()
+                logging.info("City schedule table created successfully.")
+
+                session.execute(self.create_weather_data_archive_table())
+                session.commit()
+                logging.info(
+                    "Weather data archive table created successfully."
+                )
+
+                session.execute(self.create_ingest_generation_table())
+                session.commit()
+                logging.info("Ingest generation table created successfully.")
         except Exception as e:
             logging.error(f"An error occurred while creating tables: {e}")
             raise
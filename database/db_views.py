@@ -1,4 +1,4 @@
-from connection_sqlalchemy import SQLAlchemyConnection
+from database import SQLAlchemyConnection
 from config.db_setup import db_config
 from sqlalchemy import text
 import logging
@@ -20,12 +20,12 @@ class DatabaseViews:
         self.db_connection = db_connection
         logging.info("DatabaseViews initialized with SQLAlchemy connection.")
 
-    def create_rainfall_counts_view(self):
+    @staticmethod
+    def rainfall_counts_view():
         """
-        Creates or replaces the 'rainfall_counts' view in the database.
+        Builds the statement that creates or replaces the 'rainfall_counts' view.
         """
-        view_name = "rainfall_counts"
-        view_query = text(
+        return text(
             """
             CREATE OR REPLACE VIEW rainfall_counts AS
             SELECT
@@ -49,14 +49,19 @@ class DatabaseViews:
             GROUP BY city_name;
         """
         )
-        self.execute_sql(view_name, view_query)
 
-    def create_temperature_analytics_view(self):
+    def create_rainfall_counts_view(self):
         """
-        Creates or replaces the 'temperature_analytics' view in the database.
+        Creates or replaces the 'rainfall_counts' view in the database.
         """
-        view_name = "temperature_analytics"
-        view_query = text(
+        self.execute_sql("rainfall_counts", self.rainfall_counts_view())
+
+    @staticmethod
+    def temperature_analytics_view():
+        """
+        Builds the statement that creates or replaces the 'temperature_analytics' view.
+        """
+        return text(
             """
             CREATE OR REPLACE VIEW temperature_analytics AS
             SELECT
@@ -114,14 +119,21 @@ class DatabaseViews:
                 record_time >= CURRENT_DATE - INTERVAL '7 days' AND record_time < CURRENT_DATE + INTERVAL '1 day';
         """
         )
-        self.execute_sql(view_name, view_query)
 
-    def create_temperature_extremes_view(self):
+    def create_temperature_analytics_view(self):
         """
-        Creates or replaces the 'temperature_extremes' view in the database.
+        Creates or replaces the 'temperature_analytics' view in the database.
+        """
+        self.execute_sql(
+            "temperature_analytics", self.temperature_analytics_view()
+        )
+
+    @staticmethod
+    def temperature_extremes_view():
+        """
+        Builds the statement that creates or replaces the 'temperature_extremes' view.
         """
-        view_name = "temperature_extremes"
-        view_query = text(
+        return text(
             """
             CREATE OR REPLACE VIEW temperature_extremes AS
             SELECT * FROM (
@@ -167,7 +179,14 @@ class DatabaseViews:
                 END;
         """
         )
-        self.execute_sql(view_name, view_query)
+
+    def create_temperature_extremes_view(self):
+        """
+        Creates or replaces the 'temperature_extremes' view in the database.
+        """
+        self.execute_sql(
+            "temperature_extremes", self.temperature_extremes_view()
+        )
 
     def execute_sql(self, view_name, sql_command):
         """
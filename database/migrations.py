@@ -0,0 +1,271 @@
+from database import SQLAlchemyConnection
+from database.db_views import DatabaseViews
+from config.db_setup import db_config
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+class DatabaseMigrations:
+    """
+    Brings databases created from an earlier version of `db_tables.py` up to the
+    current schema. Every migration is idempotent and can be re-run.
+    """
+
+    def __init__(self, db_connection: SQLAlchemyConnection):
+        """
+        Initializes the DatabaseMigrations with the provided SQLAlchemyConnection.
+        """
+        self.db_connection = db_connection
+        logging.info(
+            "DatabaseMigrations initialized with SQLAlchemy connection."
+        )
+
+    @staticmethod
+    def cities_per_country_and_coordinates():
+        """
+        Replaces the UNIQUE constraints on `cities.city_name` and
+        `cities.country_name` with one on (country_name, city_name), so a
+        country can have more than one city, and adds the coordinate columns.
+        """
+        migration_query = text(
+            """
+            ALTER TABLE cities ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION;
+            ALTER TABLE cities ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION;
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'uq_cities_country_city'
+                ) THEN
+                    ALTER TABLE cities
+                        ADD CONSTRAINT uq_cities_country_city UNIQUE (country_name, city_name);
+                END IF;
+            END $$;
+            ALTER TABLE cities DROP CONSTRAINT IF EXISTS cities_city_name_key;
+            ALTER TABLE cities DROP CONSTRAINT IF EXISTS cities_country_name_key;
+            """
+        )
+        return "cities_per_country_and_coordinates", migration_query
+
+    @staticmethod
+    def weather_latest_backfill():
+        """
+        Creates the 'weather_latest' table and fills it with the newest row of
+        every city in 'weather_data'.
+        """
+        migration_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS weather_latest (
+                country_name VARCHAR(50) NOT NULL,
+                city_name VARCHAR(50) NOT NULL,
+                temperature FLOAT,
+                humidity INT,
+                pressure INT,
+                rain FLOAT,
+                description VARCHAR(255),
+                record_time TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (country_name, city_name),
+                CONSTRAINT fk_latest_country_city FOREIGN KEY (country_name, city_name)
+                    REFERENCES cities (country_name, city_name)
+            );
+            CREATE INDEX IF NOT EXISTS idx_weather_latest_record_time
+                ON weather_latest (record_time);
+            INSERT INTO weather_latest (
+                country_name, city_name, temperature, humidity, pressure,
+                rain, description, record_time
+            )
+            SELECT DISTINCT ON (country_name, city_name)
+                country_name, city_name, temperature, humidity, pressure,
+                rain, description, record_time
+            FROM weather_data
+            ORDER BY country_name, city_name, record_time DESC
+            ON CONFLICT (country_name, city_name) DO NOTHING;
+            """
+        )
+        return "weather_latest_backfill", migration_query
+
+    @staticmethod
+    def ingest_generation():
+        """
+        Creates the 'ingest_generation' counter used to invalidate cached
+        query results, and its backfill counter, bumped along with it when
+        older observations are written.
+        """
+        migration_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_generation (
+                id INT PRIMARY KEY CHECK (id = 1),
+                generation BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+            ALTER TABLE ingest_generation
+                ADD COLUMN IF NOT EXISTS backfill_generation BIGINT NOT NULL DEFAULT 0;
+            INSERT INTO ingest_generation (id) VALUES (1) ON CONFLICT DO NOTHING;
+            """
+        )
+        return "ingest_generation", migration_query
+
+    @staticmethod
+    def weather_data_archive():
+        """
+        Creates the 'weather_data_archive' table used by compaction.
+
+        Compaction scans the observations by `record_time`; that index is
+        created on 'weather_observations' by `compact_weather_observations`,
+        since 'weather_data' is a view afterwards and cannot be indexed.
+        """
+        migration_query = text(
+            """
+            CREATE TABLE IF NOT EXISTS weather_data_archive (
+                country_name VARCHAR(50) NOT NULL,
+                city_name VARCHAR(50) NOT NULL,
+                granularity VARCHAR(4) NOT NULL,
+                bucket_start TIMESTAMP(0) WITHOUT TIME ZONE NOT NULL,
+                observation_count INT NOT NULL,
+                avg_temperature FLOAT,
+                min_temperature FLOAT,
+                max_temperature FLOAT,
+                avg_humidity FLOAT,
+                avg_pressure FLOAT,
+                total_rain FLOAT,
+                description VARCHAR(255),
+                PRIMARY KEY (country_name, city_name, granularity, bucket_start)
+            );
+            CREATE INDEX IF NOT EXISTS idx_weather_data_archive_bucket
+                ON weather_data_archive (granularity, bucket_start);
+            """
+        )
+        return "weather_data_archive", migration_query
+
+    @staticmethod
+    def compact_weather_observations():
+        """
+        Moves the rows of the 'weather_data' table into the compact
+        'weather_observations' table, with `city_id` and `weather_conditions`
+        codes instead of repeated names and descriptions, and replaces
+        'weather_data' with a view of the same shape. The old table is kept
+        as 'weather_data_legacy'. Views created by `db_views.py` would follow
+        the rename, so they are dropped and re-created against the new
+        'weather_data' view in the same transaction.
+        """
+        migration_query = text(
+            """
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE c.relname = 'weather_data' AND c.relkind = 'r'
+                      AND n.nspname = current_schema()
+                ) THEN
+                    CREATE TABLE IF NOT EXISTS weather_conditions (
+                        condition_id SMALLSERIAL PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL UNIQUE
+                    );
+                    CREATE TABLE IF NOT EXISTS weather_observations (
+                        record_time TIMESTAMP(0) WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        weather_id SERIAL PRIMARY KEY,
+                        city_id INT NOT NULL,
+                        temperature REAL,
+                        rain REAL,
+                        humidity SMALLINT,
+                        pressure SMALLINT,
+                        condition_id SMALLINT,
+                        CONSTRAINT fk_observations_city FOREIGN KEY (city_id)
+                            REFERENCES cities (city_id),
+                        CONSTRAINT fk_observations_condition FOREIGN KEY (condition_id)
+                            REFERENCES weather_conditions (condition_id)
+                    );
+
+                    INSERT INTO weather_conditions (description)
+                    SELECT DISTINCT description FROM weather_data
+                    WHERE description IS NOT NULL
+                    ON CONFLICT (description) DO NOTHING;
+
+                    INSERT INTO weather_observations (
+                        record_time, weather_id, city_id, temperature, rain,
+                        humidity, pressure, condition_id
+                    )
+                    SELECT d.record_time, d.weather_id, c.city_id, d.temperature,
+                           d.rain, d.humidity, d.pressure, w.condition_id
+                    FROM weather_data d
+                    JOIN cities c
+                      ON c.city_name = d.city_name AND c.country_name = d.country_name
+                    LEFT JOIN weather_conditions w ON w.description = d.description
+                    ORDER BY d.weather_id;
+
+                    PERFORM setval(
+                        pg_get_serial_sequence('weather_observations', 'weather_id'),
+                        COALESCE((SELECT MAX(weather_id) FROM weather_observations), 0) + 1,
+                        false
+                    );
+
+                    ALTER TABLE weather_data RENAME TO weather_data_legacy;
+
+                    CREATE VIEW weather_data AS
+                    SELECT
+                        o.weather_id,
+                        c.country_name,
+                        c.city_name,
+                        o.temperature::FLOAT AS temperature,
+                        o.humidity::INT AS humidity,
+                        o.pressure::INT AS pressure,
+                        o.rain::FLOAT AS rain,
+                        w.description,
+                        o.record_time
+                    FROM weather_observations o
+                    JOIN cities c ON c.city_id = o.city_id
+                    LEFT JOIN weather_conditions w ON w.condition_id = o.condition_id;
+
+                    CREATE INDEX IF NOT EXISTS idx_weather_observations_city_time
+                        ON weather_observations (city_id, record_time);
+                    CREATE INDEX IF NOT EXISTS idx_weather_observations_record_time
+                        ON weather_observations (record_time);
+                END IF;
+            END $$;
+            """
+        )
+        drop_views = text(
+            """
+            DROP VIEW IF EXISTS
+                rainfall_counts, temperature_analytics, temperature_extremes;
+            """
+        )
+        return (
+            "compact_weather_observations",
+            migration_query,
+            drop_views,
+            DatabaseViews.rainfall_counts_view(),
+            DatabaseViews.temperature_analytics_view(),
+            DatabaseViews.temperature_extremes_view(),
+        )
+
+    def run_all(self):
+        """
+        Executes every migration in order, each in its own transaction. A
+        migration may consist of several statements, which share it.
+        """
+        migrations = [
+            self.cities_per_country_and_coordinates(),
+            self.weather_latest_backfill(),
+            self.ingest_generation(),
+            self.weather_data_archive(),
+            self.compact_weather_observations(),
+        ]
+        for name, *statements in migrations:
+            try:
+                with self.db_connection.transaction() as connection:
+                    for statement in statements:
+                        connection.execute(statement)
+                logging.info(f"Migration '{name}' applied successfully.")
+            except Exception as e:
+                logging.error(f"Migration '{name}' failed: {e}")
+                raise
+
+
+if __name__ == "__main__":
+    db_conn = SQLAlchemyConnection(db_config)
+    DatabaseMigrations(db_conn).run_all()
@@ -1,63 +1,206 @@
 from config import APIConfig, LoggerSetup, db_config
 from api import DataAPI
-from src import (
-    CityData,
-    GeoCoder,
-    WeatherProcessorThread,
-    WeatherProcessorSequential,
-)
+from src import CityData, GeoCoder
+from monitoring import PROFILE_MODES, profile_call, run_metrics, tracer
+from datetime import datetime
+from typing import Optional
+import argparse
 import os
 import time
 import logging
 
 
 class WeatherRunner:
-    def __init__(self) -> None:
+    def __init__(
+        self, profile: Optional[str] = None, trace: Optional[bool] = None
+    ) -> None:
         """
         Initializes the WeatherRunner with configurations and sets up the processing method.
         Uses a named logger to log the application's operations.
+
+        Args:
+            profile (Optional[str]): Profiler to run the processor under, one of
+                PROFILE_MODES. Defaults to the WEATHER_PROFILE env var.
+            trace (Optional[bool]): Whether to record trace spans. Defaults to
+                the WEATHER_TRACE env var.
         """
         self.data_api = DataAPI(db_config)
-        self.city_data = CityData(self.data_api)
-        self.geo_coder = GeoCoder(APIConfig(), self.city_data)
+        self.coordination = os.getenv("COORDINATION", "none")
+        if self.coordination == "lease":
+            from src.city_leases import CityLeaseCoordinator, LeasedCityData
+
+            self.coordinator = CityLeaseCoordinator(
+                self.data_api,
+                batch_size=int(os.getenv("LEASE_BATCH_SIZE", "50")),
+                lease_seconds=int(os.getenv("LEASE_SECONDS", "300")),
+            )
+            self.city_data = LeasedCityData(self.data_api, self.coordinator)
+        elif os.getenv("SCHEDULING", "none") == "tiered":
+            from src.poll_scheduler import PollScheduler, ScheduledCityData
+
+            self.coordinator = None
+            self.city_data = ScheduledCityData(
+                self.data_api, PollScheduler(self.data_api)
+            )
+        else:
+            self.coordinator = None
+            self.city_data = CityData(self.data_api)
+        gazetteer = None
+        if os.getenv("GAZETTEER_INDEX"):
+            from src.gazetteer import GazetteerIndex
+
+            gazetteer = GazetteerIndex(os.environ["GAZETTEER_INDEX"])
+        self.geo_coder = GeoCoder(APIConfig(), self.city_data, gazetteer)
+        self.ring_buffer = None
+        if os.getenv("RING_BUFFER_DIR"):
+            from src.ring_buffer import ObservationRingBuffer
+
+            self.ring_buffer = ObservationRingBuffer.from_env()
+        from src.sinks import sink_from_env
+
+        self.sink = sink_from_env(self.data_api)
         self.method = os.getenv(
             "METHOD", "thread"
         )  # Default to 'thread' if no env var is set
-        self.logger = LoggerSetup(
+        logger_setup = LoggerSetup(
             "WeatherRunner", "logging", "weather_processing.log"
-        ).logger
+        )
+        self.logger = logger_setup.logger
+        LoggerSetup.queue_root_handlers()
+        self.log_directory = logger_setup.full_log_path
+        self.metrics_directory = os.getenv("METRICS_DIR", self.log_directory)
+        self.profile = profile or os.getenv("WEATHER_PROFILE") or None
+        if trace is None:
+            trace = os.getenv("WEATHER_TRACE", "").lower() in ("1", "true")
+        self.trace = trace
+
+    def process(self, processor) -> None:
+        """
+        Runs the processor over the city list. In lease coordination mode the
+        processor is run once per claimed batch until no city is left for the
+        current sweep; leases are renewed in the background meanwhile, and the
+        ingest generation is bumped once after the sweep rather than per batch.
+        In tiered scheduling mode only the due cities are run and then
+        rescheduled.
+
+        Args:
+            processor: The configured weather processor.
+        """
+        if self.coordinator is None:
+            processor.run()
+            if hasattr(self.city_data, "reschedule"):
+                self.city_data.reschedule()
+            return
+        self.coordinator.sync_jobs()
+        self.coordinator.start_heartbeat()
+        stored = False
+        try:
+            while self.city_data.claim_next_batch():
+                processor.run(bump_generation=False)
+                self.city_data.complete_batch()
+                stored = True
+        finally:
+            self.coordinator.stop_heartbeat()
+            self.coordinator.release()
+        if stored:
+            processor.bump_generation()
 
     def run(self) -> None:
         """
         Executes the weather data processing based on the configured method. It logs the
-        execution time and method.
+        execution time and method, and exports the run's per-stage metrics as a
+        Prometheus textfile and as JSON to METRICS_DIR. When enabled, the profile
+        and the Chrome trace of the run are written next to the logs.
 
         Raises:
             ValueError: If an invalid execution method is specified.
         """
         method_env = os.getenv("METHOD")
         logging.info("Current METHOD setting: %s", method_env)
+        # Only the selected processor module is imported.
         if self.method == "thread":
+            from src import WeatherProcessorThread
+
             processor = WeatherProcessorThread(
-                APIConfig(), self.data_api, self.city_data, self.geo_coder
+                APIConfig(),
+                self.data_api,
+                self.city_data,
+                self.geo_coder,
+                ring_buffer=self.ring_buffer,
+                sink=self.sink,
             )
         elif self.method == "sequential":
+            from src import WeatherProcessorSequential
+
             processor = WeatherProcessorSequential(
-                APIConfig(), self.data_api, self.city_data, self.geo_coder
+                APIConfig(),
+                self.data_api,
+                self.city_data,
+                self.geo_coder,
+                ring_buffer=self.ring_buffer,
+                sink=self.sink,
             )
         else:
             self.logger.error("Invalid execution method specified.")
             raise ValueError("Invalid execution method specified")
 
         self.logger.info(f"Starting execution with method: {self.method}")
+        run_metrics.reset()
+        run_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.trace:
+            tracer.enable()
         start_time = time.time()
-        processor.run()
-        end_time = time.time()
-        self.logger.info(
-            f"Execution time for {self.method}: {end_time - start_time:.2f} seconds"
-        )
+        try:
+            if self.profile:
+                profile_call(
+                    lambda: self.process(processor),
+                    self.profile,
+                    os.path.join(
+                        self.log_directory,
+                        f"profile_{self.method}_{run_stamp}",
+                    ),
+                )
+            else:
+                self.process(processor)
+        finally:
+            end_time = time.time()
+            self.logger.info(
+                f"Execution time for {self.method}: {end_time - start_time:.2f} seconds"
+            )
+            prom_path, json_path = run_metrics.export(
+                self.metrics_directory, method=self.method
+            )
+            self.logger.info(
+                f"Run metrics {run_metrics.counters} written to {prom_path} "
+                f"and {json_path}"
+            )
+            self.logger.info(
+                f"API key usage: {self.geo_coder.api_config.key_pool.stats()}"
+            )
+            if self.trace:
+                tracer.disable()
+                trace_path = tracer.export_chrome_trace(
+                    os.path.join(
+                        self.log_directory,
+                        f"trace_{self.method}_{run_stamp}.json",
+                    )
+                )
+                self.logger.info(f"Trace written to {trace_path}")
 
 
 if __name__ == "__main__":
-    runner = WeatherRunner()
+    parser = argparse.ArgumentParser(description="Weather data collection run")
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="run the processor under a profiler (env: WEATHER_PROFILE)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        default=None,
+        help="export trace spans as Chrome trace JSON (env: WEATHER_TRACE)",
+    )
+    args = parser.parse_args()
+    runner = WeatherRunner(profile=args.profile, trace=args.trace)
     runner.run()
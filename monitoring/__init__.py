@@ -0,0 +1,13 @@
+from .metrics import RunMetrics, run_metrics
+from .profiling import PROFILE_MODES, SamplingProfiler, profile_call
+from .tracing import Tracer, tracer
+
+__all__ = [
+    "RunMetrics",
+    "run_metrics",
+    "PROFILE_MODES",
+    "SamplingProfiler",
+    "profile_call",
+    "Tracer",
+    "tracer",
+]
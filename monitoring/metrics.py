@@ -0,0 +1,284 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+STAGES = ("geocode", "fetch", "parse", "store")
+COUNTERS = (
+    "successes",
+    "failures",
+    "retries",
+    "bytes",
+    "sink_failures",
+    "deduplicated",
+)
+# Upper bounds in seconds, following the Prometheus client defaults.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class LatencyHistogram:
+    """A cumulative latency histogram with fixed bucket bounds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Initializes an empty histogram.
+
+        Args:
+            buckets (Tuple[float, ...]): Sorted upper bounds in seconds.
+        """
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.total: float = 0.0
+        self.count: int = 0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Records one observation.
+
+        Args:
+            seconds (float): The measured duration.
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """
+        Returns the Prometheus-style cumulative bucket counts.
+
+        Returns:
+            List[Tuple[str, int]]: (le label, cumulative count) pairs ending with +Inf.
+        """
+        running = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            result.append((repr(bound), running))
+        result.append(("+Inf", running + self.counts[-1]))
+        return result
+
+
+class RunMetrics:
+    """
+    Collects per-stage latencies and counters for a single ingest run.
+
+    Stage timings are recorded both as per-stage histograms and per city, using
+    the city bound to the current thread with `city()`. All methods are
+    thread-safe.
+    """
+
+    def __init__(self) -> None:
+        """Initializes an empty set of metrics."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears all recorded values and restarts the run clock."""
+        with self._lock:
+            self.started_at: float = time.time()
+            self.histograms: Dict[str, LatencyHistogram] = {
+                stage: LatencyHistogram() for stage in STAGES
+            }
+            self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+            self.city_timings: Dict[str, Dict[str, float]] = {}
+            self.first_success_seconds: Optional[float] = None
+
+    @contextmanager
+    def city(self, city_name: str) -> Iterator[None]:
+        """
+        Binds a city to the current thread so stage timings are attributed to it.
+
+        Args:
+            city_name (str): The city being processed.
+        """
+        previous = getattr(self._local, "city", None)
+        self._local.city = city_name
+        try:
+            yield
+        finally:
+            self._local.city = previous
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        """
+        Times the enclosed block and records it under the given stage, also when
+        the block raises.
+
+        Args:
+            stage (str): One of STAGES.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(
+        self, stage: str, seconds: float, city_name: Optional[str] = None
+    ) -> None:
+        """
+        Records a stage duration.
+
+        Args:
+            stage (str): One of STAGES.
+            seconds (float): The measured duration.
+            city_name (Optional[str]): The city; defaults to the thread's bound city.
+        """
+        city_name = city_name or getattr(self._local, "city", None)
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+            if city_name is not None:
+                timings = self.city_timings.setdefault(city_name, {})
+                timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """
+        Increments a run counter.
+
+        Args:
+            counter (str): One of COUNTERS.
+            amount (int): The value to add.
+        """
+        with self._lock:
+            self.counters[counter] += amount
+            if counter == "successes" and self.first_success_seconds is None:
+                self.first_success_seconds = time.time() - self.started_at
+
+    def to_dict(self) -> Dict[str, object]:
+        """
+        Returns a JSON-serialisable snapshot of the run.
+
+        Returns:
+            Dict[str, object]: Counters, per-stage summaries and per-city timings.
+        """
+        with self._lock:
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                stages[stage] = {
+                    "count": histogram.count,
+                    "sum_seconds": round(histogram.total, 6),
+                    "avg_seconds": (
+                        round(histogram.total / histogram.count, 6)
+                        if histogram.count
+                        else None
+                    ),
+                    "buckets": dict(histogram.cumulative_counts()),
+                }
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(time.time() - self.started_at, 3),
+                "counters": dict(self.counters),
+                "first_success_seconds": self.first_success_seconds,
+                "stages": stages,
+                "cities": {
+                    city: {k: round(v, 6) for k, v in timings.items()}
+                    for city, timings in self.city_timings.items()
+                },
+            }
+
+    def to_prometheus(self, method: str = "") -> str:
+        """
+        Renders the run in the Prometheus text exposition format.
+
+        Args:
+            method (str): The processing method, exported as a label.
+
+        Returns:
+            str: The textfile contents.
+        """
+        label = f'method="{method}"'
+        snapshot = self.to_dict()
+        lines = [
+            "# HELP weather_stage_duration_seconds Per-city stage latency.",
+            "# TYPE weather_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                labels = f'{label},stage="{stage}"'
+                for le, count in histogram.cumulative_counts():
+                    lines.append(
+                        f"weather_stage_duration_seconds_bucket"
+                        f'{{{labels},le="{le}"}} {count}'
+                    )
+                lines.append(
+                    f"weather_stage_duration_seconds_sum{{{labels}}} "
+                    f"{histogram.total:.6f}"
+                )
+                lines.append(
+                    f"weather_stage_duration_seconds_count{{{labels}}} "
+                    f"{histogram.count}"
+                )
+        for name, value in snapshot["counters"].items():
+            metric = f"weather_run_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{label}}} {value}")
+        lines.append("# TYPE weather_run_duration_seconds gauge")
+        lines.append(
+            f"weather_run_duration_seconds{{{label}}} "
+            f"{snapshot['duration_seconds']}"
+        )
+        if snapshot["first_success_seconds"] is not None:
+            lines.append("# TYPE weather_run_first_success_seconds gauge")
+            lines.append(
+                f"weather_run_first_success_seconds{{{label}}} "
+                f"{snapshot['first_success_seconds']:.3f}"
+            )
+        lines.append("# TYPE weather_run_last_completed_timestamp gauge")
+        lines.append(
+            f"weather_run_last_completed_timestamp{{{label}}} "
+            f"{time.time():.0f}"
+        )
+        return "\n".join(lines) + "\n"
+
+    def export(
+        self,
+        directory: str,
+        basename: str = "weather_metrics",
+        method: str = "",
+    ) -> Tuple[str, str]:
+        """
+        Writes the run as `<basename>.prom` and `<basename>.json`. Files are
+        written to a temporary name and renamed so a textfile collector never
+        reads a partial file.
+
+        Args:
+            directory (str): The target directory, created if missing.
+            basename (str): The file name without extension.
+            method (str): The processing method, exported as a label.
+
+        Returns:
+            Tuple[str, str]: The paths of the Prometheus and JSON files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, f"{basename}.prom")
+        json_path = os.path.join(directory, f"{basename}.json")
+        payload = self.to_dict()
+        payload["method"] = method
+        for path, content in (
+            (prom_path, self.to_prometheus(method)),
+            (json_path, json.dumps(payload, indent=2)),
+        ):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return prom_path, json_path
+
+
+run_metrics = RunMetrics()
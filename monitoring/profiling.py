@@ -0,0 +1,118 @@
+import cProfile
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Any, Callable
+
+PROFILE_MODES = ("cprofile", "sample")
+
+
+class SamplingProfiler:
+    """
+    A wall-clock sampling profiler that periodically captures the stack of every
+    thread and writes them in the collapsed-stack format used by flame graph
+    tools (flamegraph.pl, speedscope).
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """
+        Initializes the profiler.
+
+        Args:
+            interval (float): Seconds between samples.
+        """
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:"
+                        f"{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        """Starts sampling in a background daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name="SamplingProfiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling and waits for the sampler thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path: str) -> None:
+        """
+        Writes the samples as `frame;frame;frame count` lines.
+
+        Args:
+            path (str): The output file path.
+        """
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_call(
+    func: Callable[[], Any], mode: str, output_path_prefix: str
+) -> str:
+    """
+    Runs `func` under a profiler and writes the profile to disk.
+
+    `cprofile` is deterministic but only sees the calling thread, which suits
+    the sequential method. `sample` captures every thread and is the better
+    fit for the threaded method.
+
+    Args:
+        func (Callable[[], Any]): The function to profile.
+        mode (str): One of PROFILE_MODES.
+        output_path_prefix (str): Path without extension for the profile file.
+
+    Returns:
+        str: The path of the written profile (`.pstats` or `.collapsed`).
+
+    Raises:
+        ValueError: If the mode is not supported.
+    """
+    if mode == "cprofile":
+        path = f"{output_path_prefix}.pstats"
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(func)
+        finally:
+            profiler.dump_stats(path)
+    elif mode == "sample":
+        path = f"{output_path_prefix}.collapsed"
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            func()
+        finally:
+            profiler.stop()
+            profiler.write_collapsed(path)
+    else:
+        raise ValueError(
+            f"Invalid profile mode {mode!r}, expected one of {PROFILE_MODES}"
+        )
+    logging.info("Profile written to %s", path)
+    return path
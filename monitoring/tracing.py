@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, List
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """
+    Records lightweight trace spans and exports them in the Chrome trace event
+    format (chrome://tracing, Perfetto), one track per thread.
+
+    Tracing is disabled by default; while disabled `span()` returns a shared
+    no-op context manager.
+    """
+
+    def __init__(self) -> None:
+        """Initializes a disabled tracer with no recorded events."""
+        self.enabled: bool = False
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+
+    def enable(self) -> None:
+        """Clears previously recorded spans and starts recording."""
+        with self._lock:
+            self._events = []
+            self._threads = {}
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops recording; recorded spans are kept until the next enable()."""
+        self.enabled = False
+
+    def span(self, name: str, **args: Any) -> ContextManager[None]:
+        """
+        Returns a context manager that records the enclosed block as a span.
+
+        Args:
+            name (str): The span name shown on the timeline.
+            **args (Any): Extra values attached to the span.
+
+        Returns:
+            ContextManager[None]: The span, or a no-op when tracing is disabled.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._record(name, args)
+
+    @contextmanager
+    def _record(self, name: str, args: Dict[str, Any]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            thread = threading.current_thread()
+            event = {
+                "name": name,
+                "cat": "weather",
+                "ph": "X",
+                "ts": round(start * 1_000_000, 3),
+                "dur": round(duration * 1_000_000, 3),
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": args,
+            }
+            with self._lock:
+                self._events.append(event)
+                self._threads.setdefault(thread.ident, thread.name)
+
+    def export_chrome_trace(self, path: str) -> str:
+        """
+        Writes the recorded spans as a Chrome trace JSON file.
+
+        Args:
+            path (str): The output file path.
+
+        Returns:
+            str: The path that was written.
+        """
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        pid = os.getpid()
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread_name},
+            }
+            for tid, thread_name in threads.items()
+        ]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {"traceEvents": metadata + events, "displayTimeUnit": "ms"},
+                f,
+                default=str,
+            )
+        return path
+
+
+tracer = Tracer()
@@ -1,14 +1,90 @@
-from .weather_data import WeatherData
-from .city_converter import CityData, GeoCoder
-from .weather_thread import WeatherProcessorThread
-from .weather_sequential import WeatherProcessorSequential
-from .benchmark import WeatherBenchmark
+import importlib
+from typing import Any
+
+# Submodules are imported on first attribute access so that the hourly ingest
+# only pays for the processor it actually runs (see `python -m
+# src.startup_benchmark`).
+_LAZY_IMPORTS = {
+    "WeatherData": ".weather_data",
+    "Observation": ".observation",
+    "CityData": ".city_converter",
+    "CityRecord": ".city_converter",
+    "GeoCoder": ".city_converter",
+    "GazetteerIndex": ".gazetteer",
+    "CityImporter": ".city_import",
+    "LatestWeatherCache": ".latest_weather",
+    "CitySpatialIndex": ".nearest_city",
+    "NearestCityLookup": ".nearest_city",
+    "CityLeaseCoordinator": ".city_leases",
+    "LeasedCityData": ".city_leases",
+    "PollScheduler": ".poll_scheduler",
+    "ScheduledCityData": ".poll_scheduler",
+    "WeatherProcessor": ".weather_processor",
+    "WeatherProcessorThread": ".weather_thread",
+    "WeatherProcessorSequential": ".weather_sequential",
+    "WeatherBenchmark": ".benchmark",
+    "ObservationRingBuffer": ".ring_buffer",
+    "OfflineAnalytics": ".offline_analytics",
+    "TemperatureForecaster": ".forecast",
+    "ObservationSink": ".sinks",
+    "PostgresSink": ".sinks",
+    "SQLiteSink": ".sinks",
+    "ParquetSink": ".sinks",
+    "FanOutSink": ".sinks",
+    "WriteBehindSink": ".sinks",
+}
 
 __all__ = [
     "WeatherData",
+    "Observation",
     "CityData",
+    "CityRecord",
     "GeoCoder",
+    "GazetteerIndex",
+    "CityImporter",
+    "LatestWeatherCache",
+    "CitySpatialIndex",
+    "NearestCityLookup",
+    "CityLeaseCoordinator",
+    "LeasedCityData",
+    "PollScheduler",
+    "ScheduledCityData",
+    "WeatherProcessor",
     "WeatherProcessorThread",
     "WeatherProcessorSequential",
     "WeatherBenchmark",
+    "ObservationRingBuffer",
+    "OfflineAnalytics",
+    "TemperatureForecaster",
+    "ObservationSink",
+    "PostgresSink",
+    "SQLiteSink",
+    "ParquetSink",
+    "FanOutSink",
+    "WriteBehindSink",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    """
+    Imports the submodule that defines `name` the first time it is requested.
+
+    Args:
+        name (str): The attribute being looked up on the package.
+
+    Returns:
+        Any: The class exported under that name.
+
+    Raises:
+        AttributeError: If the name is not exported by the package.
+    """
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
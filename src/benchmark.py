@@ -4,8 +4,10 @@ from src import (
     GeoCoder,
     CityData,
 )
+from src.sinks import sink_from_env
 from config import APIConfig, db_config
 from api import DataAPI
+from monitoring import run_metrics
 from typing import Any
 import time
 import logging
@@ -20,17 +22,31 @@ class WeatherBenchmark:
         self.data_api = DataAPI(db_config)
         self.city_data = CityData(self.data_api)
         self.geo_coder = GeoCoder(self.api_config, self.city_data)
+        # WEATHER_SINKS=sqlite measures the ingest without a Postgres write.
+        self.sink = sink_from_env(self.data_api)
 
         self.thread_processor = WeatherProcessorThread(
-            self.api_config, self.data_api, self.city_data, self.geo_coder
+            self.api_config,
+            self.data_api,
+            self.city_data,
+            self.geo_coder,
+            sink=self.sink,
         )
         self.sequential_processor = WeatherProcessorSequential(
-            self.api_config, self.data_api, self.city_data, self.geo_coder
+            self.api_config,
+            self.data_api,
+            self.city_data,
+            self.geo_coder,
+            sink=self.sink,
         )
 
     @staticmethod
     def measure_execution_time(processor: Any) -> float:
-        """Measures and logs the execution time of a given processing method."""
+        """
+        Measures and logs the execution time of a given processing method,
+        together with the per-stage latency breakdown of the run.
+        """
+        run_metrics.reset()
         start_time = time.time()
         processor.run()
         end_time = time.time()
@@ -38,6 +54,11 @@ class WeatherBenchmark:
         logging.info(
             f"Execution time for {processor.__class__.__name__}: {execution_time:.2f} seconds"
         )
+        for stage, summary in run_metrics.to_dict()["stages"].items():
+            logging.info(
+                f"  {stage}: {summary['count']} calls, "
+                f"{summary['sum_seconds']:.2f} s total"
+            )
         return execution_time
 
     def execute_benchmark(self) -> None:
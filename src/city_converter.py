@@ -1,10 +1,37 @@
 from config import APIConfig, db_config
 from api import DataAPI
+from monitoring import run_metrics, tracer
+from sqlalchemy import text
 import logging
-from typing import Dict, Tuple
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from src.gazetteer import GazetteerIndex
+    from src.observation import Observation
 
 logging.basicConfig(level=logging.INFO)
 
+# Seconds `get_cities` results may be served from the DataAPI query cache;
+# imports and ingest runs invalidate them earlier.
+CITIES_CACHE_TTL = 3600
+
+
+class CityRecord(NamedTuple):
+    """A row of the 'cities' table; coordinates are None until resolved."""
+
+    city_name: str
+    country_name: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
 
 class CityData:
     def __init__(self, data_api_instance: DataAPI) -> None:
@@ -22,9 +49,9 @@ class CityData:
         """
         query = "SELECT city_name, country_name FROM cities;"
         try:
-            result = self.data_api.sql_dataframes(query)
-            if not result.empty:
-                return result.set_index("city_name")["country_name"].to_dict()
+            rows = self.data_api.fetch_rows(query, ttl=CITIES_CACHE_TTL)
+            if rows:
+                return {city: country for city, country in rows}
             else:
                 logging.info("No cities found in the database.")
                 return {}
@@ -32,10 +59,56 @@ class CityData:
             logging.error(f"Failed to fetch cities: {e}")
             return {}
 
+    def iter_city_batches(
+        self, batch_size: int = 500
+    ) -> Iterator[List[CityRecord]]:
+        """
+        Reads the cities from the database in chunks, paging on city_id, so the
+        first cities can be processed before the whole table is read.
+
+        Args:
+            batch_size (int): Number of cities per chunk.
+
+        Yields:
+            List[CityRecord]: The cities with their stored coordinates.
+        """
+        query = (
+            "SELECT city_id, city_name, country_name, latitude, longitude "
+            "FROM cities WHERE city_id > :after ORDER BY city_id LIMIT :limit;"
+        )
+        after = 0
+        while True:
+            try:
+                rows = self.data_api.fetch_rows(
+                    query, {"after": after, "limit": batch_size}
+                )
+            except Exception as e:
+                logging.error(f"Failed to fetch cities: {e}")
+                return
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [CityRecord(*row[1:]) for row in rows]
+            if len(rows) < batch_size:
+                return
+
+    def observation_stored(self, observation: "Observation") -> None:
+        """
+        Called by the weather processors for every observation stored during
+        a run, possibly from several threads. Subclasses that act on the
+        results of a run override it.
+
+        Args:
+            observation (Observation): The stored observation.
+        """
+
 
 class GeoCoder:
     def __init__(
-        self, api_config_instance: APIConfig, city_data_instance: CityData
+        self,
+        api_config_instance: APIConfig,
+        city_data_instance: CityData,
+        gazetteer: Optional["GazetteerIndex"] = None,
     ) -> None:
         """
         Initializes the GeoCoder with APIConfig and CityData instances.
@@ -43,9 +116,132 @@ class GeoCoder:
         Args:
             api_config_instance (APIConfig): An instance of APIConfig for fetching coordinates.
             city_data_instance (CityData): An instance of CityData to retrieve city data.
+            gazetteer (Optional[GazetteerIndex]): Local index consulted before
+                the geocoding API for cities without stored coordinates.
         """
         self.api_config = api_config_instance
         self.city_data = city_data_instance
+        self.gazetteer = gazetteer
+        # Coordinates resolved so far, keyed by (city name, country name).
+        self.coordinates: Dict[Tuple[str, str], Tuple[float, float]] = {}
+
+    def resolve(self, city: CityRecord) -> Optional[Tuple[float, float]]:
+        """
+        Resolves a city's coordinates from, in order, the in-memory cache, the
+        coordinates stored in 'cities', the gazetteer and the geocoding API.
+        Coordinates that were not stored yet are written back to 'cities' so
+        the city is not geocoded again on the next run.
+
+        Args:
+            city (CityRecord): The city to resolve.
+
+        Returns:
+            Optional[Tuple[float, float]]: (latitude, longitude), or None.
+
+        Raises:
+            HTTPError: If the geocoding API call fails.
+        """
+        key = (city.city_name, city.country_name)
+        if key in self.coordinates:
+            return self.coordinates[key]
+        if city.latitude is not None and city.longitude is not None:
+            coordinates = (city.latitude, city.longitude)
+        else:
+            coordinates = None
+            if self.gazetteer is not None:
+                coordinates = self.gazetteer.lookup(*key)
+            if coordinates is None:
+                with run_metrics.city(city.city_name):
+                    data = self.api_config.fetch_coordinates(*key)
+                if not data:
+                    return None
+                coordinates = (data[0]["lat"], data[0]["lon"])
+            self.store_coordinates(city, coordinates)
+        self.coordinates[key] = coordinates
+        return coordinates
+
+    def store_coordinates(
+        self, city: CityRecord, coordinates: Tuple[float, float]
+    ) -> None:
+        """
+        Saves resolved coordinates on the city's row in 'cities'.
+
+        Args:
+            city (CityRecord): The resolved city.
+            coordinates (Tuple[float, float]): (latitude, longitude).
+        """
+        query = text(
+            "UPDATE cities SET latitude = :lat, longitude = :lon "
+            "WHERE city_name = :city AND country_name = :country;"
+        )
+        try:
+            with self.data_api.sqlalchemy_connection.transaction() as conn:
+                conn.execute(
+                    query,
+                    {
+                        "lat": coordinates[0],
+                        "lon": coordinates[1],
+                        "city": city.city_name,
+                        "country": city.country_name,
+                    },
+                )
+        except Exception as e:
+            logging.warning(
+                "Could not store coordinates for %s, %s: %s",
+                city.city_name,
+                city.country_name,
+                e,
+            )
+
+    @property
+    def data_api(self) -> DataAPI:
+        """The DataAPI of the underlying CityData."""
+        return self.city_data.data_api
+
+    def iter_lat_lon(
+        self, batch_size: int = 500
+    ) -> Iterator[Tuple[str, float, float]]:
+        """
+        Streams cities from CityData in chunks and resolves them one by one,
+        yielding each city as soon as its coordinates are known. Every
+        resolution is traced as a "GeoCoder.resolve" span. The stored
+        coordinates of each chunk are announced to the current weather batch
+        first, so known locations are fetched with group requests meanwhile.
+
+        Args:
+            batch_size (int): Number of cities read from the database at a time.
+
+        Yields:
+            Tuple[str, float, float]: (city name, latitude, longitude).
+        """
+        for batch in self.city_data.iter_city_batches(batch_size):
+            self.api_config.prefetch_weather(
+                (city.latitude, city.longitude)
+                for city in batch
+                if city.latitude is not None and city.longitude is not None
+            )
+            for city in batch:
+                try:
+                    with tracer.span("GeoCoder.resolve", city=city.city_name):
+                        coordinates = self.resolve(city)
+                except Exception as e:
+                    run_metrics.increment("failures")
+                    logging.error(
+                        "Failed to geocode %s, %s: %s",
+                        city.city_name,
+                        city.country_name,
+                        e,
+                    )
+                    continue
+                if coordinates is not None:
+                    yield str(city.city_name), coordinates[0], coordinates[1]
+                else:
+                    run_metrics.increment("failures")
+                    logging.warning(
+                        "No data found for %s, %s",
+                        city.city_name,
+                        city.country_name,
+                    )
 
     def get_lat_lon(self) -> Dict[str, Tuple[float, float]]:
         """
@@ -54,15 +250,8 @@ class GeoCoder:
         Returns:
             A dictionary with city names as keys and tuples of (latitude, longitude) as values.
         """
-        cities = self.city_data.get_cities()
-        lat_lon_dict = {}
-        for city, country in cities.items():
-            data = self.api_config.fetch_coordinates(str(city), country)
-            if data and len(data) > 0:
-                lat_lon_dict[str(city)] = (data[0]["lat"], data[0]["lon"])
-            else:
-                logging.warning(f"No data found for {city}, {country}")
-        return lat_lon_dict
+        with tracer.span("GeoCoder.get_lat_lon"):
+            return {city: (lat, lon) for city, lat, lon in self.iter_lat_lon()}
 
 
 if __name__ == "__main__":
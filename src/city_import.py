@@ -0,0 +1,216 @@
+from config import APIConfig, db_config
+from api import DataAPI
+from src.city_converter import CityRecord
+from src.gazetteer import GazetteerIndex
+import argparse
+import csv
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+
+class CityImporter:
+    """
+    Bulk-loads cities from a CSV file into the 'cities' table with COPY.
+
+    Coordinates are resolved from the local gazetteer index; the geocoding API
+    is only called for cities the gazetteer does not have. Cities that already
+    exist keep their row and get missing coordinates filled in.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        gazetteer: Optional[GazetteerIndex] = None,
+        api_config: Optional[APIConfig] = None,
+    ) -> None:
+        """
+        Initializes the CityImporter.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            gazetteer (Optional[GazetteerIndex]): Local coordinate lookup.
+            api_config (Optional[APIConfig]): Used for cities missing from the
+                gazetteer; when None those cities are imported without
+                coordinates and geocoded on their first run.
+        """
+        self.data_api = data_api
+        self.gazetteer = gazetteer
+        self.api_config = api_config
+
+    @staticmethod
+    def read_csv(path: str) -> List[CityRecord]:
+        """
+        Reads a CSV file with `city_name` and `country_name` columns, dropping
+        duplicate rows.
+
+        Args:
+            path (str): Path of the CSV file.
+
+        Returns:
+            List[CityRecord]: The cities to import.
+        """
+        cities: Dict[Tuple[str, str], CityRecord] = {}
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                city = row["city_name"].strip()
+                country = row["country_name"].strip().upper()
+                if city and country:
+                    cities.setdefault(
+                        (country, city), CityRecord(city, country)
+                    )
+        return list(cities.values())
+
+    def resolve(self, cities: List[CityRecord]) -> List[CityRecord]:
+        """
+        Fills in coordinates from the gazetteer, then from the API.
+
+        Args:
+            cities (List[CityRecord]): The cities to resolve.
+
+        Returns:
+            List[CityRecord]: The cities with coordinates where found.
+        """
+        resolved = []
+        from_gazetteer = from_api = 0
+        for city in cities:
+            coordinates = None
+            if self.gazetteer is not None:
+                coordinates = self.gazetteer.lookup(
+                    city.city_name, city.country_name
+                )
+                from_gazetteer += coordinates is not None
+            if coordinates is None and self.api_config is not None:
+                try:
+                    data = self.api_config.fetch_coordinates(
+                        city.city_name, city.country_name
+                    )
+                    if data:
+                        coordinates = (data[0]["lat"], data[0]["lon"])
+                        from_api += 1
+                except Exception as e:
+                    logging.warning(
+                        "Failed to geocode %s, %s: %s",
+                        city.city_name,
+                        city.country_name,
+                        e,
+                    )
+            if coordinates is not None:
+                city = city._replace(
+                    latitude=coordinates[0], longitude=coordinates[1]
+                )
+            resolved.append(city)
+        logging.info(
+            "Resolved %d cities from the gazetteer and %d from the API, "
+            "%d unresolved",
+            from_gazetteer,
+            from_api,
+            len(cities) - from_gazetteer - from_api,
+        )
+        return resolved
+
+    def copy_cities(self, cities: List[CityRecord]) -> int:
+        """
+        Loads the cities into a temporary table with COPY and merges them into
+        'cities' in a single statement.
+
+        Args:
+            cities (List[CityRecord]): The cities to load.
+
+        Returns:
+            int: The number of rows inserted or updated.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for city in cities:
+            writer.writerow(
+                [
+                    city.city_name,
+                    city.country_name,
+                    "" if city.latitude is None else city.latitude,
+                    "" if city.longitude is None else city.longitude,
+                ]
+            )
+        buffer.seek(0)
+
+        engine = self.data_api.sqlalchemy_connection.engine
+        raw_connection = engine.raw_connection()
+        try:
+            cursor = raw_connection.cursor()
+            cursor.execute(
+                """
+                CREATE TEMP TABLE city_import (
+                    city_name VARCHAR(50) NOT NULL,
+                    country_name VARCHAR(50) NOT NULL,
+                    latitude DOUBLE PRECISION,
+                    longitude DOUBLE PRECISION
+                ) ON COMMIT DROP;
+                """
+            )
+            cursor.copy_expert(
+                "COPY city_import FROM STDIN WITH (FORMAT csv)", buffer
+            )
+            cursor.execute(
+                """
+                INSERT INTO cities
+                    (city_name, country_name, latitude, longitude)
+                SELECT city_name, country_name, latitude, longitude
+                FROM city_import
+                ON CONFLICT ON CONSTRAINT uq_cities_country_city DO UPDATE SET
+                    latitude = COALESCE(cities.latitude, EXCLUDED.latitude),
+                    longitude = COALESCE(cities.longitude, EXCLUDED.longitude);
+                """
+            )
+            count = cursor.rowcount
+            raw_connection.commit()
+        except Exception as e:
+            raw_connection.rollback()
+            logging.error(f"City import failed: {e}")
+            raise
+        finally:
+            raw_connection.close()
+        return count
+
+    def import_file(self, path: str) -> int:
+        """
+        Imports every city in a CSV file.
+
+        Args:
+            path (str): Path of the CSV file.
+
+        Returns:
+            int: The number of rows inserted or updated.
+        """
+        cities = self.read_csv(path)
+        logging.info("Importing %d cities from %s", len(cities), path)
+        count = self.copy_cities(self.resolve(cities))
+        # Cached city lists in other processes are now stale.
+        self.data_api.bump_generation()
+        logging.info("Imported %d cities", count)
+        return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import cities from a CSV file"
+    )
+    parser.add_argument(
+        "csv_path", help="CSV file with city_name,country_name columns"
+    )
+    parser.add_argument(
+        "--gazetteer", help="gazetteer index built with src.gazetteer"
+    )
+    parser.add_argument(
+        "--no-api",
+        action="store_true",
+        help="leave cities missing from the gazetteer without coordinates",
+    )
+    args = parser.parse_args()
+    importer = CityImporter(
+        DataAPI(db_config),
+        GazetteerIndex(args.gazetteer) if args.gazetteer else None,
+        None if args.no_api else APIConfig(),
+    )
+    importer.import_file(args.csv_path)
@@ -0,0 +1,255 @@
+from api import DataAPI
+from src.city_converter import CityData, CityRecord
+from sqlalchemy import text
+import logging
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+
+
+class CityLeaseCoordinator:
+    """
+    Shares the city list between several collector instances through the
+    'city_jobs' lease table.
+
+    Each instance claims batches of cities with `FOR UPDATE SKIP LOCKED`, renews
+    its leases from a heartbeat thread while it works and marks the cities as
+    completed for the current sweep. Leases of an instance that dies expire and
+    the cities are claimed again by the others.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        owner: Optional[str] = None,
+        batch_size: int = 50,
+        lease_seconds: int = 300,
+        sweep_unit: str = "hour",
+    ) -> None:
+        """
+        Initializes the coordinator.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            owner (Optional[str]): Unique name of this instance. Defaults to
+                host, pid and a random suffix.
+            batch_size (int): Number of cities claimed at a time.
+            lease_seconds (int): How long a claim is valid without renewal.
+            sweep_unit (str): `date_trunc` unit that defines one sweep; a city
+                is processed once per sweep.
+        """
+        self.connection = data_api.sqlalchemy_connection
+        self.owner = owner or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.sweep_unit = sweep_unit
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def sync_jobs(self) -> None:
+        """Adds a job row for every city that does not have one yet."""
+        query = text(
+            """
+            INSERT INTO city_jobs (city_id)
+            SELECT city_id FROM cities
+            ON CONFLICT (city_id) DO NOTHING;
+            """
+        )
+        with self.connection.transaction() as conn:
+            conn.execute(query)
+
+    def claim_batch(self) -> Dict[int, CityRecord]:
+        """
+        Claims up to `batch_size` cities that are not completed for the current
+        sweep and not leased by a live instance.
+
+        Returns:
+            Dict[int, CityRecord]: The claimed cities by city id.
+        """
+        query = text(
+            """
+            WITH picked AS (
+                SELECT city_id
+                FROM city_jobs
+                WHERE (completed_sweep IS NULL
+                       OR completed_sweep < date_trunc(:sweep_unit, CURRENT_TIMESTAMP))
+                  AND (lease_owner IS NULL OR lease_expires < CURRENT_TIMESTAMP)
+                ORDER BY city_id
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE city_jobs j
+            SET lease_owner = :owner,
+                lease_expires = CURRENT_TIMESTAMP + make_interval(secs => :lease_seconds)
+            FROM picked, cities c
+            WHERE j.city_id = picked.city_id
+              AND c.city_id = j.city_id
+            RETURNING j.city_id, c.city_name, c.country_name,
+                      c.latitude, c.longitude;
+            """
+        )
+        with self.connection.transaction() as conn:
+            rows = conn.execute(
+                query,
+                {
+                    "sweep_unit": self.sweep_unit,
+                    "batch_size": self.batch_size,
+                    "owner": self.owner,
+                    "lease_seconds": self.lease_seconds,
+                },
+            ).all()
+        logging.info("%s claimed %d cities", self.owner, len(rows))
+        return {row[0]: CityRecord(*row[1:]) for row in rows}
+
+    def renew(self) -> int:
+        """
+        Extends every lease held by this instance.
+
+        Returns:
+            int: The number of leases renewed.
+        """
+        query = text(
+            """
+            UPDATE city_jobs
+            SET lease_expires = CURRENT_TIMESTAMP + make_interval(secs => :lease_seconds)
+            WHERE lease_owner = :owner;
+            """
+        )
+        with self.connection.transaction() as conn:
+            result = conn.execute(
+                query,
+                {"owner": self.owner, "lease_seconds": self.lease_seconds},
+            )
+        return result.rowcount
+
+    def complete(self, city_ids: List[int]) -> None:
+        """
+        Marks cities as done for the current sweep and drops their leases.
+
+        Args:
+            city_ids (List[int]): The processed cities.
+        """
+        if not city_ids:
+            return
+        query = text(
+            """
+            UPDATE city_jobs
+            SET completed_sweep = date_trunc(:sweep_unit, CURRENT_TIMESTAMP),
+                lease_owner = NULL,
+                lease_expires = NULL
+            WHERE city_id = ANY(:city_ids) AND lease_owner = :owner;
+            """
+        )
+        with self.connection.transaction() as conn:
+            conn.execute(
+                query,
+                {
+                    "sweep_unit": self.sweep_unit,
+                    "city_ids": list(city_ids),
+                    "owner": self.owner,
+                },
+            )
+
+    def release(self) -> None:
+        """Gives up every lease held by this instance without completing it."""
+        query = text(
+            """
+            UPDATE city_jobs
+            SET lease_owner = NULL, lease_expires = NULL
+            WHERE lease_owner = :owner;
+            """
+        )
+        with self.connection.transaction() as conn:
+            conn.execute(query, {"owner": self.owner})
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew()
+            except Exception as e:
+                logging.error(
+                    "Failed to renew leases for %s: %s", self.owner, e
+                )
+
+    def start_heartbeat(self) -> None:
+        """Starts the daemon thread that keeps the leases alive."""
+        self._stop.clear()
+        self._heartbeat = threading.Thread(
+            target=self._renew_loop, name="CityLeaseHeartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def stop_heartbeat(self) -> None:
+        """Stops the heartbeat thread."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+
+class LeasedCityData(CityData):
+    """
+    CityData that only exposes the batch of cities currently leased by this
+    instance, so the processors work on a share of the city list.
+    """
+
+    def __init__(
+        self, data_api_instance: DataAPI, coordinator: CityLeaseCoordinator
+    ) -> None:
+        """
+        Initializes the LeasedCityData.
+
+        Args:
+            data_api_instance (DataAPI): Data access API for database operations.
+            coordinator (CityLeaseCoordinator): Claims and completes the batches.
+        """
+        super().__init__(data_api_instance)
+        self.coordinator = coordinator
+        self.claimed: Dict[int, CityRecord] = {}
+
+    def get_cities(self) -> dict:
+        """
+        Returns the currently claimed batch.
+
+        Returns:
+            dict: A dictionary where keys are city names and values are the corresponding country names.
+        """
+        return {
+            city.city_name: city.country_name for city in self.claimed.values()
+        }
+
+    def iter_city_batches(
+        self, batch_size: int = 500
+    ) -> Iterator[List[CityRecord]]:
+        """
+        Yields the currently claimed batch as a single chunk.
+
+        Args:
+            batch_size (int): Unused; the batch size is set on the coordinator.
+
+        Yields:
+            List[CityRecord]: The claimed cities.
+        """
+        if self.claimed:
+            yield list(self.claimed.values())
+
+    def claim_next_batch(self) -> bool:
+        """
+        Claims the next batch of cities.
+
+        Returns:
+            bool: False when no work is left for the current sweep.
+        """
+        self.claimed = self.coordinator.claim_batch()
+        return bool(self.claimed)
+
+    def complete_batch(self) -> None:
+        """Marks the claimed batch as completed for the current sweep."""
+        self.coordinator.complete(list(self.claimed))
+        self.claimed = {}
@@ -0,0 +1,308 @@
+from config import db_config
+from api import DataAPI
+from monitoring import tracer
+from sqlalchemy import text
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+MODEL_NAME = "seasonal_ses"
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """
+    Fills NaN gaps in every row with the last value before them, and leading
+    gaps with the first value of the row.
+
+    Args:
+        matrix (np.ndarray): One series per row.
+
+    Returns:
+        np.ndarray: The filled matrix; rows without any value stay NaN.
+    """
+    rows = np.arange(matrix.shape[0])[:, None]
+    columns = np.arange(matrix.shape[1])
+    present = ~np.isnan(matrix)
+    last = np.maximum.accumulate(np.where(present, columns, 0), axis=1)
+    filled = matrix[rows, last]
+    first = matrix[rows[:, 0], np.argmax(present, axis=1)]
+    return np.where(np.isnan(filled), first[:, None], filled)
+
+
+def smoothing_weights(length: int, alpha: float) -> np.ndarray:
+    """
+    Returns the weights that turn a series into its simple exponential
+    smoothing level, started from the first value:
+    level = series @ weights.
+
+    Args:
+        length (int): Length of the series.
+        alpha (float): Smoothing factor in (0, 1].
+
+    Returns:
+        np.ndarray: Weights summing to 1, newest last.
+    """
+    weights = alpha * (1 - alpha) ** np.arange(length - 1, -1, -1.0)
+    weights[0] = (1 - alpha) ** (length - 1)
+    return weights
+
+
+class TemperatureForecaster:
+    """
+    Forecasts the hourly temperature of every city and stores it in the
+    'simulations' table.
+
+    The recent history of all cities is read with one streamed query as
+    hourly means and laid out as a (cities x hours) matrix. The model is
+    fitted for every city at once: a seasonal profile (the mean deviation of
+    each hour of the day from its day's mean, over the full days of history)
+    plus a level from simple exponential smoothing of the deseasonalized
+    series. A forecast is level + profile, written for the next hours with a
+    single INSERT. Forecasts of an earlier run for the same hours are
+    replaced.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        history_hours: Optional[int] = None,
+        horizon_hours: Optional[int] = None,
+        alpha: Optional[float] = None,
+        season_hours: int = 24,
+    ) -> None:
+        """
+        Initializes the TemperatureForecaster.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            history_hours (Optional[int]): Hours of history to fit on;
+                defaults to FORECAST_HISTORY_HOURS or 168.
+            horizon_hours (Optional[int]): Hours to forecast; defaults to
+                FORECAST_HORIZON_HOURS or 24.
+            alpha (Optional[float]): Smoothing factor of the level; defaults
+                to FORECAST_ALPHA or 0.3.
+            season_hours (int): Length of the seasonal cycle.
+
+        Raises:
+            ValueError: If the history is shorter than one season.
+        """
+        if history_hours is None:
+            history_hours = int(os.getenv("FORECAST_HISTORY_HOURS", "168"))
+        if horizon_hours is None:
+            horizon_hours = int(os.getenv("FORECAST_HORIZON_HOURS", "24"))
+        if alpha is None:
+            alpha = float(os.getenv("FORECAST_ALPHA", "0.3"))
+        if history_hours < season_hours:
+            raise ValueError("The history must cover at least one season")
+        self.data_api = data_api
+        self.history_hours = history_hours
+        self.horizon_hours = horizon_hours
+        self.alpha = alpha
+        self.season_hours = season_hours
+
+    def load_history(
+        self, start: datetime, chunk_size: int = 50_000
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reads the hourly mean temperatures of every city from `start` on.
+
+        Args:
+            start (datetime): The first hour of the history.
+            chunk_size (int): Rows fetched per round trip.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The city ids, and a
+            (cities x history_hours) matrix with NaN for hours without data.
+        """
+        query = text(
+            """
+            SELECT
+                city_id,
+                date_trunc('hour', record_time) AS hour,
+                AVG(temperature) AS temperature
+            FROM weather_observations
+            WHERE record_time >= :start AND record_time < :end
+              AND temperature IS NOT NULL
+            GROUP BY city_id, hour;
+            """
+        )
+        end = start + timedelta(hours=self.history_hours)
+        city_ids, hours, temperatures = [], [], []
+        engine = self.data_api.sqlalchemy_connection.engine
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=chunk_size
+            ).execute(query, {"start": start, "end": end})
+            for rows in result.partitions():
+                ids, hour, temperature = zip(*rows)
+                city_ids.append(np.array(ids, dtype=np.int64))
+                hours.append(np.array(hour, dtype="datetime64[h]"))
+                temperatures.append(np.array(temperature, dtype=np.float64))
+        if not city_ids:
+            return np.empty(0, dtype=np.int64), np.empty(
+                (0, self.history_hours)
+            )
+        cities, row = np.unique(np.concatenate(city_ids), return_inverse=True)
+        column = (np.concatenate(hours) - np.datetime64(start, "h")).astype(
+            np.int64
+        )
+        history = np.full((len(cities), self.history_hours), np.nan)
+        history[row, column] = np.concatenate(temperatures)
+        return cities, history
+
+    def fit_predict(self, history: np.ndarray, start: datetime) -> np.ndarray:
+        """
+        Forecasts the hours after the history for every row.
+
+        Args:
+            history (np.ndarray): (cities x history_hours) hourly means.
+            start (datetime): The hour of the first history column.
+
+        Returns:
+            np.ndarray: (cities x horizon_hours) forecasts.
+        """
+        filled = forward_fill(history)
+        season = self.season_hours
+        seasons = self.history_hours // season
+        # Hours since the epoch of the first column; modulo the season this
+        # is the hour of the day.
+        origin = int(np.datetime64(start, "h").astype(np.int64))
+        offset = self.history_hours - seasons * season
+        block = filled[:, offset:].reshape(len(filled), seasons, season)
+        deviations = block - block.mean(axis=2, keepdims=True)
+        profile = np.roll(
+            deviations.mean(axis=1), (origin + offset) % season, axis=1
+        )
+
+        positions = (origin + np.arange(self.history_hours)) % season
+        deseasonalized = filled - profile[:, positions]
+        level = deseasonalized @ smoothing_weights(
+            self.history_hours, self.alpha
+        )
+        ahead = (
+            origin + self.history_hours + np.arange(self.horizon_hours)
+        ) % season
+        return level[:, None] + profile[:, ahead]
+
+    def store(
+        self, city_ids: np.ndarray, first_hour: datetime, forecast: np.ndarray
+    ) -> int:
+        """
+        Replaces the stored forecasts of the forecast hours with new ones, in
+        one transaction and with one INSERT for all rows.
+
+        Args:
+            city_ids (np.ndarray): City id of each forecast row.
+            first_hour (datetime): The hour of the first forecast column.
+            forecast (np.ndarray): (cities x horizon_hours) forecasts.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        hours = np.datetime64(first_hour, "h") + np.arange(self.horizon_hours)
+        daytime = np.broadcast_to(hours, forecast.shape).ravel()
+        city_id = np.repeat(city_ids, self.horizon_hours)
+        # The arrays are sent as three parameters and unnested server-side,
+        # so the statement does not grow with the number of rows.
+        insert = text(
+            """
+            INSERT INTO simulations (
+                city_id, daytime, predicted_temperature, prediction
+            )
+            SELECT city_id, daytime, predicted_temperature, :prediction
+            FROM unnest(
+                CAST(:city_ids AS INT[]),
+                CAST(:daytimes AS TIMESTAMP[]),
+                CAST(:temperatures AS FLOAT[])
+            ) AS f(city_id, daytime, predicted_temperature);
+            """
+        )
+        delete = text(
+            """
+            DELETE FROM simulations
+            WHERE prediction = :prediction
+              AND daytime >= :first AND daytime < :end;
+            """
+        )
+        with self.data_api.sqlalchemy_connection.transaction() as connection:
+            connection.execute(
+                delete,
+                {
+                    "prediction": MODEL_NAME,
+                    "first": first_hour,
+                    "end": first_hour + timedelta(hours=self.horizon_hours),
+                },
+            )
+            connection.execute(
+                insert,
+                {
+                    "prediction": MODEL_NAME,
+                    "city_ids": city_id.tolist(),
+                    "daytimes": daytime.astype(datetime).tolist(),
+                    "temperatures": np.round(forecast, 2).ravel().tolist(),
+                },
+            )
+        return len(city_id)
+
+    def run(
+        self, now: Optional[datetime] = None, dry_run: bool = False
+    ) -> int:
+        """
+        Forecasts the hours after the last complete hour for every city with
+        history and stores the forecasts.
+
+        Args:
+            now (Optional[datetime]): The current time, defaults to now.
+            dry_run (bool): Log a summary instead of storing the forecasts.
+
+        Returns:
+            int: The number of forecast rows.
+        """
+        first_hour = (now or datetime.now()).replace(
+            minute=0, second=0, microsecond=0
+        )
+        start = first_hour - timedelta(hours=self.history_hours)
+        with tracer.span("TemperatureForecaster.load_history"):
+            city_ids, history = self.load_history(start)
+        if not len(city_ids):
+            logging.warning("No history to forecast from since %s", start)
+            return 0
+        with tracer.span("TemperatureForecaster.fit_predict"):
+            forecast = self.fit_predict(history, start)
+        logging.info(
+            "Forecast %d hours for %d cities from %s",
+            self.horizon_hours,
+            len(city_ids),
+            first_hour,
+        )
+        if dry_run:
+            logging.info(
+                "Forecast range %.2f to %.2f", forecast.min(), forecast.max()
+            )
+            return forecast.size
+        with tracer.span("TemperatureForecaster.store"):
+            return self.store(city_ids, first_hour, forecast)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Forecast hourly temperatures into the simulations table"
+    )
+    parser.add_argument("--history-hours", type=int)
+    parser.add_argument("--horizon-hours", type=int)
+    parser.add_argument("--alpha", type=float)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    forecaster = TemperatureForecaster(
+        DataAPI(db_config),
+        history_hours=args.history_hours,
+        horizon_hours=args.horizon_hours,
+        alpha=args.alpha,
+    )
+    forecaster.run(dry_run=args.dry_run)
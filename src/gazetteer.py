@@ -0,0 +1,154 @@
+import argparse
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Iterable, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+# Column positions in the GeoNames dump format (allCountries.txt,
+# cities500.txt, cities15000.txt, ...).
+GEONAMES_NAME = 1
+GEONAMES_ASCIINAME = 2
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_FEATURE_CLASS = 6
+GEONAMES_COUNTRY_CODE = 8
+GEONAMES_POPULATION = 14
+
+
+class GazetteerIndex:
+    """
+    An on-disk (SQLite) lookup index from (city name, country code) to
+    coordinates, built from a GeoNames dump. Lookups are case-insensitive and
+    resolve ambiguous names to the most populous place.
+    """
+
+    def __init__(self, index_path: str) -> None:
+        """
+        Opens an existing index read-only.
+
+        Args:
+            index_path (str): Path of the index file created by `build`.
+
+        Raises:
+            FileNotFoundError: If the index does not exist.
+        """
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"Gazetteer index not found: {index_path}")
+        self.index_path = index_path
+        self._connection = sqlite3.connect(
+            f"file:{index_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(source_path: str, index_path: str) -> int:
+        """
+        Builds the index from a GeoNames tab-separated dump, keeping populated
+        places (feature class P) under both their name and ASCII name.
+
+        Args:
+            source_path (str): Path of the GeoNames dump.
+            index_path (str): Path of the index file to (re)create.
+
+        Returns:
+            int: The number of names in the index.
+        """
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        connection = sqlite3.connect(index_path)
+        connection.execute(
+            """
+            CREATE TABLE places (
+                name TEXT NOT NULL,
+                country TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                population INTEGER NOT NULL,
+                PRIMARY KEY (name, country)
+            ) WITHOUT ROWID
+            """
+        )
+        csv.field_size_limit(sys.maxsize)
+
+        def rows() -> Iterable[Tuple[str, str, float, float, int]]:
+            with open(source_path, encoding="utf-8", newline="") as f:
+                reader = csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+                for record in reader:
+                    if record[GEONAMES_FEATURE_CLASS] != "P":
+                        continue
+                    country = record[GEONAMES_COUNTRY_CODE].upper()
+                    latitude = float(record[GEONAMES_LATITUDE])
+                    longitude = float(record[GEONAMES_LONGITUDE])
+                    population = int(record[GEONAMES_POPULATION] or 0)
+                    for name in {
+                        record[GEONAMES_NAME].casefold(),
+                        record[GEONAMES_ASCIINAME].casefold(),
+                    }:
+                        if name:
+                            yield (
+                                name,
+                                country,
+                                latitude,
+                                longitude,
+                                population,
+                            )
+
+        with connection:
+            connection.executemany(
+                """
+                INSERT INTO places VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name, country) DO UPDATE SET
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    population = excluded.population
+                WHERE excluded.population > places.population
+                """,
+                rows(),
+            )
+        count = connection.execute("SELECT COUNT(*) FROM places").fetchone()
+        connection.close()
+        logging.info(
+            "Gazetteer index %s built with %d names", index_path, count[0]
+        )
+        return count[0]
+
+    def lookup(
+        self, city_name: str, country_name: str
+    ) -> Optional[Tuple[float, float]]:
+        """
+        Looks up the coordinates of a city.
+
+        Args:
+            city_name (str): The name of the city.
+            country_name (str): The ISO country code of the city.
+
+        Returns:
+            Optional[Tuple[float, float]]: (latitude, longitude), or None when
+            the gazetteer does not know the city.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT latitude, longitude FROM places "
+                "WHERE name = ? AND country = ?",
+                (city_name.casefold(), country_name.upper()),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def close(self) -> None:
+        """Closes the index file."""
+        self._connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the gazetteer lookup index from a GeoNames dump"
+    )
+    parser.add_argument("source", help="GeoNames dump, e.g. cities500.txt")
+    parser.add_argument("index", help="index file to create")
+    args = parser.parse_args()
+    GazetteerIndex.build(args.source, args.index)
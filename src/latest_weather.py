@@ -0,0 +1,153 @@
+from config import db_config
+from api import DataAPI
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+
+class LatestWeatherCache:
+    """
+    In-process copy of the 'weather_latest' table for constant-time
+    current-weather lookups.
+
+    The first access loads every row; after that `refresh` only reads rows
+    whose record_time moved past the newest one already cached, so a refresh
+    after an hourly run costs one indexed range scan. Lookups refresh first
+    when the cache is older than `max_age_seconds` or the ingest generation
+    changed. Only a change of the backfill generation (after a ring buffer
+    replay or a sink shipment, which may store observations with an older
+    record_time than the cached ones) reads every row again.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        max_age_seconds: Optional[float] = None,
+        overlap_seconds: float = 60.0,
+    ) -> None:
+        """
+        Initializes the cache. Nothing is read until the first lookup.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            max_age_seconds (Optional[float]): How stale the cache may get
+                before a lookup refreshes it; defaults to LATEST_CACHE_MAX_AGE
+                or 60.
+            overlap_seconds (float): How far before the newest cached
+                record_time an incremental refresh starts reading, so rows
+                committed late by a concurrent collector are not missed.
+        """
+        self.data_api = data_api
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("LATEST_CACHE_MAX_AGE", "60"))
+        self.max_age_seconds = max_age_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.observations: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.newest: Optional[datetime] = None
+        self.refreshed_at: Optional[float] = None
+        # Ingest and backfill generations the cache is up to date with.
+        self.generation: Optional[int] = None
+        self.backfill_generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Reads the rows that changed since the last refresh, or every row on
+        the first call.
+
+        Args:
+            full (bool): Read every row and replace the cached ones, dropping
+                cities no longer in the table.
+
+        Returns:
+            int: The number of rows read.
+        """
+        query = (
+            "SELECT city_name, country_name, temperature, humidity, pressure, "
+            "rain, description, record_time FROM weather_latest"
+        )
+        params = {}
+        with self._lock:
+            full = full or self.newest is None
+            if not full:
+                query += " WHERE record_time >= :since"
+                params["since"] = self.newest - self.overlap
+            rows = self.data_api.fetch_rows(query + ";", params)
+            observations = {} if full else self.observations
+            newest = None if full else self.newest
+            for row in rows:
+                observations[(row[0], row[1])] = {
+                    "temperature": row[2],
+                    "humidity": row[3],
+                    "pressure": row[4],
+                    "rain": row[5],
+                    "description": row[6],
+                    "record_time": row[7],
+                }
+                if row[7] is not None and (newest is None or row[7] > newest):
+                    newest = row[7]
+            self.observations = observations
+            self.newest = newest
+            self.refreshed_at = time.monotonic()
+        logging.debug("Latest weather cache refreshed with %d rows", len(rows))
+        return len(rows)
+
+    def _ensure_fresh(self) -> None:
+        # Read before the rows, so a bump during the refresh triggers another.
+        generation = self.data_api.current_generation()
+        backfill_generation = self.data_api.current_backfill_generation()
+        if backfill_generation != self.backfill_generation:
+            self.refresh(full=True)
+        elif generation != self.generation or (
+            time.monotonic() - self.refreshed_at > self.max_age_seconds
+        ):
+            self.refresh()
+        else:
+            return
+        self.generation = generation
+        self.backfill_generation = backfill_generation
+
+    def get(
+        self, city_name: str, country_name: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Returns the current weather of a city.
+
+        Args:
+            city_name (str): The name of the city.
+            country_name (str): The country of the city.
+
+        Returns:
+            Optional[Dict[str, Any]]: The newest observation, or None if the
+            city has not been observed yet.
+        """
+        self._ensure_fresh()
+        return self.observations.get((city_name, country_name))
+
+    def get_all(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Returns the current weather of every observed city.
+
+        Returns:
+            Dict[Tuple[str, str], Dict[str, Any]]: Observations keyed by
+            (city name, country name).
+        """
+        self._ensure_fresh()
+        return dict(self.observations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the current weather of a city"
+    )
+    parser.add_argument("city_name")
+    parser.add_argument("country_name")
+    args = parser.parse_args()
+    cache = LatestWeatherCache(DataAPI(db_config))
+    print(cache.get(args.city_name, args.country_name))
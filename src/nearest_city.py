@@ -0,0 +1,291 @@
+from config import db_config
+from api import DataAPI
+from src.city_converter import GeoCoder
+from src.latest_weather import LatestWeatherCache
+import argparse
+import heapq
+import logging
+import math
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class NearbyCity(NamedTuple):
+    """A monitored city returned by a nearest-city query."""
+
+    city_name: str
+    country_name: str
+    latitude: float
+    longitude: float
+    distance_km: float
+
+
+def to_unit_vector(latitude: float, longitude: float) -> Tuple[float, ...]:
+    """
+    Converts coordinates to a point on the unit sphere, so that straight-line
+    distance orders points the same way as great-circle distance.
+
+    Args:
+        latitude (float): Latitude in degrees.
+        longitude (float): Longitude in degrees.
+
+    Returns:
+        Tuple[float, ...]: The (x, y, z) point.
+    """
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+def chord_to_km(chord: float) -> float:
+    """Converts a straight-line distance on the unit sphere to kilometres."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class CitySpatialIndex:
+    """
+    An immutable KD-tree over cities placed on the unit sphere. Queries are
+    O(log n) on average instead of a haversine scan over every city, and work
+    across the antimeridian and near the poles.
+    """
+
+    def __init__(
+        self, cities: Dict[Tuple[str, str], Tuple[float, float]]
+    ) -> None:
+        """
+        Builds the tree.
+
+        Args:
+            cities (Dict[Tuple[str, str], Tuple[float, float]]): Coordinates
+                keyed by (city name, country name).
+        """
+        self.keys = list(cities)
+        self.coordinates = [cities[key] for key in self.keys]
+        self.points = [to_unit_vector(*c) for c in self.coordinates]
+        # Each node is (point index, axis, left subtree, right subtree).
+        self.root = self._build(list(range(len(self.points))), 0)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _build(self, indices: List[int], depth: int) -> Optional[tuple]:
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        return (
+            indices[middle],
+            axis,
+            self._build(indices[:middle], depth + 1),
+            self._build(indices[middle + 1 :], depth + 1),
+        )
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int = 1
+    ) -> List[NearbyCity]:
+        """
+        Finds the k cities closest to a point.
+
+        Args:
+            latitude (float): Latitude in degrees.
+            longitude (float): Longitude in degrees.
+            k (int): Number of cities to return.
+
+        Returns:
+            List[NearbyCity]: The cities, closest first.
+        """
+        if k <= 0 or self.root is None:
+            return []
+        target = to_unit_vector(latitude, longitude)
+        # Max-heap of (-squared distance, point index) holding the best k.
+        best: List[Tuple[float, int]] = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            index, axis, left, right = node
+            point = self.points[index]
+            distance = sum((a - b) ** 2 for a, b in zip(point, target))
+            if len(best) < k:
+                heapq.heappush(best, (-distance, index))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, index))
+            offset = target[axis] - point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # The far side can only hold closer points if the splitting plane
+            # is nearer than the current k-th best.
+            if len(best) < k or offset * offset < -best[0][0]:
+                stack.append(far)
+            stack.append(near)
+        result = []
+        for negative_distance, index in sorted(best, reverse=True):
+            city_name, country_name = self.keys[index]
+            latitude, longitude = self.coordinates[index]
+            result.append(
+                NearbyCity(
+                    city_name,
+                    country_name,
+                    latitude,
+                    longitude,
+                    chord_to_km(math.sqrt(-negative_distance)),
+                )
+            )
+        return result
+
+
+class NearestCityLookup:
+    """
+    Answers "which monitored cities are closest to this point" from an
+    in-memory spatial index, together with each city's latest observation.
+
+    The index is built from the coordinates stored in 'cities' and those the
+    GeoCoder has resolved in this process, and is swapped atomically on
+    `refresh`, so lookups never wait for a rebuild. When the ingest generation
+    changes (after an ingest run or a city import) the next lookup starts a
+    rebuild in the background and is answered from the current index.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        geo_coder: Optional[GeoCoder] = None,
+        latest: Optional[LatestWeatherCache] = None,
+    ) -> None:
+        """
+        Initializes the lookup. The index is built on first use.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            geo_coder (Optional[GeoCoder]): GeoCoder whose resolved coordinates
+                are added to the index.
+            latest (Optional[LatestWeatherCache]): Source of the latest
+                observations; a new cache is created when None.
+        """
+        self.data_api = data_api
+        self.geo_coder = geo_coder
+        self.latest = latest or LatestWeatherCache(data_api)
+        self._index: Optional[CitySpatialIndex] = None
+        # Ingest generation the index was built at.
+        self._generation: Optional[int] = None
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    def load_coordinates(self) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """
+        Collects the coordinates of every monitored city.
+
+        Returns:
+            Dict[Tuple[str, str], Tuple[float, float]]: Coordinates keyed by
+            (city name, country name).
+        """
+        query = (
+            "SELECT city_name, country_name, latitude, longitude FROM cities "
+            "WHERE latitude IS NOT NULL AND longitude IS NOT NULL;"
+        )
+        coordinates = {
+            (city, country): (lat, lon)
+            for city, country, lat, lon in self.data_api.fetch_rows(query)
+        }
+        if self.geo_coder is not None:
+            coordinates.update(self.geo_coder.coordinates)
+        return coordinates
+
+    def refresh(self) -> int:
+        """
+        Rebuilds the spatial index.
+
+        Returns:
+            int: The number of cities in the index.
+        """
+        # Read before the rows, so a bump during the rebuild triggers another.
+        generation = self.data_api.current_generation()
+        index = CitySpatialIndex(self.load_coordinates())
+        with self._lock:
+            self._index = index
+            self._generation = generation
+        logging.info("Nearest-city index built with %d cities", len(index))
+        return len(index)
+
+    def _refresh_in_background(self) -> None:
+        """Starts a rebuild of the index unless one is already running."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild() -> None:
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.warning("Could not rebuild nearest-city index: %s", e)
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+
+        threading.Thread(
+            target=rebuild, name="NearestCityRefresh", daemon=True
+        ).start()
+
+    @property
+    def index(self) -> CitySpatialIndex:
+        """
+        The current spatial index, built on first access and rebuilt in the
+        background once the ingest generation changed.
+        """
+        if self._index is None:
+            self.refresh()
+        elif self.data_api.current_generation() != self._generation:
+            self._refresh_in_background()
+        return self._index
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Finds the k monitored cities closest to a point.
+
+        Args:
+            latitude (float): Latitude in degrees.
+            longitude (float): Longitude in degrees.
+            k (int): Number of cities to return.
+
+        Returns:
+            List[Dict[str, Any]]: The cities, closest first, each with its
+            distance in kilometres and latest observation (None if the city
+            has not been observed yet).
+
+        Raises:
+            ValueError: If the coordinates are out of range.
+        """
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"Invalid coordinates: {latitude}, {longitude}")
+        return [
+            dict(
+                city._asdict(),
+                observation=self.latest.get(city.city_name, city.country_name),
+            )
+            for city in self.index.nearest(latitude, longitude, k)
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find the monitored cities closest to a point"
+    )
+    parser.add_argument("latitude", type=float)
+    parser.add_argument("longitude", type=float)
+    parser.add_argument("-k", type=int, default=1, help="number of cities")
+    args = parser.parse_args()
+    lookup = NearestCityLookup(DataAPI(db_config))
+    for city in lookup.nearest(args.latitude, args.longitude, args.k):
+        print(city)
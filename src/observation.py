@@ -0,0 +1,344 @@
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    MetaData,
+    SmallInteger,
+    String,
+    Table,
+    select,
+)
+from sqlalchemy.dialects.postgresql import REAL, insert
+from sqlalchemy.engine import Connection
+from monitoring import tracer
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # orjson is an optional speed-up
+    import json
+
+    _loads = json.loads
+
+metadata = MetaData()
+
+cities_table = Table(
+    "cities",
+    metadata,
+    Column("city_id", Integer, primary_key=True),
+    Column("city_name", String),
+    Column("country_name", String),
+)
+
+# Descriptions are stored once here and referenced by a small integer code.
+weather_conditions_table = Table(
+    "weather_conditions",
+    metadata,
+    Column("condition_id", SmallInteger, primary_key=True),
+    Column("description", String, unique=True),
+)
+
+# The compact history table written by the ingest path.
+weather_observations_table = Table(
+    "weather_observations",
+    metadata,
+    Column("weather_id", Integer, primary_key=True),
+    Column("record_time", DateTime),
+    Column("city_id", Integer, ForeignKey("cities.city_id")),
+    Column("temperature", REAL),
+    Column("rain", REAL),
+    Column("humidity", SmallInteger),
+    Column("pressure", SmallInteger),
+    Column(
+        "condition_id",
+        SmallInteger,
+        ForeignKey("weather_conditions.condition_id"),
+    ),
+)
+
+# A read-only view over weather_observations with the original column shape.
+weather_data_table = Table(
+    "weather_data",
+    metadata,
+    Column("weather_id", Integer, primary_key=True),
+    Column("country_name", String),
+    Column("city_name", String),
+    Column("temperature", Float, default=0.0),
+    Column("humidity", Float, default=0.0),
+    Column("pressure", Float, default=0.0),
+    Column("rain", Float, default=0.0),
+    Column("description", String),
+    Column("record_time", DateTime),
+)
+
+# One row per city holding its newest observation; see `store_observations`.
+weather_latest_table = Table(
+    "weather_latest",
+    metadata,
+    Column("country_name", String, primary_key=True),
+    Column("city_name", String, primary_key=True),
+    Column("temperature", Float),
+    Column("humidity", Float),
+    Column("pressure", Float),
+    Column("rain", Float),
+    Column("description", String),
+    Column("record_time", DateTime),
+)
+
+OBSERVATION_COLUMNS = (
+    "temperature",
+    "humidity",
+    "pressure",
+    "rain",
+    "description",
+    "record_time",
+)
+
+
+class Observation(NamedTuple):
+    """A single weather observation for a city, as read from 'weather_data'."""
+
+    country_name: str
+    city_name: str
+    temperature: float
+    humidity: float
+    pressure: float
+    rain: float
+    description: str
+    # None for live observations, which take the database's transaction time.
+    record_time: Optional[datetime] = None
+
+    @classmethod
+    def from_response(
+        cls, city_name: str, response: Dict[str, Any]
+    ) -> "Observation":
+        """
+        Builds an observation from a decoded weather API response.
+
+        Args:
+            city_name (str): The name of the city the response belongs to.
+            response (Dict[str, Any]): The decoded JSON response.
+
+        Returns:
+            Observation: The parsed observation.
+        """
+        main = response["main"]
+        return cls(
+            response["sys"]["country"],
+            city_name,
+            main["temp"],
+            main["humidity"],
+            main["pressure"],
+            response.get("rain", {"1h": 0})["1h"],
+            response["weather"][0]["description"],
+        )
+
+    @classmethod
+    def from_payload(cls, city_name: str, payload: bytes) -> "Observation":
+        """
+        Parses an observation straight from the raw response body, using orjson
+        when it is installed.
+
+        Args:
+            city_name (str): The name of the city the response belongs to.
+            payload (bytes): The raw JSON body of the weather API response.
+
+        Returns:
+            Observation: The parsed observation.
+        """
+        with tracer.span("Observation.from_payload", city=city_name):
+            return cls.from_response(city_name, _loads(payload))
+
+
+class DictionaryEncoder:
+    """
+    Maps city names to `city_id` and descriptions to `weather_conditions`
+    codes for the compact history table, caching both in process.
+
+    New descriptions are added to 'weather_conditions' in their own committed
+    transaction, so a cached code stays valid even if the insert that needed
+    it is rolled back.
+    """
+
+    def __init__(self) -> None:
+        self.city_ids: Dict[Tuple[str, str], int] = {}
+        self.condition_codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def city_id(
+        self, connection: Connection, city_name: str, country_name: str
+    ) -> int:
+        """
+        Returns the id of a city.
+
+        Args:
+            connection (Connection): An open connection.
+            city_name (str): The name of the city.
+            country_name (str): The country of the city.
+
+        Returns:
+            int: The city's `city_id`.
+
+        Raises:
+            LookupError: If the city is not in 'cities'.
+        """
+        key = (city_name, country_name)
+        city_id = self.city_ids.get(key)
+        if city_id is None:
+            city_id = connection.execute(
+                select(cities_table.c.city_id).where(
+                    cities_table.c.city_name == city_name,
+                    cities_table.c.country_name == country_name,
+                )
+            ).scalar()
+            if city_id is None:
+                raise LookupError(f"Unknown city: {city_name}, {country_name}")
+            with self._lock:
+                self.city_ids[key] = city_id
+        return city_id
+
+    def condition_code(self, connection: Connection, description: str) -> int:
+        """
+        Returns the code of a weather description, adding it to
+        'weather_conditions' on first sight.
+
+        Args:
+            connection (Connection): An open connection; its engine is used to
+                commit new descriptions separately.
+            description (str): The description.
+
+        Returns:
+            int: The description's `condition_id`.
+        """
+        code = self.condition_codes.get(description)
+        if code is None:
+            upsert = insert(weather_conditions_table).values(
+                description=description
+            )
+            # DO UPDATE instead of DO NOTHING so RETURNING always yields the
+            # id, also when a concurrent collector added it first.
+            upsert = upsert.on_conflict_do_update(
+                index_elements=["description"],
+                set_={"description": upsert.excluded.description},
+            ).returning(weather_conditions_table.c.condition_id)
+            with connection.engine.begin() as conditions_connection:
+                code = conditions_connection.execute(upsert).scalar()
+            with self._lock:
+                self.condition_codes[description] = code
+        return code
+
+    def encode(
+        self, connection: Connection, observation: Observation
+    ) -> Dict[str, Any]:
+        """
+        Builds the 'weather_observations' row of an observation.
+
+        Args:
+            connection (Connection): An open connection.
+            observation (Observation): The observation.
+
+        Returns:
+            Dict[str, Any]: The row.
+        """
+        return {
+            "city_id": self.city_id(
+                connection, observation.city_name, observation.country_name
+            ),
+            "temperature": observation.temperature,
+            "rain": observation.rain,
+            "humidity": observation.humidity,
+            "pressure": observation.pressure,
+            "condition_id": self.condition_code(
+                connection, observation.description
+            ),
+        }
+
+
+dictionary_encoder = DictionaryEncoder()
+
+
+def latest_rows(
+    observations: Sequence[Observation], timed: bool
+) -> List[Dict[str, Any]]:
+    """
+    Builds the 'weather_latest' rows of a batch, keeping only the newest
+    observation per city so the multi-row upsert never touches a row twice.
+
+    Args:
+        observations (Sequence[Observation]): The observations.
+        timed (bool): Whether the observations carry their own record_time.
+
+    Returns:
+        List[Dict[str, Any]]: One row per city.
+    """
+    newest: Dict[Tuple[str, str], Observation] = {}
+    for observation in observations:
+        key = (observation.country_name, observation.city_name)
+        current = newest.get(key)
+        if (
+            current is None
+            or not timed
+            or observation.record_time >= current.record_time
+        ):
+            newest[key] = observation
+    rows = [observation._asdict() for observation in newest.values()]
+    if not timed:
+        for row in rows:
+            del row["record_time"]
+    return rows
+
+
+def store_observations(
+    connection: Connection, observations: Sequence[Observation]
+) -> int:
+    """
+    Inserts observations into 'weather_observations' with a single Core
+    executemany, bypassing the ORM unit of work, and upserts them into
+    'weather_latest' in the same transaction so current-weather reads never
+    touch the history.
+
+    Args:
+        connection (Connection): A connection inside an open transaction.
+        observations (Sequence[Observation]): The observations to insert.
+
+    Returns:
+        int: The number of observations inserted.
+    """
+    if not observations:
+        return 0
+    upsert = insert(weather_latest_table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["country_name", "city_name"],
+        set_={
+            column: upsert.excluded[column] for column in OBSERVATION_COLUMNS
+        },
+        where=weather_latest_table.c.record_time
+        <= upsert.excluded.record_time,
+    )
+    with tracer.span("store_observations", rows=len(observations)):
+        # Live observations leave record_time to the server default (the
+        # transaction time) in both tables, so the latest row matches the
+        # history row exactly; replayed observations keep their own time.
+        for timed in (False, True):
+            group = [
+                observation
+                for observation in observations
+                if (observation.record_time is not None) == timed
+            ]
+            if not group:
+                continue
+            encoded = []
+            for observation in group:
+                row = dictionary_encoder.encode(connection, observation)
+                if timed:
+                    row["record_time"] = observation.record_time
+                encoded.append(row)
+            connection.execute(weather_observations_table.insert(), encoded)
+            connection.execute(upsert, latest_rows(group, timed))
+    return len(observations)
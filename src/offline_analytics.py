@@ -0,0 +1,514 @@
+from config import db_config
+from api import DataAPI
+from sqlalchemy import text
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+
+VIEWS = ("rainfall_counts", "temperature_analytics", "temperature_extremes")
+
+
+def group_starts(sorted_keys: np.ndarray) -> np.ndarray:
+    """
+    Returns the index where each run of equal keys starts.
+
+    Args:
+        sorted_keys (np.ndarray): Group keys in sorted order.
+
+    Returns:
+        np.ndarray: Start indices, usable with `ufunc.reduceat`.
+    """
+    if not len(sorted_keys):
+        return np.empty(0, dtype=np.intp)
+    changes = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    return np.concatenate(([0], changes))
+
+
+def round_half_away(values: np.ndarray, decimals: int = 2) -> np.ndarray:
+    """
+    Rounds like PostgreSQL's ROUND(numeric): halves away from zero, not to
+    even.
+
+    Args:
+        values (np.ndarray): The values to round.
+        decimals (int): Decimal places to keep.
+
+    Returns:
+        np.ndarray: The rounded values; NaN stays NaN.
+    """
+    scale = 10.0**decimals
+    # Drop float noise first, as the cast to numeric does, so 2.675 is a half.
+    scaled = np.round(np.abs(values) * scale, 9)
+    return np.sign(values) * np.floor(scaled + 0.5) / scale
+
+
+def week_start(days: np.ndarray) -> np.ndarray:
+    """
+    Returns the Monday of the week of each day, like date_trunc('week', ...).
+
+    Args:
+        days (np.ndarray): Days as datetime64[D].
+
+    Returns:
+        np.ndarray: The Mondays as datetime64[D].
+    """
+    # 1970-01-01, day 0, was a Thursday: three days after a Monday.
+    offset = (days.astype(np.int64) + 3) % 7
+    return days - offset.astype("timedelta64[D]")
+
+
+def nan_group_stats(
+    values: np.ndarray, starts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts and sums the non-NaN values of each group, the way SQL aggregates
+    skip NULLs.
+
+    Args:
+        values (np.ndarray): Values sorted by group.
+        starts (np.ndarray): Start index of each group.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The non-NaN count, sum and
+        mean of each group; the mean is NaN for groups without values.
+    """
+    present = ~np.isnan(values)
+    counts = np.add.reduceat(present.astype(np.int64), starts)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return counts, sums, means
+
+
+class OfflineAnalytics:
+    """
+    Computes the 'rainfall_counts', 'temperature_analytics' and
+    'temperature_extremes' views with NumPy instead of Postgres.
+
+    Observations are held as column arrays: the city as an integer code into
+    `city_names`, the record time as datetime64[s] and temperature and rain as
+    float64 with NaN for NULL. They are read once from the database in
+    streamed chunks, or from a file written by `save`, so what-if and
+    backfill analytics over long histories run on worker machines without
+    loading the production database. Every aggregate is a sort followed by
+    `ufunc.reduceat` over the group boundaries; no Python code runs per row.
+
+    Like the views, results are grouped by city name and relative to `now`.
+    """
+
+    def __init__(
+        self,
+        city_names: np.ndarray,
+        city: np.ndarray,
+        record_time: np.ndarray,
+        temperature: np.ndarray,
+        rain: np.ndarray,
+    ) -> None:
+        """
+        Initializes the OfflineAnalytics with observation columns.
+
+        Args:
+            city_names (np.ndarray): City name of each city code, sorted.
+            city (np.ndarray): City code of each observation.
+            record_time (np.ndarray): Record time of each observation.
+            temperature (np.ndarray): Temperature of each observation.
+            rain (np.ndarray): Rain of each observation.
+        """
+        self.city_names = np.asarray(city_names, dtype=str)
+        self.city = np.asarray(city, dtype=np.int32)
+        self.record_time = np.asarray(record_time, dtype="datetime64[s]")
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.rain = np.asarray(rain, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.city)
+
+    @classmethod
+    def from_connection(
+        cls,
+        connection: Any,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 100_000,
+    ) -> "OfflineAnalytics":
+        """
+        Reads the observations recorded in [start, end) over an open
+        connection, streaming `chunk_size` rows at a time.
+
+        Args:
+            connection: An open SQLAlchemy connection.
+            start (Optional[datetime]): First record time to read.
+            end (Optional[datetime]): Record time to stop before.
+            chunk_size (int): Rows fetched per round trip.
+
+        Returns:
+            OfflineAnalytics: The observations.
+        """
+        cities = connection.execute(
+            text("SELECT city_id, city_name FROM cities;")
+        ).all()
+        city_ids = np.array([row[0] for row in cities], dtype=np.int64)
+        city_names, name_codes = np.unique(
+            np.array([row[1] for row in cities], dtype=str),
+            return_inverse=True,
+        )
+        # city_id -> code of its name; cities sharing a name share a code,
+        # as the views group by city_name.
+        code_of_id = np.full(
+            int(city_ids.max(initial=0)) + 1, -1, dtype=np.int32
+        )
+        code_of_id[city_ids] = name_codes
+
+        conditions = []
+        params: Dict[str, Any] = {}
+        if start is not None:
+            conditions.append("record_time >= :start")
+            params["start"] = start
+        if end is not None:
+            conditions.append("record_time < :end")
+            params["end"] = end
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = text(
+            "SELECT city_id, record_time, temperature, rain "
+            f"FROM weather_observations {where};"
+        )
+        chunks: List[Tuple[np.ndarray, ...]] = []
+        result = connection.execution_options(
+            stream_results=True, yield_per=chunk_size
+        ).execute(query, params)
+        for rows in result.partitions():
+            ids, record_time, temperature, rain = zip(*rows)
+            chunks.append(
+                (
+                    code_of_id[np.array(ids, dtype=np.int64)],
+                    np.array(record_time, dtype="datetime64[s]"),
+                    np.array(temperature, dtype=np.float64),
+                    np.array(rain, dtype=np.float64),
+                )
+            )
+        logging.info(
+            "Loaded %d observations in %d chunks",
+            sum(len(chunk[0]) for chunk in chunks),
+            len(chunks),
+        )
+        if not chunks:
+            empty = np.empty(0)
+            return cls(city_names, empty, empty, empty, empty)
+        return cls(
+            city_names, *(np.concatenate(column) for column in zip(*chunks))
+        )
+
+    @classmethod
+    def from_database(
+        cls,
+        data_api: DataAPI,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 100_000,
+    ) -> "OfflineAnalytics":
+        """
+        Reads the observations recorded in [start, end) from the database.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            start (Optional[datetime]): First record time to read.
+            end (Optional[datetime]): Record time to stop before.
+            chunk_size (int): Rows fetched per round trip.
+
+        Returns:
+            OfflineAnalytics: The observations.
+        """
+        with data_api.sqlalchemy_connection.engine.connect() as connection:
+            return cls.from_connection(connection, start, end, chunk_size)
+
+    @classmethod
+    def from_file(cls, path: str) -> "OfflineAnalytics":
+        """
+        Reads observations exported with `save`.
+
+        Args:
+            path (str): The .npz file.
+
+        Returns:
+            OfflineAnalytics: The observations.
+        """
+        with np.load(path) as data:
+            return cls(
+                data["city_names"],
+                data["city"],
+                data["record_time"],
+                data["temperature"],
+                data["rain"],
+            )
+
+    def save(self, path: str) -> None:
+        """
+        Exports the observation columns to a compressed .npz file.
+
+        Args:
+            path (str): The file to write.
+        """
+        np.savez_compressed(
+            path,
+            city_names=self.city_names,
+            city=self.city,
+            record_time=self.record_time,
+            temperature=self.temperature,
+            rain=self.rain,
+        )
+
+    def _between(self, start: Any, end: Any) -> np.ndarray:
+        start = np.datetime64(start, "s")
+        end = np.datetime64(end, "s")
+        return (self.record_time >= start) & (self.record_time < end)
+
+    def _city_groups(
+        self, mask: np.ndarray, values: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        cities = self.city[mask]
+        order = np.argsort(cities, kind="stable")
+        cities = cities[order]
+        starts = group_starts(cities)
+        return cities[starts], starts, values[mask][order]
+
+    def rainfall_counts(self, now: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Computes the 'rainfall_counts' view: total rain per city over the
+        last 24 hours and over the week before last.
+
+        Args:
+            now (Optional[datetime]): The current time, defaults to now.
+
+        Returns:
+            pd.DataFrame: city_name, time_frame and total_rain rows.
+        """
+        now = now or datetime.now()
+        today = now.date()
+        windows = (
+            (
+                now - timedelta(days=1),
+                now,
+                f"{today - timedelta(days=1):%Y-%m-%d}",
+            ),
+            (
+                now - timedelta(days=14),
+                now - timedelta(days=7),
+                f"{today - timedelta(days=13):%Y-%m-%d} to "
+                f"{today - timedelta(days=7):%Y-%m-%d}",
+            ),
+        )
+        frames = []
+        for start, end, time_frame in windows:
+            cities, starts, rain = self._city_groups(
+                self._between(start, end), self.rain
+            )
+            if not len(cities):
+                continue
+            counts, sums, _ = nan_group_stats(rain, starts)
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "city_name": self.city_names[cities],
+                        "time_frame": time_frame,
+                        "total_rain": np.where(
+                            counts > 0, round_half_away(sums), np.nan
+                        ),
+                    }
+                )
+            )
+        return self._concat(frames, ["city_name", "time_frame", "total_rain"])
+
+    def temperature_analytics(
+        self, now: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """
+        Computes the 'temperature_analytics' view: maximum, minimum and
+        sample standard deviation of the temperature per city for today,
+        yesterday, the current week and the last 7 days.
+
+        Args:
+            now (Optional[datetime]): The current time, defaults to now.
+
+        Returns:
+            pd.DataFrame: city_name, time_frame, max_temperature,
+            min_temperature and stddev_temperature rows.
+        """
+        today = (now or datetime.now()).date()
+        tomorrow = today + timedelta(days=1)
+        monday = today - timedelta(days=today.weekday())
+        windows = (
+            (today, tomorrow, "Today"),
+            (today - timedelta(days=1), today, "Yesterday"),
+            (monday, tomorrow, "Current Week"),
+            (today - timedelta(days=7), tomorrow, "Last 7 Days"),
+        )
+        frames = []
+        for start, end, time_frame in windows:
+            cities, starts, temperature = self._city_groups(
+                self._between(start, end), self.temperature
+            )
+            if not len(cities):
+                continue
+            counts, _, means = nan_group_stats(temperature, starts)
+            group_of_row = np.repeat(
+                np.arange(len(starts)),
+                np.diff(np.append(starts, len(temperature))),
+            )
+            deviations = temperature - means[group_of_row]
+            squares = np.add.reduceat(
+                np.where(np.isnan(deviations), 0.0, deviations**2), starts
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                stddev = np.where(
+                    counts > 1, np.sqrt(squares / (counts - 1)), np.nan
+                )
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "city_name": self.city_names[cities],
+                        "time_frame": time_frame,
+                        "max_temperature": np.fmax.reduceat(
+                            temperature, starts
+                        ),
+                        "min_temperature": np.fmin.reduceat(
+                            temperature, starts
+                        ),
+                        "stddev_temperature": round_half_away(stddev),
+                    }
+                )
+            )
+        return self._concat(
+            frames,
+            [
+                "city_name",
+                "time_frame",
+                "max_temperature",
+                "min_temperature",
+                "stddev_temperature",
+            ],
+        )
+
+    def temperature_extremes(self) -> pd.DataFrame:
+        """
+        Computes the 'temperature_extremes' view: the hottest and coldest
+        city of every hour, day and week. The view repeats these once per
+        observation; here every bucket is one row.
+
+        Returns:
+            pd.DataFrame: time_frame, interval, hottest_city,
+            highest_temperature, coldest_city and lowest_temperature rows.
+        """
+        days = self.record_time.astype("datetime64[D]")
+        buckets = (
+            ("Hourly", self.record_time.astype("datetime64[h]")),
+            ("Daily", days),
+            ("Weekly", week_start(days)),
+        )
+        frames = []
+        for interval, bucket in buckets:
+            bucket = bucket.astype("datetime64[s]")
+            # Sorted by temperature within each bucket, NaN last: the first
+            # row is the coldest (ORDER BY ASC puts NULLs last) and the last
+            # the hottest (ORDER BY DESC puts NULLs first).
+            order = np.lexsort((self.temperature, bucket))
+            bucket = bucket[order]
+            starts = group_starts(bucket)
+            if not len(starts):
+                continue
+            ends = np.append(starts[1:], len(bucket)) - 1
+            coldest, hottest = order[starts], order[ends]
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "time_frame": bucket[starts],
+                        "interval": interval,
+                        "hottest_city": self.city_names[self.city[hottest]],
+                        "highest_temperature": self.temperature[hottest],
+                        "coldest_city": self.city_names[self.city[coldest]],
+                        "lowest_temperature": self.temperature[coldest],
+                    }
+                )
+            )
+        return self._concat(
+            frames,
+            [
+                "time_frame",
+                "interval",
+                "hottest_city",
+                "highest_temperature",
+                "coldest_city",
+                "lowest_temperature",
+            ],
+        )
+
+    @staticmethod
+    def _concat(
+        frames: List[pd.DataFrame], columns: List[str]
+    ) -> pd.DataFrame:
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def view(self, name: str, now: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Computes one of the views by name.
+
+        Args:
+            name (str): One of VIEWS.
+            now (Optional[datetime]): The current time, defaults to now.
+
+        Returns:
+            pd.DataFrame: The view's rows.
+
+        Raises:
+            ValueError: If the view is unknown.
+        """
+        if name == "rainfall_counts":
+            return self.rainfall_counts(now)
+        if name == "temperature_analytics":
+            return self.temperature_analytics(now)
+        if name == "temperature_extremes":
+            return self.temperature_extremes()
+        raise ValueError(f"Unknown view: {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the analytics views offline with NumPy"
+    )
+    parser.add_argument(
+        "--input", help="observations exported with --export, else the DB"
+    )
+    parser.add_argument("--export", help="write the observations to a .npz")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    parser.add_argument("--view", choices=VIEWS, action="append")
+    parser.add_argument(
+        "--now",
+        type=datetime.fromisoformat,
+        help="evaluate the views as of this time",
+    )
+    parser.add_argument("--output", help="directory for <view>.csv files")
+    args = parser.parse_args()
+
+    if args.input:
+        analytics = OfflineAnalytics.from_file(args.input)
+    else:
+        analytics = OfflineAnalytics.from_database(
+            DataAPI(db_config), args.start, args.end
+        )
+    if args.export:
+        analytics.save(args.export)
+        logging.info("Exported %d observations", len(analytics))
+    for view in args.view or ():
+        result = analytics.view(view, args.now)
+        if args.output:
+            result.to_csv(f"{args.output}/{view}.csv", index=False)
+        else:
+            print(result.to_string(index=False))
@@ -0,0 +1,355 @@
+from config import db_config
+from api import DataAPI
+from src.city_converter import CityData, CityRecord
+from sqlalchemy import text
+import argparse
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.observation import Observation
+
+logging.basicConfig(level=logging.INFO)
+
+
+class PollScheduler:
+    """
+    Keeps a per-city polling interval in the 'city_schedule' table and decides
+    which cities are due on each tick.
+
+    Intervals adapt after every observation: cities whose temperature, pressure
+    and rain barely changed are polled half as often (up to `max_interval`),
+    cities that changed are polled twice as often (down to `min_interval`), and
+    priority cities are never polled less often than `priority_interval`.
+    """
+
+    def __init__(
+        self,
+        data_api: DataAPI,
+        base_interval: int = 60,
+        min_interval: int = 15,
+        max_interval: int = 360,
+        priority_interval: int = 15,
+        temperature_threshold: float = 0.5,
+        pressure_threshold: float = 1.0,
+        rain_threshold: float = 0.1,
+    ) -> None:
+        """
+        Initializes the scheduler. Intervals are in minutes.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            base_interval (int): Interval for new cities.
+            min_interval (int): Shortest interval for volatile cities.
+            max_interval (int): Longest interval for stable cities.
+            priority_interval (int): Longest interval for priority cities.
+            temperature_threshold (float): Change in Kelvin counted as stable.
+            pressure_threshold (float): Change in hPa counted as stable.
+            rain_threshold (float): Change in mm/h counted as stable.
+        """
+        self.data_api = data_api
+        self.connection = data_api.sqlalchemy_connection
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.priority_interval = priority_interval
+        self.thresholds = (
+            temperature_threshold,
+            pressure_threshold,
+            rain_threshold,
+        )
+
+    def sync_schedule(self) -> None:
+        """Adds a schedule row, due immediately, for every new city."""
+        query = text(
+            """
+            INSERT INTO city_schedule (city_id, poll_interval_minutes)
+            SELECT city_id, :base_interval FROM cities
+            ON CONFLICT (city_id) DO NOTHING;
+            """
+        )
+        with self.connection.transaction() as conn:
+            conn.execute(query, {"base_interval": self.base_interval})
+
+    def due_cities(self) -> Tuple[datetime, List[Tuple[int, CityRecord]]]:
+        """
+        Returns the cities whose next poll is due, priority cities first.
+
+        Returns:
+            Tuple[datetime, List[Tuple[int, CityRecord]]]: The database time of
+            the tick and the due cities with their ids.
+        """
+        query = text(
+            """
+            SELECT CURRENT_TIMESTAMP::timestamp(0), c.city_id,
+                   c.city_name, c.country_name, c.latitude, c.longitude
+            FROM city_schedule s
+            JOIN cities c ON c.city_id = s.city_id
+            WHERE s.next_due <= CURRENT_TIMESTAMP
+            ORDER BY s.priority DESC, s.next_due;
+            """
+        )
+        with self.connection.transaction() as conn:
+            rows = conn.execute(query).all()
+            if not rows:
+                tick = conn.execute(
+                    text("SELECT CURRENT_TIMESTAMP::timestamp(0);")
+                ).scalar()
+                return tick, []
+        return rows[0][0], [(row[1], CityRecord(*row[2:])) for row in rows]
+
+    def next_interval(
+        self,
+        current: int,
+        priority: bool,
+        previous: Tuple[Optional[float], ...],
+        latest: Tuple[Optional[float], ...],
+    ) -> int:
+        """
+        Computes a city's next polling interval.
+
+        Args:
+            current (int): The current interval in minutes.
+            priority (bool): Whether the city is flagged as priority.
+            previous (Tuple[Optional[float], ...]): The (temperature, pressure,
+                rain) the interval was last based on.
+            latest (Tuple[Optional[float], ...]): The newly observed values.
+
+        Returns:
+            int: The new interval in minutes.
+        """
+        if any(value is None for value in previous):
+            interval = self.base_interval
+        else:
+            stable = all(
+                abs((new or 0) - (old or 0)) < threshold
+                for new, old, threshold in zip(
+                    latest, previous, self.thresholds
+                )
+            )
+            if stable:
+                interval = min(current * 2, self.max_interval)
+            else:
+                interval = max(current // 2, self.min_interval)
+        if priority:
+            interval = min(interval, self.priority_interval)
+        return interval
+
+    def reschedule(
+        self,
+        tick: datetime,
+        city_ids: List[int],
+        observed: Dict[int, Tuple[Optional[float], ...]],
+    ) -> int:
+        """
+        Moves the polled cities to their next due time, based on how much the
+        observation stored for them in this tick differs from the previous
+        one. Cities without one (failed fetches) stay due. The interval is
+        counted from the start of the tick, so the schedule does not drift by
+        the time the tick took.
+
+        Args:
+            tick (datetime): When the tick started, from `due_cities`.
+            city_ids (List[int]): The cities polled in this tick.
+            observed (Dict[int, Tuple[Optional[float], ...]]): The
+                (temperature, pressure, rain) stored for each polled city
+                during the tick.
+
+        Returns:
+            int: The number of cities rescheduled.
+        """
+        if not observed:
+            logging.info("Rescheduled 0 of %d polled cities", len(city_ids))
+            return 0
+        select_query = text(
+            """
+            SELECT city_id, poll_interval_minutes, priority,
+                last_temperature, last_pressure, last_rain
+            FROM city_schedule
+            WHERE city_id = ANY(:city_ids);
+            """
+        )
+        update_query = text(
+            """
+            UPDATE city_schedule
+            SET poll_interval_minutes = :interval,
+                next_due = CAST(:tick AS TIMESTAMP)
+                    + make_interval(mins => :interval),
+                last_temperature = :temperature,
+                last_pressure = :pressure,
+                last_rain = :rain
+            WHERE city_id = :city_id;
+            """
+        )
+        with self.connection.transaction() as conn:
+            rows = conn.execute(
+                select_query, {"city_ids": list(observed)}
+            ).all()
+            updates = []
+            for row in rows:
+                city_id, current, priority = row[:3]
+                previous, latest = tuple(row[3:6]), observed[city_id]
+                updates.append(
+                    {
+                        "city_id": city_id,
+                        "tick": tick,
+                        "interval": self.next_interval(
+                            current, priority, previous, latest
+                        ),
+                        "temperature": latest[0],
+                        "pressure": latest[1],
+                        "rain": latest[2],
+                    }
+                )
+            if updates:
+                conn.execute(update_query, updates)
+        logging.info(
+            "Rescheduled %d of %d polled cities", len(updates), len(city_ids)
+        )
+        return len(updates)
+
+    def set_priority(
+        self, city_name: str, country_name: str, priority: bool = True
+    ) -> None:
+        """
+        Flags or unflags a city as priority; a flagged city becomes due now.
+
+        Args:
+            city_name (str): The name of the city.
+            country_name (str): The country of the city.
+            priority (bool): The new flag.
+        """
+        query = text(
+            """
+            UPDATE city_schedule s
+            SET priority = :priority,
+                next_due = CASE WHEN :priority THEN CURRENT_TIMESTAMP ELSE s.next_due END
+            FROM cities c
+            WHERE c.city_id = s.city_id
+              AND c.city_name = :city_name AND c.country_name = :country_name;
+            """
+        )
+        with self.connection.transaction() as conn:
+            conn.execute(
+                query,
+                {
+                    "priority": priority,
+                    "city_name": city_name,
+                    "country_name": country_name,
+                },
+            )
+
+
+class ScheduledCityData(CityData):
+    """
+    CityData that only exposes the cities that are due according to the
+    PollScheduler, and reschedules them once the run has finished from the
+    observations the run stored.
+    """
+
+    def __init__(
+        self, data_api_instance: DataAPI, scheduler: PollScheduler
+    ) -> None:
+        """
+        Initializes the ScheduledCityData.
+
+        Args:
+            data_api_instance (DataAPI): Data access API for database operations.
+            scheduler (PollScheduler): Decides which cities are due.
+        """
+        super().__init__(data_api_instance)
+        self.scheduler = scheduler
+        self.tick_started: Optional[datetime] = None
+        # (city name, country name) -> city id of the cities due this tick.
+        self.polled: Dict[Tuple[str, str], int] = {}
+        self.observed: Dict[int, Tuple[Optional[float], ...]] = {}
+        self._lock = threading.Lock()
+
+    def get_cities(self) -> dict:
+        """
+        Retrieves the cities that are due on this tick.
+
+        Returns:
+            dict: A dictionary where keys are city names and values are the corresponding country names.
+        """
+        return {
+            city.city_name: city.country_name
+            for batch in self.iter_city_batches()
+            for city in batch
+        }
+
+    def iter_city_batches(
+        self, batch_size: int = 500
+    ) -> Iterator[List[CityRecord]]:
+        """
+        Yields the due cities in chunks and remembers them for `reschedule`.
+
+        Args:
+            batch_size (int): Number of cities per chunk.
+
+        Yields:
+            List[CityRecord]: The due cities.
+        """
+        self.scheduler.sync_schedule()
+        self.tick_started, due = self.scheduler.due_cities()
+        self.polled = {
+            (city.city_name, city.country_name): city_id
+            for city_id, city in due
+        }
+        with self._lock:
+            self.observed = {}
+        logging.info("%d cities due for polling", len(due))
+        for start in range(0, len(due), batch_size):
+            chunk = due[start : start + batch_size]
+            yield [city for _, city in chunk]
+
+    def observation_stored(self, observation: "Observation") -> None:
+        """
+        Remembers the values stored for a polled city, for `reschedule`.
+
+        Args:
+            observation (Observation): The stored observation.
+        """
+        city_id = self.polled.get(
+            (observation.city_name, observation.country_name)
+        )
+        if city_id is None:
+            return
+        with self._lock:
+            self.observed[city_id] = (
+                observation.temperature,
+                observation.pressure,
+                observation.rain,
+            )
+
+    def reschedule(self) -> int:
+        """
+        Reschedules the cities polled in the last tick.
+
+        Returns:
+            int: The number of cities rescheduled.
+        """
+        if self.tick_started is None:
+            return 0
+        with self._lock:
+            observed = dict(self.observed)
+        return self.scheduler.reschedule(
+            self.tick_started, list(self.polled.values()), observed
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Flag cities for more frequent polling"
+    )
+    parser.add_argument("city_name")
+    parser.add_argument("country_name")
+    parser.add_argument(
+        "--off", action="store_true", help="remove the priority flag"
+    )
+    args = parser.parse_args()
+    scheduler = PollScheduler(DataAPI(db_config))
+    scheduler.sync_schedule()
+    scheduler.set_priority(args.city_name, args.country_name, not args.off)
@@ -0,0 +1,340 @@
+from src.observation import Observation, store_observations
+from monitoring import tracer
+import argparse
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from api import DataAPI
+
+logging.basicConfig(level=logging.INFO)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Fixed-size record of one observation. The description is stored UTF-8
+# encoded and truncated to the field width on a character boundary.
+RECORD_DTYPE = np.dtype(
+    [
+        ("record_time", "datetime64[s]"),
+        ("temperature", "f8"),
+        ("humidity", "f4"),
+        ("pressure", "f4"),
+        ("rain", "f4"),
+        ("flushed", "u1"),
+        ("description", "S48"),
+    ]
+)
+
+# One slot per city: its key and the number of observations ever written,
+# whose remainder by the depth is the next position in the city's ring. Keys
+# that do not fit are not buffered rather than truncated.
+CITY_DTYPE = np.dtype(
+    [
+        ("city_name", "S64"),
+        ("country_name", "S8"),
+        ("written", "i8"),
+    ]
+)
+
+
+def encode_text(value: str, width: int) -> bytes:
+    """
+    Encodes text as UTF-8, truncated to `width` bytes without splitting a
+    character.
+
+    Args:
+        value (str): The text.
+        width (int): The field width in bytes.
+
+    Returns:
+        bytes: The encoded text.
+    """
+    encoded = value.encode("utf-8")
+    if len(encoded) <= width:
+        return encoded
+    return encoded[:width].decode("utf-8", "ignore").encode("utf-8")
+
+
+class ObservationRingBuffer:
+    """
+    On-disk ring buffer holding the last `depth` observations of up to
+    `max_cities` cities in fixed-size records, memory-mapped with NumPy.
+
+    The ingest path appends every parsed observation before writing it to the
+    database and marks it flushed once the database write has committed, so
+    observations fetched during a database outage survive and can be replayed
+    with `replay`. The files are standard `.npy` files: other tools can open
+    them with `np.load(path, mmap_mode="r")` and read recent history without
+    copying or touching the database.
+
+    A buffer directory must only be written by one collector process.
+    """
+
+    def __init__(
+        self, directory: str, depth: int = 24, max_cities: int = 5000
+    ) -> None:
+        """
+        Opens the buffer in `directory`, creating it if needed. The depth and
+        city capacity of an existing buffer are kept.
+
+        Args:
+            directory (str): Directory holding the buffer files.
+            depth (int): Observations kept per city.
+            max_cities (int): Number of city slots.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        records_path = os.path.join(directory, "records.npy")
+        cities_path = os.path.join(directory, "cities.npy")
+        if os.path.exists(records_path) and os.path.exists(cities_path):
+            self.records = np.load(records_path, mmap_mode="r+")
+            self.cities = np.load(cities_path, mmap_mode="r+")
+        else:
+            self.records = np.lib.format.open_memmap(
+                records_path,
+                mode="w+",
+                dtype=RECORD_DTYPE,
+                shape=(max_cities, depth),
+            )
+            # Empty positions count as flushed so replay skips them.
+            self.records["flushed"] = 1
+            self.cities = np.lib.format.open_memmap(
+                cities_path, mode="w+", dtype=CITY_DTYPE, shape=(max_cities,)
+            )
+            self.flush()
+        self.max_cities, self.depth = self.records.shape
+        self.slots: Dict[Tuple[str, str], int] = {
+            (
+                city["city_name"].decode("utf-8"),
+                city["country_name"].decode("utf-8"),
+            ): index
+            for index, city in enumerate(self.cities)
+            if city["city_name"]
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ObservationRingBuffer"]:
+        """
+        Opens the buffer configured by RING_BUFFER_DIR (relative to the
+        project directory; unset or empty disables it), RING_BUFFER_DEPTH
+        (default 24) and RING_BUFFER_MAX_CITIES (default 5000).
+
+        Returns:
+            Optional[ObservationRingBuffer]: The buffer, or None if disabled.
+        """
+        directory = os.getenv("RING_BUFFER_DIR", "")
+        if not directory:
+            return None
+        return cls(
+            os.path.join(PROJECT_DIR, directory),
+            depth=int(os.getenv("RING_BUFFER_DEPTH", "24")),
+            max_cities=int(os.getenv("RING_BUFFER_MAX_CITIES", "5000")),
+        )
+
+    def _slot(self, city_name: str, country_name: str) -> Optional[int]:
+        key = (city_name, country_name)
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+        encoded = (city_name.encode("utf-8"), country_name.encode("utf-8"))
+        if (
+            len(encoded[0]) > CITY_DTYPE["city_name"].itemsize
+            or len(encoded[1]) > CITY_DTYPE["country_name"].itemsize
+        ):
+            # A truncated key could be replayed as a different city.
+            logging.warning(
+                "City name too long for the ring buffer, %s not buffered",
+                city_name,
+            )
+            return None
+        if len(self.slots) >= self.max_cities:
+            logging.warning("Ring buffer full, %s not buffered", city_name)
+            return None
+        slot = len(self.slots)
+        self.cities[slot] = (*encoded, 0)
+        self.slots[key] = slot
+        return slot
+
+    def append(self, observation: Observation) -> Optional[Tuple[int, int]]:
+        """
+        Writes an observation into its city's ring, unflushed.
+
+        Args:
+            observation (Observation): The observation; its record_time
+                defaults to now.
+
+        Returns:
+            Optional[Tuple[int, int]]: The position to pass to
+            `mark_flushed`, or None if the city cannot be buffered.
+        """
+        record_time = observation.record_time or datetime.now()
+        with self._lock:
+            slot = self._slot(observation.city_name, observation.country_name)
+            if slot is None:
+                return None
+            written = int(self.cities[slot]["written"])
+            position = written % self.depth
+            if not self.records[slot, position]["flushed"]:
+                logging.warning(
+                    "Ring buffer overwrote an unflushed observation of %s",
+                    observation.city_name,
+                )
+            self.records[slot, position] = (
+                np.datetime64(record_time, "s"),
+                observation.temperature,
+                observation.humidity,
+                observation.pressure,
+                observation.rain,
+                0,
+                encode_text(
+                    observation.description,
+                    RECORD_DTYPE["description"].itemsize,
+                ),
+            )
+            self.cities[slot]["written"] = written + 1
+        return slot, position
+
+    def mark_flushed(self, position: Tuple[int, int]) -> None:
+        """
+        Marks a buffered observation as stored in the database.
+
+        Args:
+            position (Tuple[int, int]): The position returned by `append`.
+        """
+        self.records[position]["flushed"] = 1
+
+    def history(self, city_name: str, country_name: str) -> np.ndarray:
+        """
+        Returns the buffered observations of a city, oldest first.
+
+        Args:
+            city_name (str): The name of the city.
+            country_name (str): The country of the city.
+
+        Returns:
+            np.ndarray: Records of RECORD_DTYPE; empty for unknown cities.
+        """
+        slot = self.slots.get((city_name, country_name))
+        if slot is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        written = int(self.cities[slot]["written"])
+        ring = self.records[slot]
+        if written <= self.depth:
+            return ring[:written]
+        position = written % self.depth
+        return np.concatenate((ring[position:], ring[:position]))
+
+    def unflushed(self) -> List[Tuple[Tuple[int, int], Observation]]:
+        """
+        Returns every observation not yet stored in the database, oldest
+        first.
+
+        Returns:
+            List[Tuple[Tuple[int, int], Observation]]: Positions and
+            observations.
+        """
+        slots, positions = np.nonzero(self.records["flushed"] == 0)
+        pending = []
+        for slot, position in zip(slots.tolist(), positions.tolist()):
+            city = self.cities[slot]
+            record = self.records[slot, position]
+            pending.append(
+                (
+                    (slot, position),
+                    Observation(
+                        city["country_name"].decode("utf-8"),
+                        city["city_name"].decode("utf-8"),
+                        float(record["temperature"]),
+                        float(record["humidity"]),
+                        float(record["pressure"]),
+                        float(record["rain"]),
+                        record["description"].decode("utf-8", "ignore"),
+                        record["record_time"].astype(datetime),
+                    ),
+                )
+            )
+        pending.sort(key=lambda item: item[1].record_time)
+        return pending
+
+    def replay(self, data_api: "DataAPI", batch_size: int = 500) -> int:
+        """
+        Stores every unflushed observation in the database, in batches that
+        each commit before they are marked flushed.
+
+        Args:
+            data_api (DataAPI): Data access API for database operations.
+            batch_size (int): Observations stored per transaction.
+
+        Returns:
+            int: The number of observations replayed.
+        """
+        pending = self.unflushed()
+        logging.info("Replaying %d buffered observations", len(pending))
+        connection = data_api.sqlalchemy_connection
+        replayed = 0
+        with tracer.span("ObservationRingBuffer.replay", rows=len(pending)):
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start : start + batch_size]
+                try:
+                    with connection.transaction() as conn:
+                        store_observations(conn, [item[1] for item in batch])
+                except LookupError:
+                    # A city that is no longer in 'cities' must not block the
+                    # rest of the replay; store the batch one by one instead.
+                    batch = [
+                        item
+                        for item in batch
+                        if self._replay_one(connection, item)
+                    ]
+                for position, _ in batch:
+                    self.mark_flushed(position)
+                self.flush()
+                replayed += len(batch)
+        logging.info("Replayed %d buffered observations", replayed)
+        if replayed:
+            try:
+                # Replayed rows may be older than what readers have cached.
+                data_api.bump_generation(backfill=True)
+            except Exception as e:
+                logging.warning("Could not bump the ingest generation: %s", e)
+        return replayed
+
+    def _replay_one(self, connection, item) -> bool:
+        position, observation = item
+        try:
+            with connection.transaction() as conn:
+                store_observations(conn, [observation])
+        except LookupError as e:
+            logging.warning("Dropping buffered observation: %s", e)
+            self.mark_flushed(position)
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Writes the buffer's dirty pages to disk."""
+        self.records.flush()
+        self.cities.flush()
+
+
+if __name__ == "__main__":
+    from config import db_config
+    from api import DataAPI
+
+    parser = argparse.ArgumentParser(
+        description="Replay observations buffered during a database outage"
+    )
+    parser.add_argument(
+        "--directory", default=os.getenv("RING_BUFFER_DIR") or "ring_buffer"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    directory = os.path.join(PROJECT_DIR, args.directory)
+    ObservationRingBuffer(directory).replay(
+        DataAPI(db_config), args.batch_size
+    )
@@ -0,0 +1,525 @@
+from database import SQLAlchemyConnection
+from src.observation import Observation, store_observations
+from monitoring import run_metrics, tracer
+import argparse
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from api import DataAPI
+
+logging.basicConfig(level=logging.INFO)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+SINK_NAMES = ("postgres", "sqlite", "parquet")
+
+# Called once the observations of a write are stored durably.
+StoredCallback = Optional[Callable[[], None]]
+
+
+class ObservationSink:
+    """
+    Destination of the observations produced by the ingest path.
+
+    `write` stores a batch and calls `on_stored` once it is durable, which
+    may be later for buffering sinks; `flush` blocks until everything written
+    so far is stored. Sinks that store from a background thread set
+    `write_behind`, as `write` returning says nothing about the store then.
+    """
+
+    write_behind = False
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        """
+        Stores observations.
+
+        Args:
+            observations (Sequence[Observation]): The observations.
+            on_stored (StoredCallback): Called once they are stored.
+        """
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Blocks until every written observation is stored."""
+
+    def close(self) -> None:
+        """Flushes and releases the sink's resources."""
+        self.flush()
+
+
+class PostgresSink(ObservationSink):
+    """Stores observations in Postgres with `store_observations`."""
+
+    def __init__(self, db_connection: SQLAlchemyConnection) -> None:
+        """
+        Initializes the PostgresSink.
+
+        Args:
+            db_connection (SQLAlchemyConnection): Database connection.
+        """
+        self.db_connection = db_connection
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        # Includes the commit, which the store_observations span does not.
+        with tracer.span("PostgresSink.write", rows=len(observations)):
+            with self.db_connection.transaction() as connection:
+                store_observations(connection, observations)
+        if on_stored is not None:
+            on_stored()
+
+
+class SQLiteSink(ObservationSink):
+    """
+    Stores observations in a local SQLite file, in a 'weather_data' table
+    with the columns of an Observation, for collectors without a database
+    server. `ship` moves them to another sink later.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens or creates the SQLite file.
+
+        Args:
+            path (str): Path of the database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL;")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather_data (
+                    weather_id INTEGER PRIMARY KEY,
+                    country_name TEXT NOT NULL,
+                    city_name TEXT NOT NULL,
+                    temperature REAL,
+                    humidity REAL,
+                    pressure REAL,
+                    rain REAL,
+                    description TEXT,
+                    record_time TEXT NOT NULL
+                );
+                """
+            )
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        # There is no server default: live observations get the write time.
+        now = datetime.now().replace(microsecond=0)
+        rows = [
+            (*observation[:7], (observation.record_time or now).isoformat())
+            for observation in observations
+        ]
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO weather_data (country_name, city_name, "
+                "temperature, humidity, pressure, rain, description, "
+                "record_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                rows,
+            )
+        if on_stored is not None:
+            on_stored()
+
+    def ship(self, target: ObservationSink, batch_size: int = 5000) -> int:
+        """
+        Moves the stored observations to another sink in batches, deleting
+        each batch once the target has stored it.
+
+        Args:
+            target (ObservationSink): The sink to move the observations to.
+            batch_size (int): Observations per batch.
+
+        Returns:
+            int: The number of observations moved.
+        """
+        shipped = 0
+        while True:
+            with self._lock:
+                rows = self.connection.execute(
+                    "SELECT weather_id, country_name, city_name, temperature, "
+                    "humidity, pressure, rain, description, record_time "
+                    "FROM weather_data ORDER BY weather_id LIMIT ?;",
+                    (batch_size,),
+                ).fetchall()
+            if not rows:
+                return shipped
+            target.write(
+                [
+                    Observation(*row[1:8], datetime.fromisoformat(row[8]))
+                    for row in rows
+                ]
+            )
+            target.flush()
+            with self._lock, self.connection:
+                self.connection.execute(
+                    "DELETE FROM weather_data WHERE weather_id <= ?;",
+                    (rows[-1][0],),
+                )
+            shipped += len(rows)
+            logging.info("Shipped %d observations from %s", shipped, self.path)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ParquetSink(ObservationSink):
+    """
+    Buffers observations in memory and writes them as Parquet files of up to
+    `rows_per_file` rows into a directory, for collectors that ship their
+    data in bulk. Requires the optional pyarrow dependency.
+    """
+
+    def __init__(self, directory: str, rows_per_file: int = 10000) -> None:
+        """
+        Initializes the ParquetSink.
+
+        Args:
+            directory (str): Directory the files are written to.
+            rows_per_file (int): Buffered rows that trigger writing a file.
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        # Imported here so collectors without a Parquet sink never load it.
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(
+                "ParquetSink requires pyarrow: poetry install --extras parquet"
+            ) from e
+        self.pyarrow = pyarrow
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.schema = pyarrow.schema(
+            [
+                ("country_name", pyarrow.string()),
+                ("city_name", pyarrow.string()),
+                ("temperature", pyarrow.float64()),
+                ("humidity", pyarrow.float64()),
+                ("pressure", pyarrow.float64()),
+                ("rain", pyarrow.float64()),
+                ("description", pyarrow.string()),
+                ("record_time", pyarrow.timestamp("s")),
+            ]
+        )
+        self._pending: List[Observation] = []
+        self._callbacks: List[Callable[[], None]] = []
+        self._files = 0
+        self._lock = threading.Lock()
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        now = datetime.now().replace(microsecond=0)
+        with self._lock:
+            self._pending.extend(
+                observation._replace(
+                    record_time=observation.record_time or now
+                )
+                for observation in observations
+            )
+            if on_stored is not None:
+                self._callbacks.append(on_stored)
+            if len(self._pending) >= self.rows_per_file:
+                self._write_file()
+
+    def _write_file(self) -> None:
+        pending, self._pending = self._pending, []
+        callbacks, self._callbacks = self._callbacks, []
+        if pending:
+            self._write_table(pending)
+        for on_stored in callbacks:
+            on_stored()
+
+    def _write_table(self, pending: List[Observation]) -> None:
+        columns = list(zip(*pending))
+        table = self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(column) for column in columns],
+            schema=self.schema,
+        )
+        self._files += 1
+        name = f"observations_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}"
+        path = os.path.join(
+            self.directory, f"{name}_{self._files:04d}.parquet"
+        )
+        # Written under a temporary name so `ship` never reads a partial file.
+        self.pyarrow.parquet.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write_file()
+
+    def ship(self, target: ObservationSink) -> int:
+        """
+        Moves the observations of every written file to another sink,
+        deleting each file once the target has stored it.
+
+        Args:
+            target (ObservationSink): The sink to move the observations to.
+
+        Returns:
+            int: The number of observations moved.
+        """
+        shipped = 0
+        for path in sorted(
+            glob.glob(os.path.join(self.directory, "*.parquet"))
+        ):
+            columns = self.pyarrow.parquet.read_table(path).to_pydict()
+            observations = [
+                Observation(*row)
+                for row in zip(
+                    *(columns[name] for name in Observation._fields)
+                )
+            ]
+            target.write(observations)
+            target.flush()
+            os.remove(path)
+            shipped += len(observations)
+            logging.info(
+                "Shipped %d observations from %s", len(observations), path
+            )
+        return shipped
+
+
+class FanOutSink(ObservationSink):
+    """
+    Writes every observation to several sinks. `on_stored` is called once
+    all of them have stored it; a failing sink does not keep the others from
+    being written, and the first error is raised afterwards.
+    """
+
+    def __init__(self, sinks: Sequence[ObservationSink]) -> None:
+        """
+        Initializes the FanOutSink.
+
+        Args:
+            sinks (Sequence[ObservationSink]): The sinks to write to.
+        """
+        self.sinks = list(sinks)
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        stored = None
+        if on_stored is not None:
+            remaining = [len(self.sinks)]
+            lock = threading.Lock()
+
+            def stored() -> None:
+                with lock:
+                    remaining[0] -= 1
+                    done = remaining[0] == 0
+                if done:
+                    on_stored()
+
+        error = None
+        for sink in self.sinks:
+            try:
+                sink.write(observations, stored)
+            except Exception as e:
+                logging.error("%s failed: %s", type(sink).__name__, e)
+                error = error or e
+        if error is not None:
+            raise error
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+class WriteBehindSink(ObservationSink):
+    """
+    Returns from `write` immediately and stores observations from a
+    background thread, in batches of up to `batch_size` gathered for at most
+    `flush_interval` seconds. The fetch threads never wait on the database;
+    they only block when `max_pending` writes are waiting.
+
+    Each batch is timed as the "store" stage of the run metrics. Batches that
+    fail are logged and counted as `sink_failures`; their `on_stored`
+    callbacks are not called.
+    """
+
+    write_behind = True
+
+    def __init__(
+        self,
+        sink: ObservationSink,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+    ) -> None:
+        """
+        Initializes the WriteBehindSink and starts its writer thread.
+
+        Args:
+            sink (ObservationSink): The sink the batches are written to.
+            batch_size (int): Maximum observations per batch.
+            flush_interval (float): Maximum seconds a batch is gathered.
+            max_pending (int): Queued writes before `write` blocks.
+        """
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Queue = Queue(maxsize=max_pending)
+        self.thread = threading.Thread(
+            target=self._writer, name="WriteBehindSink", daemon=True
+        )
+        self.thread.start()
+
+    def write(
+        self,
+        observations: Sequence[Observation],
+        on_stored: StoredCallback = None,
+    ) -> None:
+        self.queue.put((observations, on_stored))
+
+    def _writer(self) -> None:
+        closed = False
+        while not closed:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            batch = [item]
+            size = len(item[0])
+            try:
+                while size < self.batch_size:
+                    item = self.queue.get(timeout=self.flush_interval)
+                    if item is None:
+                        # The batch is stored below, then the loop ends.
+                        self.queue.task_done()
+                        closed = True
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+            except Empty:
+                pass
+            self._write_batch(batch)
+
+    def _write_batch(
+        self, batch: List[Tuple[Sequence[Observation], StoredCallback]]
+    ) -> None:
+        callbacks = [on_stored for _, on_stored in batch if on_stored]
+
+        def stored() -> None:
+            for on_stored in callbacks:
+                on_stored()
+
+        observations = [
+            observation for item in batch for observation in item[0]
+        ]
+        try:
+            with tracer.span(
+                "WriteBehindSink.write", rows=len(observations)
+            ), run_metrics.time_stage("store"):
+                self.sink.write(observations, stored)
+        except Exception as e:
+            run_metrics.increment("sink_failures", len(observations))
+            logging.error(
+                "Write-behind batch of %d failed: %s", len(observations), e
+            )
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self) -> None:
+        self.queue.join()
+        self.sink.flush()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        self.sink.close()
+
+
+def sink_from_env(data_api: "DataAPI") -> ObservationSink:
+    """
+    Builds the sink configured by WEATHER_SINKS, a comma-separated list of
+    SINK_NAMES (default "postgres"). The SQLite file is SQLITE_SINK_PATH
+    (default "weather.sqlite3") and the Parquet directory PARQUET_SINK_DIR
+    (default "parquet"), both relative to the project directory. With
+    WRITE_BEHIND=1 the sinks are written from a background thread in
+    batches of WRITE_BEHIND_BATCH_SIZE (default 500).
+
+    Args:
+        data_api (DataAPI): Data access API for the Postgres sink.
+
+    Returns:
+        ObservationSink: The sink.
+
+    Raises:
+        ValueError: If a sink name is unknown.
+    """
+    sinks: List[ObservationSink] = []
+    for name in os.getenv("WEATHER_SINKS", "postgres").split(","):
+        name = name.strip()
+        if name == "postgres":
+            sinks.append(PostgresSink(data_api.sqlalchemy_connection))
+        elif name == "sqlite":
+            path = os.getenv("SQLITE_SINK_PATH", "weather.sqlite3")
+            sinks.append(SQLiteSink(os.path.join(PROJECT_DIR, path)))
+        elif name == "parquet":
+            directory = os.getenv("PARQUET_SINK_DIR", "parquet")
+            sinks.append(ParquetSink(os.path.join(PROJECT_DIR, directory)))
+        else:
+            raise ValueError(f"Unknown sink: {name}")
+    sink = sinks[0] if len(sinks) == 1 else FanOutSink(sinks)
+    if os.getenv("WRITE_BEHIND", "").lower() in ("1", "true"):
+        sink = WriteBehindSink(
+            sink,
+            batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+        )
+    return sink
+
+
+if __name__ == "__main__":
+    from config import db_config
+    from api import DataAPI
+
+    parser = argparse.ArgumentParser(
+        description="Ship observations stored by local sinks to Postgres"
+    )
+    parser.add_argument("--sqlite", help="SQLite file written by SQLiteSink")
+    parser.add_argument("--parquet", help="directory written by ParquetSink")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    data_api = DataAPI(db_config)
+    target = PostgresSink(data_api.sqlalchemy_connection)
+    shipped = 0
+    if args.sqlite:
+        shipped += SQLiteSink(args.sqlite).ship(target, args.batch_size)
+    if args.parquet:
+        shipped += ParquetSink(args.parquet).ship(target)
+    if shipped:
+        # Shipped rows may be older than what readers have cached.
+        data_api.bump_generation(backfill=True)
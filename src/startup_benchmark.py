@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+IMPORTTIME_LINE = re.compile(
+    r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$"
+)
+
+
+class StartupBenchmark:
+    """
+    Measures the cold-start import cost of `main.py` with `python -X importtime`
+    and checks it against a configured budget. By default the run also builds
+    a `WeatherRunner`, so modules its constructor imports lazily (the
+    processors, sinks and optional features enabled by the environment) are
+    counted too.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the benchmark from environment variables:
+
+        STARTUP_IMPORT_BUDGET_MS: maximum cumulative import time (default 400).
+        STARTUP_IMPORT_RUNS: number of cold starts to sample (default 5).
+        STARTUP_FORBIDDEN_MODULES: comma-separated modules the ingest path must
+            not import (default "pandas,numpy").
+        STARTUP_CONSTRUCT_RUNNER: also construct `main.WeatherRunner` in the
+            measured interpreter (default 1); set to 0 to time the bare import.
+        """
+        self.budget_ms: float = float(
+            os.getenv("STARTUP_IMPORT_BUDGET_MS", "400")
+        )
+        self.runs: int = int(os.getenv("STARTUP_IMPORT_RUNS", "5"))
+        self.forbidden_modules: List[str] = [
+            name.strip()
+            for name in os.getenv(
+                "STARTUP_FORBIDDEN_MODULES", "pandas,numpy"
+            ).split(",")
+            if name.strip()
+        ]
+        self.construct_runner: bool = os.getenv(
+            "STARTUP_CONSTRUCT_RUNNER", "1"
+        ).lower() in ("1", "true")
+        self.project_dir = os.path.join(
+            os.path.dirname(os.path.realpath(__file__)), ".."
+        )
+
+    @staticmethod
+    def parse_importtime(output: str) -> Tuple[float, Dict[str, float]]:
+        """
+        Parses the stderr of `python -X importtime`.
+
+        Args:
+            output (str): The captured stderr of the interpreter.
+
+        Returns:
+            Tuple[float, Dict[str, float]]: The total import time in milliseconds
+            (sum of top-level cumulative times) and the cumulative time of every
+            imported module in milliseconds.
+        """
+        total_us = 0
+        modules: Dict[str, float] = {}
+        for line in output.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            cumulative_us = int(match.group(2))
+            indent = len(match.group(3)) - 1
+            module = match.group(4)
+            modules[module] = cumulative_us / 1000
+            if indent == 0:
+                total_us += cumulative_us
+        return total_us / 1000, modules
+
+    def measure_once(self) -> Tuple[float, Dict[str, float]]:
+        """
+        Imports `main` in a fresh interpreter, constructs its `WeatherRunner`
+        unless disabled, and returns the import profile.
+
+        Returns:
+            Tuple[float, Dict[str, float]]: See `parse_importtime`.
+        """
+        code = "import main"
+        if self.construct_runner:
+            code += "; main.WeatherRunner()"
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=self.project_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"Starting main failed: {process.stderr.strip()[-500:]}"
+            )
+        return self.parse_importtime(process.stderr)
+
+    def execute_benchmark(self) -> bool:
+        """
+        Samples the configured number of cold starts and logs the median import
+        time, the slowest top-level imports and any forbidden module.
+
+        Returns:
+            bool: True if the median is within budget and no forbidden module
+            was imported.
+        """
+        totals = []
+        modules: Dict[str, float] = {}
+        for _ in range(self.runs):
+            total_ms, modules = self.measure_once()
+            totals.append(total_ms)
+        median_ms = statistics.median(totals)
+        logging.info(
+            "Cold-start import time: median %.1f ms over %d runs "
+            "(budget %.1f ms)",
+            median_ms,
+            self.runs,
+            self.budget_ms,
+        )
+        for module, cumulative_ms in sorted(
+            modules.items(), key=lambda item: item[1], reverse=True
+        )[:10]:
+            logging.info("  %8.1f ms  %s", cumulative_ms, module)
+
+        passed = True
+        if median_ms > self.budget_ms:
+            logging.error(
+                "Startup import budget exceeded by %.1f ms",
+                median_ms - self.budget_ms,
+            )
+            passed = False
+        for module in self.forbidden_modules:
+            if module in modules:
+                logging.error(
+                    "Forbidden module imported at startup: %s", module
+                )
+                passed = False
+        return passed
+
+
+if __name__ == "__main__":
+    benchmark = StartupBenchmark()
+    sys.exit(0 if benchmark.execute_benchmark() else 1)
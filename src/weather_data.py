@@ -1,6 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session
+from monitoring import tracer
+from src.observation import (
+    Observation,
+    store_observations,
+    weather_data_table,
+)
 from typing import Dict, Any
 
 Base = declarative_base()
@@ -8,18 +13,13 @@ Base = declarative_base()
 
 class WeatherData(Base):
     """
-    Defines the structure of the table 'weather_data' within the database.
+    Defines the structure of the 'weather_data' view within the database.
+
+    The model is meant for querying; the view is read-only. Observations are
+    written to 'weather_observations' through `store_observations`.
     """
 
-    __tablename__ = "weather_data"
-    weather_id = Column(Integer, primary_key=True)
-    country_name = Column(String)
-    city_name = Column(String)
-    temperature = Column(Float, default=0.0)
-    humidity = Column(Float, default=0.0)
-    pressure = Column(Float, default=0.0)
-    rain = Column(Float, default=0.0)
-    description = Column(String)
+    __table__ = weather_data_table
 
     @classmethod
     def create_from_api_response(
@@ -33,21 +33,9 @@ class WeatherData(Base):
             city_name (str): The name of the city to which this weather data pertains.
             response (Dict[str, Any]): The JSON dictionary response from the weather API containing weather metrics.
         """
-        country = response['sys']['country']
-        temp = response["main"]["temp"]
-        humidity = response["main"]["humidity"]
-        pressure = response["main"]["pressure"]
-        description = response["weather"][0]["description"]
-        rain = response.get("rain", {"1h": 0})["1h"]
-
-        weather_data = cls(
-            country_name=country,
-            city_name=city_name,
-            temperature=temp,
-            humidity=humidity,
-            pressure=pressure,
-            rain=rain,
-            description=description,
-        )
-        session.add(weather_data)
-        session.commit()
+        with tracer.span(
+            "WeatherData.create_from_api_response", city=city_name
+        ):
+            observation = Observation.from_response(city_name, response)
+            store_observations(session.connection(), [observation])
+            session.commit()
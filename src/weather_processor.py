@@ -0,0 +1,151 @@
+from config import APIConfig
+from src.city_converter import CityData, GeoCoder
+from src.observation import Observation
+from src.sinks import ObservationSink, PostgresSink
+from api import DataAPI
+from monitoring import run_metrics
+import logging
+from functools import partial
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.ring_buffer import ObservationRingBuffer
+
+logging.basicConfig(level=logging.INFO)
+
+
+class WeatherProcessor:
+    """
+    Fetches and stores the weather of every city yielded by the geocoder.
+    Subclasses decide how the cities are worked through in `process_cities`.
+    """
+
+    # Logged when a run starts.
+    run_message = "Processing cities for weather data..."
+
+    def __init__(
+        self,
+        api_config: APIConfig,
+        data_api: DataAPI,
+        city_data: CityData,
+        geo_coder: GeoCoder,
+        ring_buffer: Optional["ObservationRingBuffer"] = None,
+        sink: Optional[ObservationSink] = None,
+    ) -> None:
+        """
+        Initializes the WeatherProcessor with API and database configurations.
+
+        Args:
+            api_config (APIConfig): Configuration for accessing the weather API.
+            data_api (DataAPI): Data access API for database operations.
+            city_data (CityData): Access to city data for processing.
+            geo_coder (GeoCoder): Geocoding utility to fetch geographic coordinates.
+            ring_buffer (Optional[ObservationRingBuffer]): Local buffer every
+                observation is written to before the database, for replay
+                after an outage.
+            sink (Optional[ObservationSink]): Where observations are stored;
+                defaults to Postgres through `data_api`.
+        """
+        self.api = api_config
+        self.data_api = data_api
+        self.city_data = city_data
+        self.geo_coder = geo_coder
+        self.ring_buffer = ring_buffer
+        self.sink = sink or PostgresSink(data_api.sqlalchemy_connection)
+
+    def store_weather_data(
+        self, city_name: str, lat: float, lon: float
+    ) -> None:
+        """
+        Fetches weather data for a city and stores it through the sink.
+
+        Args:
+            city_name (str): The name of the city.
+            lat (float): Latitude of the city.
+            lon (float): Longitude of the city.
+        """
+        buffered = None
+        try:
+            with run_metrics.city(city_name):
+                payload = self.api.fetch_weather_payload(lat, lon)
+                with run_metrics.time_stage("parse"):
+                    observation = Observation.from_payload(city_name, payload)
+                if self.ring_buffer is not None:
+                    buffered = self.ring_buffer.append(observation)
+                on_stored = partial(
+                    self.observation_stored, observation, buffered
+                )
+                if self.sink.write_behind:
+                    # Timed per batch by the sink, and counted once stored.
+                    self.sink.write([observation], on_stored)
+                else:
+                    with run_metrics.time_stage("store"):
+                        self.sink.write([observation], on_stored)
+        except Exception as e:
+            run_metrics.increment("failures")
+            logging.error(
+                "Failed to store weather data for %s: %s%s",
+                city_name,
+                e,
+                " (buffered for replay)" if buffered is not None else "",
+            )
+
+    def observation_stored(
+        self, observation: Observation, buffered: Optional[Tuple[int, int]]
+    ) -> None:
+        """
+        Counts an observation as a success once the sink has stored it,
+        marks it as flushed in the ring buffer and reports it to the city
+        data.
+
+        Args:
+            observation (Observation): The stored observation.
+            buffered (Optional[Tuple[int, int]]): Its ring buffer position,
+                if it was buffered.
+        """
+        if buffered is not None:
+            self.ring_buffer.mark_flushed(buffered)
+        self.city_data.observation_stored(observation)
+        run_metrics.increment("successes")
+        logging.debug("Weather data stored for %s", observation.city_name)
+
+    def process_cities(self) -> None:
+        """Fetches and stores the weather of every city."""
+        raise NotImplementedError
+
+    def bump_generation(self) -> None:
+        """
+        Bumps the ingest generation, which invalidates query results cached
+        against the previous data. A failure is only logged.
+        """
+        try:
+            self.data_api.bump_generation()
+        except Exception as e:
+            logging.warning("Could not bump the ingest generation: %s", e)
+
+    def run(self, bump_generation: bool = True) -> None:
+        """
+        Entry point to start processing cities for weather data.
+
+        Args:
+            bump_generation (bool): Bump the ingest generation when done;
+                callers running several batches per sweep bump once at the
+                end instead.
+        """
+        logging.info(self.run_message)
+        successes = run_metrics.counters["successes"]
+        failures = run_metrics.counters["failures"]
+        # Cities sharing a location are fetched once per run.
+        with self.api.weather_batch():
+            self.process_cities()
+        self.sink.flush()
+        if self.ring_buffer is not None:
+            self.ring_buffer.flush()
+        if bump_generation:
+            self.bump_generation()
+        # Per-city successes are logged at DEBUG; INFO gets one summary line.
+        logging.info(
+            "Weather data stored for %d cities, %d failed",
+            run_metrics.counters["successes"] - successes,
+            run_metrics.counters["failures"] - failures,
+        )
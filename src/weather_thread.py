@@ -1,24 +1,36 @@
 from config import APIConfig, db_config
-from src import CityData, GeoCoder, WeatherData
+from src import CityData, GeoCoder
+from src.sinks import ObservationSink
+from src.weather_processor import WeatherProcessor
 from api import DataAPI
+import os
 import threading
 from queue import Queue
 import logging
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.ring_buffer import ObservationRingBuffer
 
 logging.basicConfig(level=logging.INFO)
 
 
-class WeatherProcessorThread:
+class WeatherProcessorThread(WeatherProcessor):
     """
     Manages the concurrent fetching and storing of weather data for multiple cities using threads.
     """
 
+    run_message = "Processing cities for weather data using threads..."
+
     def __init__(
         self,
         api_config: APIConfig,
         data_api: DataAPI,
         city_data: CityData,
         geo_coder: GeoCoder,
+        workers: Optional[int] = None,
+        ring_buffer: Optional["ObservationRingBuffer"] = None,
+        sink: Optional[ObservationSink] = None,
     ) -> None:
         """
         Initializes the WeatherProcessorThread with API and database configurations.
@@ -28,73 +40,56 @@ class WeatherProcessorThread:
             data_api (DataAPI): Provides database operation functionalities.
             city_data (CityData): Provides access to city-related data.
             geo_coder (GeoCoder): Provides geocoding functionalities to convert city names to coordinates.
+            workers (Optional[int]): Number of fetch threads. Defaults to the
+                WEATHER_WORKERS env var, or 16.
+            ring_buffer (Optional[ObservationRingBuffer]): Local buffer every
+                observation is written to before the database, for replay
+                after an outage.
+            sink (Optional[ObservationSink]): Where observations are stored;
+                defaults to Postgres through `data_api`.
         """
-        self.api = api_config
-        self.data_api = data_api
-        self.city_data = city_data
-        self.geo_coder = geo_coder
-        self.weather_data_queue = Queue()
-
-    def fetch_and_store_weather_data(
-        self, city_name: str, lat: float, lon: float
-    ) -> None:
-        """
-        Fetches weather data from the API and stores it in the database.
-
-        Args:
-            city_name (str): The name of the city.
-            lat (float): Latitude of the city.
-            lon (float): Longitude of the city.
-        """
-        try:
-            response = self.api.fetch_weather_data(lat, lon)
-            with self.data_api.sqlalchemy_connection.connect() as session:
-                WeatherData.create_from_api_response(
-                    session, city_name, response
-                )
-            logging.info(f"Weather data stored for {city_name}")
-        except Exception as e:
-            logging.error(f"Failed to store weather data for {city_name}: {e}")
+        super().__init__(
+            api_config, data_api, city_data, geo_coder, ring_buffer, sink
+        )
+        self.workers = workers or int(os.getenv("WEATHER_WORKERS", "16"))
+        self.weather_data_queue = Queue(maxsize=self.workers * 4)
 
-    def store_weather_data_thread(
-        self, city_name: str, lat: float, lon: float
-    ) -> threading.Thread:
+    def weather_worker(self) -> None:
         """
-        Initiates a thread to fetch and store weather data for a specific city.
-
-        Args:
-            city_name (str): The name of the city.
-            lat (float): Latitude of the city.
-            lon (float): Longitude of the city.
-
-        Returns:
-            threading.Thread: The thread executing the fetch and store operation.
+        Consumes (city, lat, lon) items from the queue and fetches and stores
+        their weather data until it receives the None sentinel.
         """
-        thread = threading.Thread(
-            target=self.fetch_and_store_weather_data,
-            args=(city_name, lat, lon),
-        )
-        thread.start()
-        return thread
+        while True:
+            item = self.weather_data_queue.get()
+            try:
+                if item is None:
+                    return
+                self.store_weather_data(*item)
+            finally:
+                self.weather_data_queue.task_done()
 
     def process_cities(self) -> None:
         """
-        Processes all cities by initiating threads to fetch and store weather data concurrently.
+        Processes all cities by streaming them from the geocoder into a bounded
+        queue drained by a pool of worker threads, so fetching starts as soon as
+        the first city is geocoded.
         """
-        threads = []
-        cities = self.geo_coder.get_lat_lon()
-        for city_name, (lat, lon) in cities.items():
-            thread = self.store_weather_data_thread(city_name, lat, lon)
-            threads.append(thread)
+        threads = [
+            threading.Thread(
+                target=self.weather_worker, name=f"WeatherWorker-{i}"
+            )
+            for i in range(self.workers)
+        ]
         for thread in threads:
-            thread.join()
-
-    def run(self) -> None:
-        """
-        Entry point to start processing cities for weather data concurrently.
-        """
-        logging.info("Processing cities for weather data using threads...")
-        self.process_cities()
+            thread.start()
+        try:
+            for city_name, lat, lon in self.geo_coder.iter_lat_lon():
+                self.weather_data_queue.put((city_name, lat, lon))
+        finally:
+            for _ in threads:
+                self.weather_data_queue.put(None)
+            for thread in threads:
+                thread.join()
 
 
 if __name__ == "__main__":
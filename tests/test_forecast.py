@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from src.forecast import (
+    TemperatureForecaster,
+    forward_fill,
+    smoothing_weights,
+)
+
+# Deviation of every hour of the day from the daily mean; sums to zero.
+PROFILE = 3 * np.sin(2 * np.pi * np.arange(24) / 24)
+
+
+def synthetic_history(start: datetime, hours: int, level: float) -> np.ndarray:
+    """A constant level plus PROFILE, indexed by the hour of the day."""
+    hour_of_day = (start.hour + np.arange(hours)) % 24
+    return (level + PROFILE[hour_of_day])[None, :]
+
+
+class TestForwardFill(unittest.TestCase):
+    """Checks the gap filling of the hourly history."""
+
+    def test_fills_gaps_and_leading_values(self):
+        matrix = np.array(
+            [
+                [np.nan, 1.0, np.nan, 3.0, np.nan],
+                [2.0, np.nan, np.nan, np.nan, 5.0],
+            ]
+        )
+        np.testing.assert_array_equal(
+            forward_fill(matrix),
+            [[1.0, 1.0, 1.0, 3.0, 3.0], [2.0, 2.0, 2.0, 2.0, 5.0]],
+        )
+
+    def test_empty_row_stays_nan(self):
+        filled = forward_fill(np.array([[np.nan, np.nan], [1.0, np.nan]]))
+        self.assertTrue(np.isnan(filled[0]).all())
+        np.testing.assert_array_equal(filled[1], [1.0, 1.0])
+
+
+class TestSmoothingWeights(unittest.TestCase):
+    """Checks the weights against the recursive SES definition."""
+
+    def test_matches_recursion(self):
+        series = np.array([4.0, 7.0, 1.0, 3.0, 9.0, 2.0])
+        alpha = 0.3
+        level = series[0]
+        for value in series[1:]:
+            level = alpha * value + (1 - alpha) * level
+        weights = smoothing_weights(len(series), alpha)
+        self.assertAlmostEqual(weights.sum(), 1.0)
+        self.assertAlmostEqual(series @ weights, level)
+
+    def test_alpha_one_keeps_last_value(self):
+        np.testing.assert_array_equal(smoothing_weights(4, 1.0), [0, 0, 0, 1])
+
+
+class TestFitPredict(unittest.TestCase):
+    """
+    Checks that a constant level plus a daily profile is forecast exactly,
+    also when the history neither starts at midnight nor covers whole days,
+    so the profile has to be rolled onto the hour of the day.
+    """
+
+    def forecast(self, start: datetime, history_hours: int) -> np.ndarray:
+        forecaster = TemperatureForecaster(
+            None, history_hours=history_hours, horizon_hours=30, alpha=0.3
+        )
+        history = synthetic_history(start, history_hours, level=10.0)
+        return forecaster.fit_predict(history, start)
+
+    def expected(self, start: datetime, history_hours: int) -> np.ndarray:
+        hour_of_day = (start.hour + history_hours + np.arange(30)) % 24
+        return 10.0 + PROFILE[hour_of_day]
+
+    def test_whole_days_from_midnight(self):
+        start = datetime(2024, 5, 1, 0)
+        np.testing.assert_allclose(
+            self.forecast(start, 72)[0], self.expected(start, 72)
+        )
+
+    def test_partial_days_from_morning(self):
+        start = datetime(2024, 5, 1, 5)
+        np.testing.assert_allclose(
+            self.forecast(start, 60)[0], self.expected(start, 60)
+        )
+
+    def test_gaps_are_filled_before_fitting(self):
+        start = datetime(2024, 5, 1, 5)
+        history = synthetic_history(start, 72, level=10.0)
+        history[0, 30:33] = np.nan
+        forecaster = TemperatureForecaster(
+            None, history_hours=72, horizon_hours=24, alpha=0.3
+        )
+        forecast = forecaster.fit_predict(history, start)
+        self.assertFalse(np.isnan(forecast).any())
+
+    def test_rejects_history_shorter_than_a_season(self):
+        with self.assertRaises(ValueError):
+            TemperatureForecaster(None, history_hours=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
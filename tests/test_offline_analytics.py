@@ -0,0 +1,255 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.offline_analytics import (
+    OfflineAnalytics,
+    group_starts,
+    round_half_away,
+    week_start,
+)
+
+NOW = datetime(2024, 5, 15, 12, 0)
+
+# city_name, record_time, temperature, rain
+OBSERVATIONS = [
+    ("Vilnius", "2024-05-15T09:00", 10.0, 1.125),
+    ("Vilnius", "2024-05-15T10:00", 14.0, 1.0),
+    ("Vilnius", "2024-05-15T10:30", 12.0, np.nan),
+    ("Kaunas", "2024-05-15T10:15", 8.0, np.nan),
+    ("Kaunas", "2024-05-14T08:00", 5.0, 0.5),
+    ("Vilnius", "2024-05-05T12:00", 20.0, 3.0),
+]
+
+
+def build_analytics() -> OfflineAnalytics:
+    city_names, city = np.unique(
+        [row[0] for row in OBSERVATIONS], return_inverse=True
+    )
+    return OfflineAnalytics(
+        city_names,
+        city,
+        np.array([row[1] for row in OBSERVATIONS], dtype="datetime64[s]"),
+        [row[2] for row in OBSERVATIONS],
+        [row[3] for row in OBSERVATIONS],
+    )
+
+
+class TestHelpers(unittest.TestCase):
+    """Checks the array helpers the views are built from."""
+
+    def test_group_starts(self):
+        keys = np.array([1, 1, 2, 5, 5, 5])
+        self.assertEqual(group_starts(keys).tolist(), [0, 2, 3])
+        self.assertEqual(len(group_starts(np.array([]))), 0)
+
+    def test_round_half_away(self):
+        values = np.array([2.125, -2.125, 2.675, 0.004, np.nan])
+        rounded = round_half_away(values)
+        self.assertEqual(rounded[:4].tolist(), [2.13, -2.13, 2.68, 0.0])
+        self.assertTrue(np.isnan(rounded[4]))
+
+    def test_week_start(self):
+        days = np.array(
+            ["2024-05-13", "2024-05-15", "2024-05-19", "2024-05-20"],
+            dtype="datetime64[D]",
+        )
+        self.assertEqual(
+            week_start(days).astype(str).tolist(),
+            ["2024-05-13", "2024-05-13", "2024-05-13", "2024-05-20"],
+        )
+
+
+class TestOfflineAnalytics(unittest.TestCase):
+    """
+    Checks the views computed by OfflineAnalytics on a small set of
+    observations whose expected rows were worked out by hand from the SQL of
+    `database/db_views.py`.
+    """
+
+    def setUp(self):
+        self.analytics = build_analytics()
+
+    def rows(self, frame, keys):
+        return {
+            tuple(row[key] for key in keys): row
+            for row in frame.to_dict("records")
+        }
+
+    def test_rainfall_counts(self):
+        rows = self.rows(
+            self.analytics.rainfall_counts(NOW), ["city_name", "time_frame"]
+        )
+        self.assertEqual(
+            set(rows),
+            {
+                ("Vilnius", "2024-05-14"),
+                ("Kaunas", "2024-05-14"),
+                ("Vilnius", "2024-05-02 to 2024-05-08"),
+            },
+        )
+        # Rounded half away from zero, like ROUND(numeric).
+        self.assertEqual(rows["Vilnius", "2024-05-14"]["total_rain"], 2.13)
+        # SUM over NULLs only is NULL.
+        self.assertTrue(np.isnan(rows["Kaunas", "2024-05-14"]["total_rain"]))
+        self.assertEqual(
+            rows["Vilnius", "2024-05-02 to 2024-05-08"]["total_rain"], 3.0
+        )
+
+    def test_temperature_analytics(self):
+        rows = self.rows(
+            self.analytics.temperature_analytics(NOW),
+            ["city_name", "time_frame"],
+        )
+        expected = {
+            ("Vilnius", "Today"): (14.0, 10.0, 2.0),
+            ("Kaunas", "Today"): (8.0, 8.0, np.nan),
+            ("Kaunas", "Yesterday"): (5.0, 5.0, np.nan),
+            ("Vilnius", "Current Week"): (14.0, 10.0, 2.0),
+            ("Kaunas", "Current Week"): (8.0, 5.0, 2.12),
+            ("Vilnius", "Last 7 Days"): (14.0, 10.0, 2.0),
+            ("Kaunas", "Last 7 Days"): (8.0, 5.0, 2.12),
+        }
+        self.assertEqual(set(rows), set(expected))
+        for key, values in expected.items():
+            row = rows[key]
+            actual = (
+                row["max_temperature"],
+                row["min_temperature"],
+                row["stddev_temperature"],
+            )
+            np.testing.assert_equal(actual, values, err_msg=str(key))
+
+    def test_temperature_extremes(self):
+        frame = self.analytics.temperature_extremes()
+        self.assertEqual(
+            frame["interval"].value_counts().to_dict(),
+            {"Hourly": 4, "Daily": 3, "Weekly": 2},
+        )
+        rows = self.rows(frame, ["interval", "time_frame"])
+        expected = {
+            ("Hourly", "2024-05-15T10:00"): ("Vilnius", 14.0, "Kaunas", 8.0),
+            ("Daily", "2024-05-14"): ("Kaunas", 5.0, "Kaunas", 5.0),
+            ("Weekly", "2024-05-13"): ("Vilnius", 14.0, "Kaunas", 5.0),
+            ("Weekly", "2024-04-29"): ("Vilnius", 20.0, "Vilnius", 20.0),
+        }
+        for (interval, time_frame), values in expected.items():
+            row = rows[interval, pd.Timestamp(time_frame)]
+            self.assertEqual(
+                (
+                    row["hottest_city"],
+                    row["highest_temperature"],
+                    row["coldest_city"],
+                    row["lowest_temperature"],
+                ),
+                values,
+            )
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "observations.npz")
+            self.analytics.save(path)
+            loaded = OfflineAnalytics.from_file(path)
+        pd.testing.assert_frame_equal(
+            loaded.temperature_analytics(NOW),
+            self.analytics.temperature_analytics(NOW),
+        )
+
+
+class TestOfflineAnalyticsAgainstViews(unittest.TestCase):
+    """
+    Checks that OfflineAnalytics computes the same rows as the SQL views of
+    the database configured by the WEATHER_DB_* variables. Only runs with
+    OFFLINE_ANALYTICS_TEST_DB=1, as that should be a test database.
+    """
+
+    VIEWS = (
+        "rainfall_counts",
+        "temperature_analytics",
+        "temperature_extremes",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Reads the views and the observations in one repeatable-read
+        transaction, so both see the same rows and the same CURRENT_TIMESTAMP.
+        """
+        if os.getenv("OFFLINE_ANALYTICS_TEST_DB") != "1":
+            raise unittest.SkipTest("OFFLINE_ANALYTICS_TEST_DB is not set")
+        from sqlalchemy import text
+
+        from api import DataAPI
+        from config import db_config
+
+        engine = DataAPI(db_config).sqlalchemy_connection.engine
+        connection = engine.connect().execution_options(
+            isolation_level="REPEATABLE READ"
+        )
+        with connection, connection.begin():
+            cls.now = connection.execute(
+                text("SELECT LOCALTIMESTAMP;")
+            ).scalar()
+            cls.views = {
+                view: [
+                    dict(row._mapping)
+                    for row in connection.execute(
+                        text(f"SELECT DISTINCT * FROM {view};")
+                    )
+                ]
+                for view in cls.VIEWS
+            }
+            cls.analytics = OfflineAnalytics.from_connection(connection)
+        if not len(cls.analytics):
+            raise unittest.SkipTest("No observations in the test database")
+
+    def assertSameRows(self, expected, actual, keys, values, places=6):
+        expected = {tuple(row[k] for k in keys): row for row in expected}
+        actual = {
+            tuple(row[k] for k in keys): row
+            for row in actual.to_dict("records")
+        }
+        self.assertEqual(set(expected), set(actual))
+        for key, row in expected.items():
+            for column in values:
+                want, got = row[column], actual[key][column]
+                if want is None:
+                    self.assertTrue(np.isnan(got), (key, column))
+                else:
+                    self.assertAlmostEqual(
+                        float(want), got, places=places, msg=(key, column)
+                    )
+
+    def test_rainfall_counts(self):
+        self.assertSameRows(
+            self.views["rainfall_counts"],
+            self.analytics.rainfall_counts(self.now),
+            ["city_name", "time_frame"],
+            ["total_rain"],
+        )
+
+    def test_temperature_analytics(self):
+        self.assertSameRows(
+            self.views["temperature_analytics"],
+            self.analytics.temperature_analytics(self.now),
+            ["city_name", "time_frame"],
+            ["max_temperature", "min_temperature", "stddev_temperature"],
+        )
+
+    def test_temperature_extremes(self):
+        # Cities tied for the extreme temperature may be picked differently,
+        # so only the temperatures are compared.
+        self.assertSameRows(
+            self.views["temperature_extremes"],
+            self.analytics.temperature_extremes(),
+            ["time_frame", "interval"],
+            ["highest_temperature", "lowest_temperature"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from config import APIConfig, APIKeyPool
+from monitoring import run_metrics
+
+
+def weather_response(city_id, lat, lon):
+    return {
+        "id": city_id,
+        "coord": {"lat": lat, "lon": lon},
+        "sys": {"country": "LT"},
+        "main": {"temp": 10.0, "humidity": 80, "pressure": 1010},
+        "weather": [{"description": "clear sky"}],
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers /weather and /group like the provider, recording requests."""
+
+    requests = []
+    # Ids the group endpoint leaves out of its answer.
+    missing_ids = set()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        StandInHandler.requests.append((url.path, query))
+        if url.path == "/weather":
+            lat, lon = float(query["lat"][0]), float(query["lon"][0])
+            city_id = int(abs(lat * 1000)) * 1000 + int(abs(lon * 1000))
+            body = weather_response(city_id, lat, lon)
+        elif url.path == "/group":
+            ids = [int(i) for i in query["id"][0].split(",")]
+            body = {
+                "cnt": len(ids),
+                "list": [
+                    weather_response(i, 0, 0)
+                    for i in ids
+                    if i not in StandInHandler.missing_ids
+                ],
+            }
+        else:
+            self.send_error(404)
+            return
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestWeatherBatch(unittest.TestCase):
+    """Checks APIConfig request deduplication against a local stand-in."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.requests = []
+        StandInHandler.missing_ids = set()
+        self.api = APIConfig(APIKeyPool(["test-key"]))
+        self.api.weather_url = f"{self.base_url}/weather"
+        self.api.group_url = f"{self.base_url}/group"
+        self.api.group_max_ids = 2
+        self.directory = tempfile.TemporaryDirectory()
+        self.ids_path = os.path.join(self.directory.name, "ids.json")
+        os.environ["WEATHER_GROUP_IDS"] = self.ids_path
+
+    def tearDown(self):
+        os.environ.pop("WEATHER_GROUP_IDS", None)
+        self.directory.cleanup()
+
+    def fetch_all(self, coordinates):
+        """Fetches all coordinates concurrently in one batch."""
+        results = {}
+
+        def fetch(index, lat, lon):
+            results[index] = json.loads(
+                self.api.fetch_weather_payload(lat, lon)
+            )
+
+        with self.api.weather_batch(coordinates):
+            threads = [
+                threading.Thread(target=fetch, args=(index, lat, lon))
+                for index, (lat, lon) in enumerate(coordinates)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return [results[index] for index in range(len(coordinates))]
+
+    def test_deduplicates_rounded_coordinates(self):
+        coordinates = [
+            (54.6872, 25.2797),
+            (54.6869, 25.2801),
+            (54.6872, 25.2797),
+            (54.8985, 23.9036),
+            (54.8981, 23.9041),
+            (55.7033, 21.1443),
+        ]
+        results = self.fetch_all(coordinates)
+        self.assertEqual(len(StandInHandler.requests), 3)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[3], results[4])
+        self.assertEqual(len({result["id"] for result in results}), 3)
+
+    def test_group_requests_for_known_ids(self):
+        coordinates = [
+            (54.6872, 25.2797),
+            (54.8985, 23.9036),
+            (55.7033, 21.1443),
+        ]
+        first = self.fetch_all(coordinates)
+        StandInHandler.requests = []
+        second = self.fetch_all(coordinates)
+        paths = [path for path, _ in StandInHandler.requests]
+        # Three known ids, two per group request.
+        self.assertEqual(paths, ["/group", "/group"])
+        self.assertEqual(
+            [result["id"] for result in first],
+            [result["id"] for result in second],
+        )
+
+    def test_ids_missing_from_group_are_fetched_once_and_pruned(self):
+        coordinates = [(54.6872, 25.2797), (54.8985, 23.9036)]
+        first = self.fetch_all(coordinates)
+        StandInHandler.missing_ids = {first[0]["id"]}
+        StandInHandler.requests = []
+        second = self.fetch_all(
+            [coordinates[0], coordinates[0], coordinates[0], coordinates[1]]
+        )
+        paths = [path for path, _ in StandInHandler.requests]
+        # One waiter refetches the skipped location for all of them.
+        self.assertEqual(paths, ["/group", "/weather"])
+        self.assertEqual(second[0], second[2])
+        with open(self.ids_path) as ids_file:
+            ids = json.load(ids_file)
+        self.assertNotIn(first[0]["id"], ids.values())
+        self.assertIn(first[1]["id"], ids.values())
+
+    def test_batch_prefetches_only_its_own_locations(self):
+        coordinates = [
+            (54.6872, 25.2797),
+            (54.8985, 23.9036),
+            (55.7033, 21.1443),
+            (55.9349, 23.3137),
+        ]
+        first = self.fetch_all(coordinates)
+        StandInHandler.requests = []
+        deduplicated = run_metrics.counters["deduplicated"]
+        second = self.fetch_all(coordinates[2:3])
+        self.assertEqual(len(StandInHandler.requests), 1)
+        path, query = StandInHandler.requests[0]
+        self.assertEqual(path, "/group")
+        self.assertEqual(query["id"], [str(first[2]["id"])])
+        self.assertEqual(second[0]["id"], first[2]["id"])
+        # Served by the group request, not saved by deduplication.
+        self.assertEqual(run_metrics.counters["deduplicated"], deduplicated)
+        StandInHandler.requests = []
+        self.fetch_all([])
+        self.assertEqual(StandInHandler.requests, [])
+
+    def test_without_batch_every_call_is_sent(self):
+        for _ in range(2):
+            self.api.fetch_weather_payload(54.6872, 25.2797)
+        self.assertEqual(len(StandInHandler.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()